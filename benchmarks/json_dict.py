@@ -0,0 +1,101 @@
+""" Compares packing and unpacking dictionaries as JSON through a protobuf
+Struct, as done before, with the direct dictionary path of the JSON codec:
+
+    python benchmarks/json_dict.py --messages 10000 --objects 20
+"""
+from __future__ import print_function
+import argparse
+import time
+
+from google.protobuf import json_format as pb
+from google.protobuf.struct_pb2 import Struct
+
+from is_wire.core import ContentType, Message
+
+
+def payload(n_objects):
+    """ Nested dictionary like the ones of our detection topics """
+    return {
+        "frame_id": 1234,
+        "resolution": {"width": 1288, "height": 728},
+        "objects": [{
+            "id": i,
+            "label": "person",
+            "score": 0.87,
+            "region": {
+                "vertices": [{"x": 10.5 * i, "y": 20.25},
+                             {"x": 30.0, "y": 40.0 * i}]
+            },
+            "keypoints": [{"id": k, "x": 1.5 * k, "y": 2.5 * k}
+                          for k in range(5)],
+        } for i in range(n_objects)],
+    }
+
+
+def struct_pack(obj):
+    packed = pb.MessageToJson(pb.ParseDict(obj, Struct()),
+                              indent=0,
+                              including_default_value_fields=True)
+    return packed.encode('latin')
+
+
+def struct_unpack(body):
+    return pb.MessageToDict(pb.Parse(body, Struct()),
+                            including_default_value_fields=True)
+
+
+def codec_pack(obj):
+    return Message(content=obj, content_type=ContentType.JSON).body
+
+
+def codec_unpack(body):
+    # the default unpack, the caller owns the returned object
+    message = Message(content=body, content_type=ContentType.JSON)
+    return message.unpack(dict)
+
+
+def codec_unpack_readonly(body):
+    message = Message(content=body, content_type=ContentType.JSON)
+    return message.unpack(dict, readonly=True)
+
+
+def codec_unpack_twice(body):
+    # a second unpack copies the cached object
+    message = Message(content=body, content_type=ContentType.JSON)
+    message.unpack(dict, readonly=True)
+    return message.unpack(dict)
+
+
+def measure(function, argument, n):
+    began = time.time()
+    for _ in range(n):
+        function(argument)
+    return 1e6 * (time.time() - began) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--objects", type=int, default=20)
+    args = parser.parse_args()
+
+    obj = payload(args.objects)
+    struct_body, codec_body = struct_pack(obj), codec_pack(obj)
+    assert struct_unpack(codec_body) == struct_unpack(struct_body)
+    print("{:>14}: {} bytes (Struct) {} bytes (codec)".format(
+        "body size", len(struct_body), len(codec_body)))
+
+    for name, function, argument in [
+        ("Struct pack", struct_pack, obj),
+        ("codec pack", codec_pack, obj),
+        ("Struct unpack", struct_unpack, struct_body),
+        ("codec unpack", codec_unpack, codec_body),
+        ("readonly", codec_unpack_readonly, codec_body),
+        ("cached copy", codec_unpack_twice, codec_body),
+    ]:
+        print("{:>14}: {:8.2f} us/message".format(
+            name, measure(function, argument, args.messages)))
+
+
+if __name__ == "__main__":
+    main()
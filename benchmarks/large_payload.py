@@ -0,0 +1,126 @@
+""" Compares the CPU time and peak memory of framing large message bodies
+with py-amqp and with the zero-copy paths of is-wire, both when publishing
+and when assembling a received message:
+
+    python benchmarks/large_payload.py --sizes 1 16 64 --repeat 5
+"""
+from __future__ import print_function
+import argparse
+import gc
+import struct
+import time
+
+import amqp
+from amqp import spec
+from amqp.method_framing import frame_handler as amqp_frame_handler
+from amqp.method_framing import frame_writer
+from amqp.serialization import dumps
+
+from is_wire.core.framing import FrameBuffer, frame_handler, write_segments
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+FRAME_MAX = 131072
+
+
+class NullConnection(object):
+    def __init__(self):
+        self.frame_max = FRAME_MAX
+        self.bytes_sent = 0
+        self.bytes_recv = 0
+
+
+class NullTransport(object):
+    def __init__(self):
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+
+
+def publish_amqp(body):
+    transport = NullTransport()
+    write = frame_writer(NullConnection(), transport)
+    args = dumps('Bssbb', (0, "is", "Large.Payload", False, False))
+    write(1, 1, spec.Basic.Publish, args, amqp.Message(body=body))
+    return transport.written
+
+
+def publish_wire(body):
+    transport = NullTransport()
+    frames = FrameBuffer(1, FRAME_MAX)
+    frames.add_publish("is", "Large.Payload", body, {})
+    write_segments(transport, frames.segments())
+    return transport.written
+
+
+def deliver_frames(body):
+    # Like the frames read from a socket, each payload is a new object
+    args = dumps('sLbss', ("ctag", 1, False, "is", "Large.Payload"))
+    yield 1, 1, struct.pack('>HH', *spec.Basic.Deliver) + args
+    yield 2, 1, FrameBuffer(1, FRAME_MAX).content_header({}, len(body))
+    chunk = FRAME_MAX - 8
+    for offset in range(0, len(body), chunk):
+        yield 3, 1, body[offset:offset + chunk]
+
+
+def receive(handler):
+    def run(body):
+        received = []
+        on_frame = handler(NullConnection(),
+                           lambda *args: received.append(args[3]))
+        for frame in deliver_frames(body):
+            on_frame(frame)
+        return len(received[0].body)
+
+    return run
+
+
+def measure(function, argument, repeat):
+    gc.collect()
+    began = time.time()
+    for _ in range(repeat):
+        function(argument)
+    took = (time.time() - began) / repeat
+
+    peak = None
+    if tracemalloc is not None:
+        gc.collect()
+        tracemalloc.start()
+        function(argument)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return took, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 16, 64],
+                        help="body sizes in MiB")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        body = bytes(bytearray(range(256)) * (size * 4096))
+        n_frames = (len(body) + FRAME_MAX - 9) // (FRAME_MAX - 8)
+        print("{} MiB body, {} body frames".format(size, n_frames))
+
+        for name, function, argument in [
+            ("publish py-amqp", publish_amqp, body),
+            ("publish is-wire", publish_wire, body),
+            ("receive py-amqp", receive(amqp_frame_handler), body),
+            ("receive is-wire", receive(frame_handler), body),
+        ]:
+            took, peak = measure(function, argument, args.repeat)
+            line = "{:>20}: {:8.2f} ms/message {:6.2f} us/frame".format(
+                name, 1e3 * took, 1e6 * took / n_frames)
+            if peak is not None:
+                line += " {:8.2f} MiB peak".format(peak / float(1 << 20))
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
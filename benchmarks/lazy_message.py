@@ -0,0 +1,54 @@
+""" Compares the cost of converting received AMQP messages eagerly against
+LazyMessage, for a consumer that only reads the topic and the body:
+
+    python benchmarks/lazy_message.py --messages 100000
+"""
+from __future__ import print_function
+import argparse
+import time
+
+import amqp
+from is_wire.core import Message, Status, StatusCode
+from is_wire.core.wire.conversion import WireV1
+
+
+def received(properties, body):
+    # headers are shared with the sent message and modified on conversion
+    properties = dict(properties,
+                      application_headers=dict(
+                          properties["application_headers"]))
+    amqp_message = amqp.Message(body=body, **properties)
+    amqp_message.delivery_info = {
+        "routing_key": "Benchmark.Lazy",
+        "consumer_tag": "consumer",
+    }
+    return amqp_message
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--size", type=int, default=64)
+    args = parser.parse_args()
+
+    sent = Message(content=b"x" * args.size, reply_to="Benchmark.Reply")
+    sent.timeout = 1.0
+    sent.status = Status(StatusCode.OK)
+    sent.metadata = {"x-b3-traceid": "f047c6f208eb36ab"}
+
+    for lazy in (False, True):
+        messages = [
+            received(WireV1.to_amqp_properties(sent), sent.body)
+            for _ in range(args.messages)
+        ]
+        began = time.time()
+        for amqp_message in messages:
+            message = WireV1.from_amqp_message(amqp_message, lazy=lazy)
+            message.topic, message.body
+        took = time.time() - began
+        print("{:>6}: {:10.0f} messages/s".format("lazy" if lazy else "eager",
+                                                  args.messages / took))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+""" Measures the construction time and memory footprint of Message objects:
+
+    python benchmarks/message.py --messages 100000
+"""
+from __future__ import print_function
+import argparse
+import gc
+import time
+
+from is_wire.core import Message
+
+try:
+    import tracemalloc
+except ImportError:  # python 2
+    tracemalloc = None
+
+
+def construct_empty(n):
+    return [Message() for _ in range(n)]
+
+
+def construct_with_body(n):
+    return [Message(content=b"payload", reply_to="Reply.Topic")
+            for _ in range(n)]
+
+
+def create_reply(n):
+    request = Message(content=b"payload", reply_to="Reply.Topic")
+    return [request.create_reply() for _ in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+
+    for name, construct in [("Message()", construct_empty),
+                            ("Message(content, reply_to)",
+                             construct_with_body),
+                            ("create_reply()", create_reply)]:
+        gc.collect()
+        began = time.time()
+        construct(args.messages)
+        took = time.time() - began
+        line = "{:>28}: {:6.2f} us/message".format(
+            name, 1e6 * took / args.messages)
+
+        if tracemalloc is not None:
+            gc.collect()
+            tracemalloc.start()
+            messages = construct(args.messages)
+            allocated, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            assert len(messages) == args.messages
+            line += " {:8.0f} bytes/message".format(
+                float(allocated) / args.messages)
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
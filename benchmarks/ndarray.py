@@ -0,0 +1,53 @@
+""" Compares sending 1080p frames wrapped in a protobuf bytes field with the
+ndarray content type, next to the cost of a single copy of the frame:
+
+    python benchmarks/ndarray.py --frames 100
+"""
+from __future__ import print_function
+import argparse
+import time
+
+import numpy as np
+from google.protobuf.wrappers_pb2 import BytesValue
+
+from is_wire.core import ContentType, Message
+
+
+def memcpy(frame):
+    return frame.copy()
+
+
+def protobuf_roundtrip(frame):
+    message = Message(content=BytesValue(value=frame.tobytes()))
+    wrapper = message.unpack(BytesValue)
+    return np.frombuffer(wrapper.value, frame.dtype).reshape(frame.shape)
+
+
+def ndarray_roundtrip(frame):
+    message = Message(content=frame, content_type=ContentType.NDARRAY)
+    # the body as received, in a buffer of its own
+    received = Message(content=bytes(message.body),
+                       content_type=ContentType.NDARRAY)
+    received.metadata = message.metadata
+    return received.unpack(np.ndarray)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=100)
+    args = parser.parse_args()
+
+    frame = np.random.randint(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    for name, function in [("memcpy", memcpy),
+                           ("protobuf bytes", protobuf_roundtrip),
+                           ("ndarray", ndarray_roundtrip)]:
+        assert np.array_equal(function(frame), frame)
+        began = time.time()
+        for _ in range(args.frames):
+            function(frame)
+        took = (time.time() - began) / args.frames
+        print("{:>16}: {:8.3f} ms/frame".format(name, 1e3 * took))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+""" Compares a consumer that allocates a Message and a protobuf object per
+delivery with one that releases its messages to the channel pool and unpacks
+into the same object, through the in-process broker:
+
+    python benchmarks/pooled_consume.py --messages 100000
+"""
+from __future__ import print_function
+import argparse
+import gc
+import time
+
+from google.protobuf.struct_pb2 import Struct
+from is_wire.core import Channel, Message, Subscription
+
+BATCH = 1000
+
+
+def gc_collections():
+    return sum(stats["collections"] for stats in gc.get_stats())
+
+
+def run(pooled, n_messages):
+    channel = Channel("inproc://benchmark-{}".format(pooled),
+                      pooled_messages=pooled)
+    subscription = Subscription(channel)
+    struct = Struct()
+    struct.fields["value"].number_value = 1.0
+    sent = Message(struct, reply_to=subscription)
+    request = Struct() if pooled else None
+
+    consumed, took, collections = 0, 0.0, 0
+    while consumed < n_messages:
+        for _ in range(BATCH):
+            channel.publish(sent, topic=subscription.name)
+        before = gc_collections()
+        began = time.time()
+        for _ in range(BATCH):
+            message = channel.consume()
+            message.unpack(Struct, into=request)
+            if pooled:
+                message.release()
+        took += time.time() - began
+        collections += gc_collections() - before
+        consumed += BATCH
+
+    stats = channel.stats()
+    channel.close()
+    return took, collections, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100000)
+    args = parser.parse_args()
+
+    for pooled in (False, True):
+        took, collections, stats = run(pooled, args.messages)
+        print("{:>8}: {:6.2f} us/message, {} gc collections".format(
+            "pooled" if pooled else "default", 1e6 * took / args.messages,
+            collections))
+        if pooled:
+            print("{:>8}: {} messages allocated, {} reused".format(
+                "", stats["messages_allocated"], stats["messages_reused"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+""" Compares the encoding work of fanning out a message to many topics with
+Channel.publish called once per topic against Channel.publish_to, which
+encodes the message once. Only the frames are built, no broker is needed:
+
+    python benchmarks/publish_to.py --topics 50 --size 1024
+"""
+from __future__ import print_function
+import argparse
+import time
+
+from is_wire.core import Message
+from is_wire.core.framing import FrameBuffer
+from is_wire.core.wire.conversion import WireV1
+
+FRAME_MAX = 131072
+
+
+def message(size):
+    sent = Message(content=b"x" * size, reply_to="Benchmark.Reply")
+    sent.timeout = 1.0
+    sent.metadata = {
+        'x-b3-sampled': '1',
+        'x-b3-traceid': 'f047c6f208eb36ab',
+        'x-b3-flags': '0',
+        'x-b3-spanid': 'ef81a2f9c261473d',
+        'x-b3-parentspanid': '0000000000000000',
+    }
+    return sent
+
+
+def publish_loop(sent, topics):
+    # what a publish call per topic encodes
+    for topic in topics:
+        frames = FrameBuffer(1, FRAME_MAX)
+        frames.add_publish("is", topic, sent.body,
+                           WireV1.to_amqp_properties(sent))
+        frames.segments()
+
+
+def publish_to(sent, topics):
+    frames = FrameBuffer(1, FRAME_MAX)
+    body, properties = sent.body, WireV1.to_amqp_properties(sent)
+    for topic in topics:
+        frames.add_publish("is", topic, body, properties)
+    frames.segments()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--fanouts", type=int, default=2000)
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--size", type=int, default=1024)
+    args = parser.parse_args()
+
+    sent = message(args.size)
+    topics = ["Camera.{}.Frame".format(n) for n in range(args.topics)]
+    for name, publish in [("publish", publish_loop),
+                          ("publish_to", publish_to)]:
+        began = time.time()
+        for _ in range(args.fanouts):
+            publish(sent, topics)
+        took = time.time() - began
+        print("{:>10}: {:8.2f} us/topic".format(
+            name, 1e6 * took / (args.fanouts * args.topics)))
+
+
+if __name__ == "__main__":
+    main()
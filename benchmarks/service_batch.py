@@ -0,0 +1,70 @@
+""" Measures the throughput of a service with a fixed cost per call, e.g.
+running a model on an accelerator, served one request at a time and in
+batches of increasing size, through the in-process broker:
+
+    python benchmarks/service_batch.py --requests 512 --overhead 0.002
+"""
+from __future__ import print_function
+import argparse
+import time
+
+from google.protobuf.wrappers_pb2 import Int64Value
+from is_wire.core import Channel, Message, Subscription
+from is_wire.rpc import ServiceProvider
+
+
+def throughput(max_batch, n_requests, overhead):
+    channel = Channel("inproc://benchmark-batch-{}".format(max_batch))
+    client = Channel("inproc://benchmark-batch-{}".format(max_batch))
+    provider = ServiceProvider(channel)
+
+    def service(request, context):
+        time.sleep(overhead)
+        return request
+
+    def batch_service(requests, contexts):
+        time.sleep(overhead)
+        return requests
+
+    if max_batch == 0:
+        provider.delegate("Benchmark.Service", service, Int64Value,
+                          Int64Value)
+    else:
+        provider.delegate_batch("Benchmark.Service", batch_service,
+                                Int64Value, Int64Value, max_batch=max_batch)
+    subscription = Subscription(client)
+    for value in range(n_requests):
+        client.publish(Message(Int64Value(value=value),
+                               reply_to=subscription),
+                       topic="Benchmark.Service")
+
+    began = time.time()
+    for _ in range(n_requests):
+        provider.serve(channel.consume())
+    provider.join()
+    took = time.time() - began
+
+    for _ in range(n_requests):
+        client.consume()
+    stats = provider.stats()["batches"].get("Benchmark.Service")
+    channel.close()
+    client.close()
+    return n_requests / took, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--overhead", type=float, default=0.002)
+    args = parser.parse_args()
+
+    for max_batch in (0, 4, 16, 64):
+        rate, stats = throughput(max_batch, args.requests, args.overhead)
+        print("{:>11}: {:8.1f} requests/s{}".format(
+            "no batch" if max_batch == 0 else "batch {}".format(max_batch),
+            rate, "" if stats is None else ", {} calls".format(
+                stats["batch_size"]["count"])))
+
+
+if __name__ == "__main__":
+    main()
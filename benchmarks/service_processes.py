@@ -0,0 +1,64 @@
+""" Measures the throughput of a CPU-bound service, which holds the GIL on
+every call, served by a ServiceProvider running it in worker threads and in
+an increasing number of processes, through the in-process broker:
+
+    python benchmarks/service_processes.py --requests 64 --work 200000
+"""
+from __future__ import print_function
+import argparse
+import time
+
+from google.protobuf.wrappers_pb2 import Int64Value
+from is_wire.core import Channel, Message, Subscription
+from is_wire.rpc import ServiceProvider
+
+
+def service(request, context):
+    total = 0
+    for value in range(request.value):
+        total += value * value
+    return Int64Value(value=total)
+
+
+def throughput(executor, size, n_requests, work):
+    channel = Channel("inproc://benchmark-{}-{}".format(executor, size))
+    if executor == "thread":
+        provider = ServiceProvider(channel, workers=size)
+    else:
+        provider = ServiceProvider(channel, processes=size)
+    provider.delegate("Benchmark.Service", service, Int64Value, Int64Value,
+                      executor=executor)
+    subscription = Subscription(channel)
+    for _ in range(n_requests):
+        channel.publish(Message(Int64Value(value=work),
+                                reply_to=subscription),
+                        topic="Benchmark.Service")
+
+    began = time.time()
+    for _ in range(n_requests):
+        provider.serve(channel.consume())
+    provider.join()
+    took = time.time() - began
+
+    for _ in range(n_requests):
+        channel.consume()
+    provider.close()
+    channel.close()
+    return n_requests / took
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--work", type=int, default=200000)
+    args = parser.parse_args()
+
+    for executor, size in [("thread", 4), ("process", 1), ("process", 2),
+                           ("process", 4)]:
+        print("{:>7} x {}: {:8.1f} requests/s".format(
+            executor, size,
+            throughput(executor, size, args.requests, args.work)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+""" Measures the throughput of an I/O-bound service, which sleeps on every
+call, served by a ServiceProvider with an increasing number of workers,
+through the in-process broker:
+
+    python benchmarks/service_workers.py --requests 200 --latency 0.01
+"""
+from __future__ import print_function
+import argparse
+import time
+
+from google.protobuf.wrappers_pb2 import Int64Value
+from is_wire.core import Channel, Message, Subscription
+from is_wire.rpc import ServiceProvider
+
+
+def throughput(workers, n_requests, latency):
+    channel = Channel("inproc://benchmark-workers-{}".format(workers))
+    provider = ServiceProvider(channel, workers=workers)
+
+    def service(request, context):
+        time.sleep(latency)
+        return request
+
+    provider.delegate("Benchmark.Service", service, Int64Value, Int64Value)
+    subscription = Subscription(channel)
+    for value in range(n_requests):
+        channel.publish(Message(Int64Value(value=value),
+                                reply_to=subscription),
+                        topic="Benchmark.Service")
+
+    began = time.time()
+    for _ in range(n_requests):
+        provider.serve(channel.consume())
+    provider.join()
+    took = time.time() - began
+
+    for _ in range(n_requests):
+        channel.consume()
+    provider.close()
+    channel.close()
+    return n_requests / took
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    for workers in (0, 1, 2, 4, 8, 16):
+        print("{:>3} workers: {:8.1f} requests/s".format(
+            workers, throughput(workers, args.requests, args.latency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+""" Compares the size of the AMQP properties and the time to encode and
+decode them with WireV1 and WireV2, for a traced RPC reply and for a plain
+message:
+
+    python benchmarks/wire_header.py --messages 50000
+"""
+from __future__ import print_function
+import argparse
+import time
+
+import amqp
+from is_wire.core import Message, Status, StatusCode, WireV1, WireV2
+from is_wire.core.wire.conversion import from_amqp_message
+
+
+def traced_reply():
+    reply = Message(content=b"x" * 16)
+    reply.topic = "Requester.Reply"
+    reply.correlation_id = 0x1234567890ABCDEF
+    reply.status = Status(StatusCode.OK)
+    reply.metadata = {
+        'x-b3-sampled': '1',
+        'x-b3-traceid': 'f047c6f208eb36ab',
+        'x-b3-flags': '0',
+        'x-b3-spanid': 'ef81a2f9c261473d',
+        'x-b3-parentspanid': '0000000000000000',
+    }
+    return reply
+
+
+def plain():
+    message = Message(content=b"x" * 16)
+    message.topic = "Camera.Frame"
+    return message
+
+
+def encode(wire, message):
+    properties = wire.to_amqp_properties(message)
+    amqp_message = amqp.Message(body=message.body, **properties)
+    return amqp_message._serialize_properties()
+
+
+def decode(raw):
+    amqp_message = amqp.Message(body=b"")
+    amqp_message._load_properties(amqp.spec.Basic.CLASS_ID, raw, 0)
+    amqp_message.delivery_info = {
+        "routing_key": "Requester.Reply",
+        "consumer_tag": "consumer",
+    }
+    return from_amqp_message(amqp_message)
+
+
+def measure(function, n, *args):
+    began = time.time()
+    for _ in range(n):
+        function(*args)
+    return 1e6 * (time.time() - began) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=50000)
+    args = parser.parse_args()
+
+    for name, create in [("traced reply", traced_reply), ("plain", plain)]:
+        print("{}:".format(name))
+        for wire in (WireV1, WireV2):
+            raw = encode(wire, create())
+            decoded, sent = decode(raw), create()
+            assert decoded.metadata == sent.metadata
+            assert decoded.status == sent.status
+            print("{:>8}: {:4d} bytes, encode {:6.2f} us, decode {:6.2f} us"
+                  .format(wire.__name__, len(raw),
+                          measure(lambda: encode(wire, create()),
+                                  args.messages),
+                          measure(decode, args.messages, raw)))
+
+
+if __name__ == "__main__":
+    main()
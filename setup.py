@@ -17,5 +17,14 @@ setup(
         'protobuf==3.6.0',
         'opencensus==0.5.0',
         'prometheus-client==0.3.1',
-    ]
+    ],
+    # optional codecs and compressions, used when installed
+    extras_require={
+        'msgpack': ['msgpack>=0.5.2'],
+        'ndarray': ['numpy>=1.13'],
+        'lz4': ['lz4>=1.0'],
+        'zstd': ['zstandard>=0.9'],
+        'all': ['msgpack>=0.5.2', 'numpy>=1.13', 'lz4>=1.0',
+                'zstandard>=0.9'],
+    },
 )
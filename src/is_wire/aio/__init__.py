@@ -0,0 +1,9 @@
+from is_wire.aio.channel import AsyncChannel
+from is_wire.aio.service_provider import AsyncServiceProvider
+from is_wire.aio.subscription import AsyncSubscription
+
+__all__ = [
+    "AsyncChannel",
+    "AsyncServiceProvider",
+    "AsyncSubscription",
+]
@@ -0,0 +1,248 @@
+import asyncio
+import struct
+
+import amqp
+from amqp import spec
+from amqp.exceptions import (ConnectionError, ChannelError,
+                             RecoverableConnectionError, error_for_code)
+from amqp.serialization import dumps, loads
+
+from ..core.framing import (FrameBuffer, InboundContent, FRAME_METHOD,
+                            FRAME_HEADER, FRAME_BODY, FRAME_END,
+                            FRAME_HEARTBEAT, FRAME_HEADER_SIZE)
+
+PROTOCOL_HEADER = b'AMQP\x00\x00\x09\x01'
+HEARTBEAT = struct.pack('>BHI', FRAME_HEARTBEAT, 0, 0) + FRAME_END
+CHANNEL_ID = 1
+
+CLIENT_PROPERTIES = {
+    'product': 'is-wire-py',
+    'capabilities': {},
+}
+
+# Argument formats of the methods the broker sends to us
+_INCOMING = {
+    spec.Connection.Start: 'ooFSS',
+    spec.Connection.Tune: 'BlB',
+    spec.Connection.Close: 'BsBB',
+    spec.Channel.Close: 'BsBB',
+    spec.Queue.DeclareOk: 'sll',
+    spec.Basic.ConsumeOk: 's',
+    spec.Basic.CancelOk: 's',
+    spec.Basic.Deliver: 'sLbss',
+}
+
+
+class AmqpProtocol(asyncio.Protocol):
+    """ Minimal AMQP 0-9-1 client implemented as an asyncio protocol. It
+    opens a single channel and supports the methods needed by AsyncChannel:
+    declaring exchanges and queues, binding, consuming and publishing.
+    Frames are (de)serialized with the same helpers used by py-amqp. """
+
+    def __init__(self, loop, on_deliver, heartbeat=60):
+        self._loop = loop
+        self._on_deliver = on_deliver
+        self._heartbeat = heartbeat
+        self._transport = None
+        self._buffer = bytearray()
+        self._partial = None
+        # The broker starts the handshake as soon as the connection is made
+        self._started = loop.create_future()
+        self._expected = (spec.Connection.Start, self._started)
+        self._rpc_lock = asyncio.Lock()
+        self._closed = loop.create_future()
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self._heartbeat_handle = None
+        self._last_received = loop.time()
+        self.frame_max = 131072
+
+    # asyncio.Protocol interface
+
+    def connection_made(self, transport):
+        self._transport = transport
+        transport.write(PROTOCOL_HEADER)
+
+    def data_received(self, data):
+        self._last_received = self._loop.time()
+        buffer = self._buffer
+        buffer += data
+        offset = 0
+        while len(buffer) - offset >= FRAME_HEADER_SIZE:
+            frame_type, channel, size = struct.unpack_from(
+                '>BHI', buffer, offset)
+            end = offset + FRAME_HEADER_SIZE + size
+            if len(buffer) <= end:
+                break
+            if buffer[end:end + 1] != FRAME_END:
+                self._fail(amqp.exceptions.UnexpectedFrame(
+                    "Received frame without frame-end marker"))
+                return
+            payload = bytes(buffer[offset + FRAME_HEADER_SIZE:end])
+            offset = end + 1
+            self._on_frame(frame_type, channel, payload)
+        del buffer[:offset]
+
+    def connection_lost(self, exc):
+        if self._heartbeat_handle is not None:
+            self._heartbeat_handle.cancel()
+        self._fail(exc or RecoverableConnectionError("connection closed"))
+
+    def pause_writing(self):
+        self._writable.clear()
+
+    def resume_writing(self):
+        self._writable.set()
+
+    # public interface
+
+    async def open(self, userid, password, virtual_host):
+        """ Performs the connection handshake and opens the channel """
+        start = await self._started
+        mechanisms = start[3]
+        if not isinstance(mechanisms, bytes):
+            mechanisms = mechanisms.encode()
+        if b'PLAIN' not in mechanisms.split():
+            raise ConnectionError("Broker does not support PLAIN login")
+        response = '\0{}\0{}'.format(userid, password).encode('utf-8')
+        tune = self._wait(spec.Connection.Tune)
+        self._send_method(0, spec.Connection.StartOk, 'FsSs',
+                          (CLIENT_PROPERTIES, 'PLAIN', response, 'en_US'))
+
+        channel_max, frame_max, server_heartbeat = await tune
+        self.frame_max = frame_max or self.frame_max
+        if self._heartbeat and server_heartbeat:
+            self._heartbeat = min(self._heartbeat, server_heartbeat)
+        self._send_method(0, spec.Connection.TuneOk, 'BlB',
+                          (channel_max, self.frame_max, self._heartbeat))
+        await self.call(spec.Connection.Open, 'ssb', (virtual_host, '', False),
+                        reply=spec.Connection.OpenOk, channel=0)
+        if self._heartbeat:
+            self._schedule_heartbeat()
+        await self.call(spec.Channel.Open, 's', ('', ),
+                        reply=spec.Channel.OpenOk)
+
+    async def call(self, method, format, args, reply, channel=CHANNEL_ID):
+        """ Sends a synchronous method and waits for its reply.
+        Returns:
+            tuple: arguments of the reply method.
+        """
+        async with self._rpc_lock:
+            waiter = self._wait(reply)
+            self._send_method(channel, method, format, args)
+            return await waiter
+
+    async def publish(self, exchange, routing_key, body, properties):
+        frames = FrameBuffer(CHANNEL_ID, self.frame_max)
+        frames.add_publish(exchange, routing_key, body, properties)
+        await self.writelines(frames.segments())
+
+    async def write(self, data):
+        """ Writes raw frames, waiting while the transport buffers are
+        above their high-water mark """
+        await self.writelines([data])
+
+    async def writelines(self, buffers):
+        """ Writes a sequence of buffers holding raw frames, like write """
+        if self._closed.done():
+            raise self._closed.exception()
+        if not self._writable.is_set():
+            await self._writable.wait()
+        self._transport.writelines(buffers)
+
+    async def close(self):
+        if self._closed.done():
+            return
+        try:
+            await self.call(spec.Connection.Close, 'BsBB', (0, '', 0, 0),
+                            reply=spec.Connection.CloseOk, channel=0)
+        finally:
+            self._transport.close()
+
+    # internals
+
+    def _send_method(self, channel, method, format, args):
+        payload = struct.pack('>HH', *method)
+        if format:
+            payload += dumps(format, args)
+        self._transport.write(
+            struct.pack('>BHI', FRAME_METHOD, channel, len(payload)) +
+            payload + FRAME_END)
+
+    def _wait(self, method):
+        future = self._loop.create_future()
+        if self._closed.done():
+            future.set_exception(self._closed.exception())
+        else:
+            self._expected = (method, future)
+        return future
+
+    def _on_frame(self, frame_type, channel, payload):
+        if frame_type == FRAME_METHOD:
+            method = struct.unpack_from('>HH', payload, 0)
+            format = _INCOMING.get(method)
+            args = loads(format, payload, 4)[0] if format else ()
+            if method == spec.Basic.Deliver:
+                self._partial = InboundContent(frame_method=method,
+                                               frame_args=args)
+            else:
+                self._on_method(channel, method, args)
+        elif frame_type == FRAME_HEADER:
+            self._partial.inbound_header(payload)
+            if self._partial.ready:
+                self._on_content()
+        elif frame_type == FRAME_BODY:
+            self._partial.inbound_body(payload)
+            if self._partial.ready:
+                self._on_content()
+
+    def _on_content(self):
+        message, self._partial = self._partial, None
+        consumer_tag, delivery_tag, redelivered, exchange, routing_key = \
+            message.frame_args
+        message.delivery_info = {
+            "consumer_tag": consumer_tag,
+            "delivery_tag": delivery_tag,
+            "redelivered": redelivered,
+            "exchange": exchange,
+            "routing_key": routing_key,
+        }
+        self._on_deliver(message)
+
+    def _on_method(self, channel, method, args):
+        if method == spec.Connection.Close:
+            self._send_method(0, spec.Connection.CloseOk, None, None)
+            self._fail(error_for_code(args[0], args[1], method,
+                                      ConnectionError))
+            self._transport.close()
+            return
+        if method == spec.Channel.Close:
+            self._send_method(channel, spec.Channel.CloseOk, None, None)
+            self._fail(error_for_code(args[0], args[1], method,
+                                      ChannelError))
+            self._transport.close()
+            return
+
+        if self._expected is not None and self._expected[0] == method:
+            (_, future), self._expected = self._expected, None
+            if not future.done():
+                future.set_result(args)
+
+    def _fail(self, exc):
+        if not self._closed.done():
+            self._closed.set_exception(exc)
+            # Nobody may be waiting for the connection to close
+            self._closed.exception()
+        if self._expected is not None:
+            (_, future), self._expected = self._expected, None
+            if not future.done():
+                future.set_exception(exc)
+
+    def _schedule_heartbeat(self):
+        interval = self._heartbeat / 2.0
+        if self._loop.time() - self._last_received > 2 * self._heartbeat:
+            self._transport.close()
+            return
+        self._transport.write(HEARTBEAT)
+        self._heartbeat_handle = self._loop.call_later(
+            interval, self._schedule_heartbeat)
@@ -0,0 +1,185 @@
+import asyncio
+import inspect
+import traceback
+
+import six
+
+from ..core import Logger, Status, StatusCode
+from ..core.utils import assert_type, now
+from ..rpc.context import Context
+from ..rpc.service_provider import _service_failure, _set_result, \
+    _unpack_arg
+from .channel import AsyncChannel
+from .subscription import AsyncSubscription
+
+
+class _AsyncService(object):
+    def __init__(self, function, request_type, reply_type, max_in_flight):
+        self.function = function
+        self.request_type = request_type
+        self.reply_type = reply_type
+        self.limit = asyncio.Semaphore(max_in_flight) \
+            if max_in_flight is not None else None
+
+
+class AsyncServiceProvider(object):
+    """ asyncio counterpart of is_wire.rpc.ServiceProvider. Service functions
+    may be coroutines, every request is served by its own task so a function
+    waiting on other services or databases does not delay the other calls:
+
+        async def get_user(request, context):
+            user = await database.find(request.id)
+            return User(name=user.name)
+
+        provider = AsyncServiceProvider(channel)
+        await provider.delegate("Users.Get", get_user, UserId, User)
+        await provider.run()
+    """
+    log = Logger("AsyncServiceProvider", Logger.DEBUG)
+
+    def __init__(self, channel):
+        """ Args:
+            channel (AsyncChannel): connected channel the requests are
+            consumed from and the replies published to.
+        """
+        assert_type(channel, AsyncChannel, "channel")
+        self._channel = channel
+        self._services = {}
+        self._interceptors_before = []
+        self._interceptors_after = []
+        self._subscriptions = []
+        self._tasks = set()
+
+    async def delegate(self,
+                       topic,
+                       function,
+                       request_type,
+                       reply_type,
+                       max_in_flight=None):
+        """ Bind a function to a particular topic, so everytime a message is
+            received in this topic the function will be called.
+            Args:
+                function (callable): coroutine function or function called
+                with the request and the Context, returning a reply_type
+                object or a Status.
+                max_in_flight (int): maximum number of calls of this service
+                running at the same time, unlimited by default. Further
+                requests wait for one of them to complete.
+        """
+        assert_type(topic, six.string_types, "topic")
+        if any(topic == s.name for s in self._subscriptions):
+            raise RuntimeError(
+                "Service on topic '{}' was already delegated".format(topic))
+        assert max_in_flight is None or max_in_flight > 0
+
+        self.log.debug("New service registered '{}'", topic)
+        subscription = await AsyncSubscription.create(self._channel,
+                                                      name=topic)
+        self._subscriptions.append(subscription)
+        self._services[subscription.id] = _AsyncService(
+            function, request_type, reply_type, max_in_flight)
+
+    def add_interceptor(self, interceptor):
+        """ Add an interceptor to the service provider, see
+        is_wire.rpc.ServiceProvider.add_interceptor. Interceptors are called
+        in the event loop thread and must not block. """
+        itype = type(interceptor)
+        if not hasattr(itype, "before_call") and \
+           not hasattr(itype, "after_call"):
+            raise TypeError("Interceptors must implement the Interceptor"
+                            "concept or derive from the Interceptor class")
+        self._interceptors_before.append(interceptor.before_call)
+        self._interceptors_after.append(interceptor.after_call)
+
+    def should_serve(self, message):
+        return message.subscription_id in self._services
+
+    async def serve(self, message):
+        """ Serves the message, returning once its reply is published. Raises
+        runtime error if message cannot be served. Users can check if the
+        message can be served by calling the should_serve method. """
+        try:
+            service = self._services[message.subscription_id]
+        except KeyError as error:
+            why = "Cannot serve message with subscription_id='{}'".format(
+                message.subscription_id)
+            six.raise_from(RuntimeError(why), error)
+
+        if service.limit is None:
+            await self._serve(service, message)
+        else:
+            async with service.limit:
+                await self._serve(service, message)
+
+    async def run(self):
+        """ Listens for requests forever, serving each one in a new task """
+        self.log.info("Listening for requests")
+        while True:
+            request = await self._channel.consume()
+            task = asyncio.ensure_future(self.serve(request))
+            self._tasks.add(task)
+            task.add_done_callback(self._done)
+
+    async def join(self):
+        """ Waits for the calls started by run to complete """
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+    def _done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            error = task.exception()
+            self.log.error("Task throwed exception:\n{}", "".join(
+                traceback.format_exception(type(error), error,
+                                           error.__traceback__)))
+
+    def _run_interceptors(self, interceptors, context):
+        for interceptor in interceptors:
+            try:
+                interceptor(context)
+            except Exception:
+                trace = traceback.format_exc()
+                self.log.error("Interceptor throwed exception:\n{}", trace)
+
+    async def _serve(self, service, request):
+        reply = request.create_reply()
+        context = Context(request, reply)
+
+        self._run_interceptors(self._interceptors_before, context)
+
+        if not request.deadline_exceeded():
+            arg = _unpack_arg(service.request_type, context)
+            if arg is not None:
+                result = await self._call(service, arg, context)
+                if result is not None:
+                    _set_result(reply, result)
+
+        timeouted = request.deadline_exceeded()
+        if timeouted:
+            reply.status = Status(StatusCode.DEADLINE_EXCEEDED)
+
+        self._run_interceptors(self._interceptors_after, context)
+
+        if not timeouted and reply.has_topic():
+            await self._channel.publish(reply)
+
+    async def _call(self, service, arg, context):
+        """ Returns: the result of the function, or None if it was cancelled
+        when the deadline of the request was exceeded """
+        try:
+            result = service.function(arg, context)
+            if inspect.isawaitable(result):
+                request = context.request
+                wait = request.created_at + request.timeout - now() \
+                    if request.has_timeout() else None
+                try:
+                    result = await asyncio.wait_for(result, wait)
+                except asyncio.TimeoutError:
+                    if not request.deadline_exceeded():
+                        raise
+                    return None
+            assert_type(result, (Status, service.reply_type),
+                        "function result")
+            return result
+        except Exception:
+            return _service_failure()
@@ -0,0 +1,53 @@
+from ..core.subscription import Subscription
+from ..core.utils import consumer_id
+
+
+class AsyncSubscription(Subscription):
+    """ asyncio counterpart of is_wire.core.Subscription. Since creating the
+    underlying queue requires talking to the broker, instances are created
+    with the create coroutine:
+
+        subscription = await AsyncSubscription.create(channel)
+    """
+
+    def __init__(self, channel, name=None):
+        self._id = consumer_id()
+        self._name = self._id if name is None else name
+        self._topics = set()
+        self._channel = channel
+        self._backend = channel._backend
+        self._exchange = channel._exchange
+
+    @classmethod
+    async def create(cls, channel, name=None):
+        """ Creates a new subscription, declaring its queue on the broker.
+        Args:
+            channel (AsyncChannel): connected channel.
+            name (str): name of the queue, a unique one is generated if not
+            given.
+        Returns:
+            AsyncSubscription: subscription ready to receive messages.
+        """
+        subscription = cls(channel, name)
+        backend = subscription._backend
+        await backend.queue_declare(subscription.name)
+        await backend.queue_bind(subscription.name, subscription._exchange,
+                                 subscription.name)
+        await backend.basic_consume(subscription.name, subscription.id)
+        return subscription
+
+    async def subscribe(self, topic):
+        """ Subscribes to the given topic.
+        Args:
+            topic (str): topic to receive messages from.
+        """
+        await self._backend.queue_bind(self._name, self._exchange, topic)
+        self._topics.add(topic)
+
+    async def unsubscribe(self, topic):
+        """ Unsubscribe from the given topic.
+        Args:
+            topic (str): topic to stop receiving messages from.
+        """
+        await self._backend.queue_unbind(self._name, self._exchange, topic)
+        self._topics.remove(topic)
@@ -1,16 +1,30 @@
 from is_wire.core.channel import Channel
+from is_wire.core.pool import ChannelPool
 from is_wire.core.subscription import Subscription
+from is_wire.core.acknowledgement import AckMode
+from is_wire.core.reconnection import Backoff, OutboxPolicy
+from is_wire.core.compression import Compression
+from is_wire.core.chunking import StreamedMessage, TransferMode
 from is_wire.core.message import Message
 from is_wire.core.logger import Logger
 from is_wire.core.utils import now, new_uuid
 from is_wire.core.wire.status import Status, StatusCode
 from is_wire.core.wire.content_type import ContentType
+from is_wire.core.wire.codec import Codec
+from is_wire.core.wire.conversion import WireV1, WireV2
 from is_wire.core.tracing.tracer import Tracer
 from opencensus.common.transports.async_ import AsyncTransport
 
 __all__ = [
     "Channel",
+    "ChannelPool",
     "Subscription",
+    "AckMode",
+    "Backoff",
+    "OutboxPolicy",
+    "Compression",
+    "StreamedMessage",
+    "TransferMode",
     "Message",
     "Logger",
     "now",
@@ -18,6 +32,9 @@ __all__ = [
     "Status",
     "StatusCode",
     "ContentType",
+    "Codec",
+    "WireV1",
+    "WireV2",
     "Tracer",
     "AsyncTransport",
 ]
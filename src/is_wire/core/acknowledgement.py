@@ -0,0 +1,154 @@
+import threading
+from collections import OrderedDict
+from enum import Enum
+
+from .utils import now
+
+
+class AckMode(Enum):
+    # Messages are considered acknowledged as soon as they are delivered
+    AUTO = 0
+    # Messages must be acknowledged with Message.ack or Message.nack
+    MANUAL = 1
+
+
+class _ConsumerAcks(object):
+    def __init__(self, batch_size, interval):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pending = 0
+        self.since = None
+
+
+class Acknowledger(object):
+    """ Coalesces the acknowledgements of the manually acknowledged
+    deliveries of a channel. Delivery tags are sequential per channel, so
+    every acked tag lower than the oldest unacked one can be confirmed to the
+    broker with a single basic_ack(multiple=True). Pending acks are sent when
+    a consumer accumulates batch_size of them or the oldest one is waiting
+    for more than interval seconds. Deliveries may be registered from a
+    thread other than the one acknowledging them, the lock protecting the
+    pending tags is never held while talking to the broker. """
+
+    def __init__(self, channel):
+        self._channel = channel
+        self._consumers = {}
+        # delivered and not yet acked tags, in delivery order
+        self._unacked = OrderedDict()
+        # acked tags not yet sent to the broker
+        self._acked = []
+        self._lock = threading.Lock()
+        # keeps the acks sent by different threads in order
+        self._send_lock = threading.Lock()
+        # set once the connection the tags belong to was lost
+        self._stale = False
+
+    def add_consumer(self, consumer_tag, batch_size, interval):
+        assert batch_size >= 1
+        assert interval >= 0.0
+        with self._lock:
+            self._consumers[consumer_tag] = _ConsumerAcks(batch_size, interval)
+
+    def remove_consumer(self, consumer_tag):
+        with self._lock:
+            self._consumers.pop(consumer_tag, None)
+
+    def is_manual(self, consumer_tag):
+        return consumer_tag in self._consumers
+
+    def delivered(self, delivery_tag, consumer_tag):
+        with self._lock:
+            self._unacked[delivery_tag] = consumer_tag
+
+    def is_pending(self, delivery_tag):
+        return delivery_tag in self._unacked
+
+    def ack(self, delivery_tag):
+        with self._send_lock:
+            with self._lock:
+                if self._stale:
+                    return
+                consumer_tag = self._unacked.pop(delivery_tag)
+                self._acked.append(delivery_tag)
+
+                acks = self._consumers.get(consumer_tag)
+                if acks is not None:
+                    acks.pending += 1
+                    if acks.since is None:
+                        acks.since = now()
+                    if acks.pending < acks.batch_size:
+                        return
+                pending = self._take()
+            self._send(pending)
+
+    def nack(self, delivery_tag, requeue=True):
+        with self._send_lock:
+            with self._lock:
+                if self._stale:
+                    return
+                del self._unacked[delivery_tag]
+            self._channel.basic_nack(delivery_tag, multiple=False,
+                                     requeue=requeue)
+
+    def renew(self):
+        """ Creates an acknowledger for the same consumers to be used after
+        reconnecting, since delivery tags are only valid in the channel they
+        were received from. The messages delivered before were requeued by
+        the broker, acknowledging them becomes a no-op.
+        Returns:
+            Acknowledger: new acknowledger.
+        """
+        acker = Acknowledger(self._channel)
+        with self._lock:
+            for consumer_tag, acks in self._consumers.items():
+                acker.add_consumer(consumer_tag, acks.batch_size,
+                                   acks.interval)
+            self._stale = True
+            self._unacked = OrderedDict()
+            self._acked = []
+        return acker
+
+    def deadline(self):
+        """ Returns: time at which the pending acks must be sent, or None
+        if there is nothing pending """
+        with self._lock:
+            deadlines = [
+                acks.since + acks.interval
+                for acks in self._consumers.values() if acks.since is not None
+            ]
+        return min(deadlines) if deadlines else None
+
+    def tick(self):
+        """ Sends the pending acks if their deadline has passed """
+        deadline = self.deadline()
+        if deadline is not None and now() >= deadline:
+            self.flush()
+
+    def flush(self):
+        """ Sends every pending ack to the broker """
+        with self._send_lock:
+            with self._lock:
+                pending = self._take()
+            self._send(pending)
+
+    def _take(self):
+        # Called with the lock held, returns the (delivery_tag, multiple)
+        # acks to be sent and forgets about them
+        if not self._acked:
+            return []
+
+        oldest = next(iter(self._unacked), None)
+        covered = [t for t in self._acked if oldest is None or t < oldest]
+        pending = [(max(covered), True)] if covered else []
+        pending.extend((tag, False) for tag in self._acked
+                       if oldest is not None and tag > oldest)
+
+        self._acked = []
+        for acks in self._consumers.values():
+            acks.pending = 0
+            acks.since = None
+        return pending
+
+    def _send(self, pending):
+        for delivery_tag, multiple in pending:
+            self._channel.basic_ack(delivery_tag, multiple=multiple)
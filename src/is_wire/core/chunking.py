@@ -0,0 +1,249 @@
+from enum import Enum
+
+from .message import Message
+from .logger import Logger
+from .utils import now, new_uuid
+
+# Metadata of the chunks of a transfer
+TRANSFER_ID = "transfer-id"
+TRANSFER_INDEX = "transfer-index"
+TRANSFER_COUNT = "transfer-count"
+TRANSFER_OFFSET = "transfer-offset"
+TRANSFER_SIZE = "transfer-size"
+_TRANSFER_KEYS = (TRANSFER_ID, TRANSFER_INDEX, TRANSFER_COUNT,
+                  TRANSFER_OFFSET, TRANSFER_SIZE)
+
+DEFAULT_CHUNK_SIZE = 1 << 20
+
+
+class TransferMode(Enum):
+    # consume returns the message once all its chunks were received, copied
+    # into a buffer allocated when the first one arrives
+    REASSEMBLE = 0
+    # consume returns a StreamedMessage when the first chunk arrives, its
+    # body is read in pieces with StreamedMessage.chunks
+    STREAM = 1
+
+
+def split(message, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Splits a message in chunks that share its properties and carry
+    slices of its body, without copying it.
+    Args:
+        message (Message): message to be split.
+        chunk_size (int): maximum body size of each chunk.
+    Returns:
+        list of Message: chunks to be published in order.
+    """
+    assert chunk_size > 0
+    body = memoryview(message.body) if message.has_body() else b''
+    count = max(1, (len(body) + chunk_size - 1) // chunk_size)
+    transfer_id = "{:X}".format(new_uuid())
+
+    chunks = []
+    for index in range(count):
+        offset = index * chunk_size
+        metadata = dict(message.metadata)
+        metadata[TRANSFER_ID] = transfer_id
+        metadata[TRANSFER_INDEX] = index
+        metadata[TRANSFER_COUNT] = count
+        metadata[TRANSFER_OFFSET] = offset
+        metadata[TRANSFER_SIZE] = len(body)
+        chunk = Message._create(
+            topic=message.topic,
+            body=body[offset:offset + chunk_size],
+            reply_to=message.reply_to,
+            correlation_id=message.correlation_id,
+            content_type=message.content_type,
+            created_at=message.created_at,
+            metadata=metadata,
+            timeout=message.timeout,
+            status=message.status,
+            wire_version=message._wire_version,
+        )
+        chunk._compression = message.compression
+        chunks.append(chunk)
+    return chunks
+
+
+def is_chunk(amqp_message):
+    """ Returns: True if a received amqp.Message is a chunk of a transfer """
+    headers = amqp_message.properties.get("application_headers")
+    return headers is not None and TRANSFER_ID in headers
+
+
+class _ChunksAcked(object):
+    """ Acknowledger of a reassembled message. In manual ack mode its chunks
+    are acknowledged as soon as they are received, otherwise a subscription
+    with a prefetch below the number of chunks would stop receiving them,
+    so acknowledging the message does nothing. """
+
+    def ack(self, delivery_tag):
+        pass
+
+    def nack(self, delivery_tag, requeue=True):
+        pass
+
+
+class _Transfer(object):
+    def __init__(self, message, stream):
+        metadata = message.metadata
+        self.size = metadata[TRANSFER_SIZE]
+        self.count = metadata[TRANSFER_COUNT]
+        self.received = set()
+        self.updated = now()
+        self.expired = False
+        self.buffer = None if stream else bytearray(self.size)
+        # index -> body of the chunks not yet read from a stream
+        self.pending = {}
+        self.message = (StreamedMessage if stream else Message)._create(
+            topic=message.topic,
+            reply_to=message.reply_to,
+            subscription_id=message.subscription_id,
+            correlation_id=message.correlation_id,
+            content_type=message.content_type,
+            created_at=message.created_at,
+            metadata=dict((key, value) for key, value in metadata.items()
+                          if key not in _TRANSFER_KEYS),
+            timeout=message.timeout,
+            status=message.status,
+            wire_version=message._wire_version,
+        )
+        self.message._acker = _ChunksAcked()
+        if stream:
+            self.message._transfer = self
+
+    def complete(self):
+        return len(self.received) == self.count
+
+
+class StreamedMessage(Message):
+    """ Message received in TransferMode.STREAM before all its chunks
+    arrived. Its body is empty, the chunks are read in order with chunks:
+
+        message = channel.consume()
+        if isinstance(message, StreamedMessage):
+            for piece in message.chunks(timeout=5.0):
+                output.write(piece)
+    """
+
+    __slots__ = ("_transfer", "_pull")
+
+    def chunks(self, timeout=None):
+        """ Iterates over the body chunks, in order, waiting for them to
+        arrive. Messages of other transfers and topics received in the
+        meantime are kept to be returned by consume.
+        Args:
+            timeout (float): maximum period in seconds to wait for each
+            chunk. If it is exceeded a socket.timeout Exception is raised.
+        Returns:
+            iterator over the chunk bodies.
+        """
+        transfer = self._transfer
+        for index in range(transfer.count):
+            deadline = None if timeout is None else now() + timeout
+            while index not in transfer.pending:
+                if transfer.expired:
+                    raise RuntimeError(
+                        "Transfer expired before all chunks were received")
+                self._pull(deadline)
+            yield transfer.pending.pop(index)
+
+
+class Reassembler(object):
+    """ Rebuilds the messages split by split from their chunks, which may be
+    interleaved with other messages and chunks of other transfers. Transfers
+    that stay incomplete for 'timeout' seconds are discarded. In manual ack
+    mode the chunks are acknowledged once received, so the broker keeps
+    delivering them whatever the prefetch of the subscription. """
+
+    log = Logger("Reassembler")
+
+    def __init__(self, mode=TransferMode.REASSEMBLE, timeout=60.0):
+        """ Args:
+            mode (TransferMode): how transfers are delivered.
+            timeout (float): period in seconds after which a transfer with
+            no new chunks is discarded.
+        """
+        assert timeout > 0.0
+        self._mode = mode
+        self._timeout = timeout
+        self._transfers = {}
+        self.completed = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._transfers)
+
+    def add(self, chunk, pull=None):
+        """ Adds a received chunk.
+        Args:
+            chunk (Message): received chunk.
+            pull (callable): with TransferMode.STREAM, called with a deadline
+            to receive more messages while a stream waits for chunks.
+        Returns:
+            Message: the reassembled message when chunk was the last one, a
+            StreamedMessage for the first chunk of a stream or None.
+        """
+        self.expire()
+        metadata = chunk.metadata
+        transfer_id = metadata[TRANSFER_ID]
+        index = metadata[TRANSFER_INDEX]
+
+        transfer = self._transfers.get(transfer_id)
+        created = transfer is None
+        if created:
+            transfer = _Transfer(chunk, self._mode == TransferMode.STREAM)
+            self._transfers[transfer_id] = transfer
+            if self._mode == TransferMode.STREAM:
+                transfer.message._pull = pull
+
+        transfer.updated = now()
+        redelivered = index in transfer.received
+        if not redelivered:
+            transfer.received.add(index)
+            if transfer.buffer is None:
+                transfer.pending[index] = chunk.body
+            else:
+                body = chunk.body
+                offset = metadata[TRANSFER_OFFSET]
+                transfer.buffer[offset:offset + len(body)] = body
+        if chunk._acker is not None:
+            chunk.ack()
+        if chunk._pool is not None:
+            chunk.release()
+        if redelivered:
+            return None
+
+        if transfer.complete():
+            del self._transfers[transfer_id]
+            self.completed += 1
+            if transfer.buffer is not None:
+                transfer.message._body = memoryview(transfer.buffer)
+                transfer.buffer = None
+                return transfer.message
+        return transfer.message if created and transfer.buffer is None \
+            else None
+
+    def expiration(self):
+        """ Returns: when the next transfer expires, None if there is no
+        transfer in progress """
+        if not self._transfers:
+            return None
+        return min(transfer.updated for transfer in
+                   self._transfers.values()) + self._timeout
+
+    def expire(self):
+        """ Discards the transfers without new chunks for too long """
+        if not self._transfers:
+            return
+        limit = now() - self._timeout
+        for transfer_id, transfer in list(self._transfers.items()):
+            if transfer.updated <= limit:
+                del self._transfers[transfer_id]
+                transfer.expired = True
+                transfer.buffer = None
+                self.expired += 1
+                self.log.warn(
+                    "Discarding transfer {} of topic '{}', received {} of {}"
+                    " chunks", transfer_id, transfer.message.topic,
+                    len(transfer.received), transfer.count)
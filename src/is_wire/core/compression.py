@@ -0,0 +1,183 @@
+import itertools
+import threading
+import time
+import zlib
+
+try:
+    import lzma
+except ImportError:  # python 2
+    lzma = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class _Compressor(object):
+    def __init__(self, compress, decompress):
+        self.compress = compress
+        self.decompress = decompress
+
+
+# content_encoding -> compressor, for the available libraries
+_COMPRESSORS = {
+    "deflate":
+    _Compressor(
+        lambda body, level: zlib.compress(body, 6 if level is None else level),
+        zlib.decompress),
+}
+
+if lzma is not None:
+    _COMPRESSORS["xz"] = _Compressor(
+        lambda body, level: lzma.compress(body, preset=level),
+        lzma.decompress)
+
+if lz4_frame is not None:
+    _COMPRESSORS["lz4"] = _Compressor(
+        lambda body, level: lz4_frame.compress(
+            body, compression_level=level or 0), lz4_frame.decompress)
+
+if zstandard is not None:
+    _COMPRESSORS["zstd"] = _Compressor(
+        lambda body, level: zstandard.ZstdCompressor(
+            level=3 if level is None else level).compress(body),
+        lambda body: zstandard.ZstdDecompressor().decompress(body))
+
+
+# content encodings of the compressions, whether their library is installed
+# or not. Bodies with other encodings, e.g. 'utf-8', are not compressed
+_ENCODINGS = ("deflate", "xz", "lz4", "zstd")
+
+
+def is_compressed(encoding):
+    """ Returns: True if a content_encoding is the one of a compression,
+    even if its library is not installed """
+    return encoding in _ENCODINGS
+
+
+def available_encodings():
+    """ Returns: list of the supported content encodings, 'deflate' (zlib)
+    is always available, 'xz' (lzma), 'lz4' and 'zstd' depend on the
+    installed libraries """
+    return sorted(_COMPRESSORS)
+
+
+def decompress(encoding, body):
+    """ Decompresses a message body.
+    Args:
+        encoding (str): content_encoding of the message.
+        body (bytes-like): compressed body.
+    Returns:
+        bytes: decompressed body.
+    """
+    try:
+        compressor = _COMPRESSORS[encoding]
+    except KeyError:
+        raise RuntimeError(
+            "Unsupported content_encoding '{}'".format(encoding))
+    return compressor.decompress(body)
+
+
+class _TopicStats(object):
+    def __init__(self):
+        self.messages = 0
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+
+class Compression(object):
+    """ Compresses the bodies of published messages that are at least
+    'threshold' bytes long, setting the AMQP content_encoding property so
+    receivers decompress them transparently when the body is accessed.
+    Bodies that do not shrink are sent uncompressed. Keeps per topic
+    statistics to help choosing the encoding and threshold of each topic.
+
+        channel = Channel(uri, compression=Compression("deflate", 4096))
+        # or for a single message
+        message.compression = Compression("xz", level=1)
+    """
+
+    def __init__(self, encoding="deflate", threshold=1024, level=None):
+        """ Args:
+            encoding (str): one of available_encodings().
+            threshold (int): minimum body size in bytes to be compressed.
+            level (int): compression level, the library default if None.
+        """
+        if encoding not in _COMPRESSORS:
+            raise ValueError(
+                "Unsupported encoding '{}', available ones are {}".format(
+                    encoding, available_encodings()))
+        assert threshold >= 0
+        self.encoding = encoding
+        self.threshold = threshold
+        self.level = level
+        self._compress = _COMPRESSORS[encoding].compress
+        self._lock = threading.Lock()
+        self._topics = {}
+
+    def encode(self, body, properties, topic, other_topics=()):
+        """ Compresses a body if it is large enough and worth it.
+        Args:
+            body (bytes-like): message body.
+            properties (dict): AMQP properties of the message, content_encoding
+            is set when the body is compressed.
+            topic (str): topic the message is published to.
+            other_topics (iterable of str): other topics the same encoded
+            body is published to, counted in their stats too. The time spent
+            compressing is only counted for topic.
+        Returns:
+            bytes-like: body to be published.
+        """
+        if len(body) < self.threshold:
+            return body
+
+        began = time.time()
+        compressed = self._compress(body, self.level)
+        took = time.time() - began
+
+        worth = len(compressed) < len(body)
+        with self._lock:
+            for name in itertools.chain((topic, ), other_topics):
+                stats = self._topics.get(name)
+                if stats is None:
+                    stats = self._topics[name] = _TopicStats()
+                stats.messages += 1
+                stats.compressed += int(worth)
+                stats.bytes_in += len(body)
+                stats.bytes_out += len(compressed) if worth else len(body)
+                stats.seconds += took
+                took = 0.0
+
+        if not worth:
+            return body
+        properties["content_encoding"] = self.encoding
+        return compressed
+
+    def stats(self):
+        """ Returns:
+            dict: for every topic with messages above the threshold, the
+            number of those messages and how many were compressed, their
+            total size before and after compression, the compression ratio
+            and the time spent compressing in seconds.
+        """
+        with self._lock:
+            return {
+                topic: {
+                    "messages": stats.messages,
+                    "compressed": stats.compressed,
+                    "bytes_in": stats.bytes_in,
+                    "bytes_out": stats.bytes_out,
+                    "ratio": float(stats.bytes_in) / stats.bytes_out
+                    if stats.bytes_out else 1.0,
+                    "seconds": stats.seconds,
+                }
+                for topic, stats in self._topics.items()
+            }
@@ -0,0 +1,257 @@
+import ssl
+from collections import defaultdict, deque
+from itertools import islice
+from struct import pack, unpack_from
+
+import amqp
+from amqp import spec
+from amqp.exceptions import UnexpectedFrame
+from amqp.serialization import dumps
+
+FRAME_METHOD = 1
+FRAME_HEADER = 2
+FRAME_BODY = 3
+FRAME_HEARTBEAT = 8
+FRAME_END = b'\xce'
+
+# Frame type, channel and payload size
+FRAME_HEADER_SIZE = 7
+
+# Bodies at least this large are referenced by the frame buffer instead of
+# being copied into it, and written with scatter-gather I/O
+ZERO_COPY_SIZE = 64 * 1024
+
+# Maximum number of buffers passed to a single sendmsg call
+_IOV_MAX = 1024
+
+# Methods followed by a content header and body frames
+_CONTENT_METHODS = frozenset([
+    spec.Basic.Return,
+    spec.Basic.Deliver,
+    spec.Basic.GetOk,
+])
+
+
+class FrameBuffer(object):
+    """ Accumulates the AMQP frames of several Basic.Publish commands so they
+    can be written to the broker socket at once. Consecutive publishes of
+    the same body and properties objects to other routing keys reuse their
+    content frames, see Channel.publish_to.
+    Bodies of at least ZERO_COPY_SIZE bytes are not copied, the buffer keeps
+    views over them, so they must not be modified until written. """
+
+    def __init__(self, channel_id, frame_max):
+        self._channel_id = channel_id
+        self._chunk_size = frame_max - FRAME_HEADER_SIZE - len(FRAME_END)
+        self._buffer = bytearray()
+        # buffers completed before the current one, see segments
+        self._segments = []
+        self._size = 0
+        # (body, properties, frames) of the last small body added
+        self._last_content = None
+        # exchange -> Basic.Publish arguments up to the routing key
+        self._methods = {}
+        self.count = 0
+
+    def __len__(self):
+        return self._size + len(self._buffer)
+
+    def add_publish(self, exchange, routing_key, body, properties):
+        """ Encodes a Basic.Publish command with its content header and body
+        frames. Nothing is appended to the buffer if encoding fails.
+        Args:
+            exchange (str): exchange to publish to.
+            routing_key (str): message routing key.
+            body (bytes, bytearray or memoryview): message body.
+            properties (dict): AMQP basic properties.
+        """
+        method = self._publish_method(exchange, routing_key)
+        last = self._last_content
+        if last is not None and last[0] is body and last[1] is properties:
+            self._buffer += self._frame(FRAME_METHOD, method)
+            self._buffer += last[2]
+            self.count += 1
+            return
+
+        header = self._frame(FRAME_HEADER,
+                             self.content_header(properties, len(body)))
+        if len(body) >= ZERO_COPY_SIZE:
+            self._buffer += self._frame(FRAME_METHOD, method) + header
+            self._add_body(body)
+        else:
+            content = header + self._body_frames(body)
+            self._buffer += self._frame(FRAME_METHOD, method)
+            self._buffer += content
+            self._last_content = (body, properties, content)
+        self.count += 1
+
+    def _publish_method(self, exchange, routing_key):
+        """ Returns: payload of a Basic.Publish method frame, as serialized
+        by dumps('Bssbb', (0, exchange, routing_key, False, False)) """
+        prefix = self._methods.get(exchange)
+        if prefix is None:
+            prefix = self._methods[exchange] = pack(
+                '>HH', *spec.Basic.Publish) + dumps('Bs', (0, exchange))
+        key = routing_key.encode('utf-8')
+        if len(key) > 255:
+            raise ValueError(
+                "Routing key '{}' is longer than 255 bytes".format(
+                    routing_key))
+        # mandatory and immediate bits unset
+        return prefix + pack('B', len(key)) + key + b'\x00'
+
+    def content_header(self, properties, body_size):
+        """ Returns the payload of a content header frame. Properties are
+        serialized for every message, as the timestamp and correlation_id
+        usually differ """
+        serialized = amqp.Message(**properties)._serialize_properties()
+        return pack('>HHQ', spec.Basic.CLASS_ID, 0, body_size) + serialized
+
+    def getvalue(self):
+        """ Returns: bytearray with every encoded frame. Copies the large
+        bodies, prefer writing the segments. """
+        if not self._segments:
+            return self._buffer
+        value = bytearray()
+        for segment in self.segments():
+            value += segment
+        return value
+
+    def segments(self):
+        """ Returns: list of buffers that written in order make up every
+        encoded frame """
+        return self._segments + [self._buffer]
+
+    def clear(self):
+        self._buffer = bytearray()
+        self._segments = []
+        self._size = 0
+        self._last_content = None
+        self.count = 0
+
+    def _add_body(self, body):
+        if len(body) >= ZERO_COPY_SIZE:
+            self._add_large_body(memoryview(body))
+        else:
+            self._buffer += self._body_frames(body)
+
+    def _body_frames(self, body):
+        frames = bytearray()
+        for offset in range(0, len(body), self._chunk_size):
+            chunk = body[offset:offset + self._chunk_size]
+            frames += pack('>BHI', FRAME_BODY, self._channel_id, len(chunk))
+            frames += chunk
+            frames += FRAME_END
+        return bytes(frames)
+
+    def _add_large_body(self, view):
+        for offset in range(0, len(view), self._chunk_size):
+            chunk = view[offset:offset + self._chunk_size]
+            self._buffer += pack('>BHI', FRAME_BODY, self._channel_id,
+                                 len(chunk))
+            self._segments.append(self._buffer)
+            self._segments.append(chunk)
+            self._size += len(self._buffer) + len(chunk)
+            self._buffer = bytearray(FRAME_END)
+
+    def _frame(self, frame_type, payload):
+        return pack('>BHI', frame_type, self._channel_id,
+                    len(payload)) + payload + FRAME_END
+
+
+def write_segments(transport, segments):
+    """ Writes buffers to the socket of an amqp transport without joining
+    them, using a scatter-gather sendmsg when the socket supports it.
+    Args:
+        transport (amqp.transport.Transport): connected transport.
+        segments (list): bytes-like objects to be written in order.
+    """
+    sock = getattr(transport, "sock", None)
+    sendmsg = getattr(sock, "sendmsg", None)
+    if sendmsg is None or isinstance(sock, ssl.SSLSocket):
+        for segment in segments:
+            transport.write(segment)
+        return
+
+    pending = deque(memoryview(s) for s in segments if len(s) != 0)
+    while pending:
+        sent = sendmsg(list(islice(pending, _IOV_MAX)))
+        while sent > 0:
+            head = pending[0]
+            if sent >= len(head):
+                sent -= len(head)
+                pending.popleft()
+            else:
+                pending[0] = head[sent:]
+                sent = 0
+
+
+class InboundContent(amqp.Message):
+    """ Message received from the broker whose body frames are copied into a
+    buffer allocated once the content header announces the body size, instead
+    of being kept until the last one arrives and then joined. The body of a
+    message split in several frames is a memoryview over that buffer. """
+
+    def inbound_body(self, buf):
+        received = self.body_received
+        if received == 0 and len(buf) >= self.body_size:
+            self.body = buf
+            self.body_received = len(buf)
+            self.ready = True
+            return
+
+        if received == 0:
+            self._buffer = bytearray(self.body_size)
+        end = received + len(buf)
+        self._buffer[received:end] = buf
+        self.body_received = end
+        if end >= self.body_size:
+            self.body = memoryview(self._buffer)
+            self._buffer = None
+            self.ready = True
+
+
+def frame_handler(connection, callback, content_methods=_CONTENT_METHODS):
+    """ Creates the closure that assembles the frames read by an
+    amqp.Connection into methods, like the one of py-amqp, but building the
+    received messages as InboundContent. Passed to amqp.Connection as its
+    frame_handler. """
+    expected_types = defaultdict(lambda: FRAME_METHOD)
+    partial_messages = {}
+
+    def on_frame(frame):
+        frame_type, channel, buf = frame
+        connection.bytes_recv += 1
+        if frame_type not in (expected_types[channel], FRAME_HEARTBEAT):
+            raise UnexpectedFrame(
+                'Received frame {0} while expecting type: {1}'.format(
+                    frame_type, expected_types[channel]))
+
+        if frame_type == FRAME_METHOD:
+            method_sig = unpack_from('>HH', buf, 0)
+            if method_sig in content_methods:
+                partial_messages[channel] = InboundContent(
+                    frame_method=method_sig, frame_args=buf)
+                expected_types[channel] = FRAME_HEADER
+                return False
+            callback(channel, method_sig, buf, None)
+            return True
+
+        if frame_type == FRAME_HEARTBEAT:
+            return False
+
+        message = partial_messages[channel]
+        if frame_type == FRAME_HEADER:
+            message.inbound_header(buf)
+        else:
+            message.inbound_body(buf)
+        if not message.ready:
+            expected_types[channel] = FRAME_BODY
+            return False
+
+        expected_types[channel] = FRAME_METHOD
+        del partial_messages[channel]
+        callback(channel, message.frame_method, message.frame_args, message)
+        return True
+
+    return on_frame
@@ -0,0 +1,417 @@
+import copy
+import socket
+import threading
+from collections import deque, namedtuple, OrderedDict
+
+import amqp
+from amqp.exceptions import (NotFound, PreconditionFailed,
+                             RecoverableConnectionError)
+from six import text_type
+
+from .utils import now, consumer_id, as_bytes
+
+queue_declare_ok_t = namedtuple("queue_declare_ok_t",
+                                ("queue", "message_count", "consumer_count"))
+
+
+def topic_matches(binding, routing_key):
+    """ Checks if a routing key matches a binding key using the AMQP topic
+    exchange rules, where '*' substitutes exactly one word and '#' zero or
+    more words.
+    Args:
+        binding (str): binding key, possibly with wildcards.
+        routing_key (str): routing key of the published message.
+    Returns:
+        bool: True if the routing key matches the binding.
+    """
+    if binding == routing_key:
+        return True
+    return _match(binding.split('.'), 0, routing_key.split('.'), 0)
+
+
+def _match(pattern, p, words, w):
+    while p < len(pattern):
+        if pattern[p] == '#':
+            return any(
+                _match(pattern, p + 1, words, i)
+                for i in range(w, len(words) + 1))
+        if w == len(words) or (pattern[p] != '*'
+                               and pattern[p] != words[w]):
+            return False
+        p += 1
+        w += 1
+    return w == len(words)
+
+
+class _Queue(object):
+    def __init__(self, name, exclusive, auto_delete):
+        self.name = name
+        self.exclusive = exclusive
+        self.auto_delete = auto_delete
+        self.messages = deque()
+        self.consumers = deque()
+
+
+class _Consumer(object):
+    def __init__(self, tag, queue, channel, callback, no_ack, prefetch):
+        self.tag = tag
+        self.queue = queue
+        self.channel = channel
+        self.callback = callback
+        self.no_ack = no_ack
+        self.prefetch = prefetch
+        self.unacked = 0
+
+    def can_receive(self):
+        return self.no_ack or not self.prefetch or \
+            self.unacked < self.prefetch
+
+
+class InProcBroker(object):
+    """ Process-local message broker that emulates the subset of the AMQP
+    0-9-1 model used by this library: topic exchanges, auto-delete queues,
+    consumers identified by tags and per-message expiration. Brokers are
+    shared by name, so every Channel created with the same 'inproc://name'
+    URI talks to the same broker. """
+
+    _brokers = {}
+    _brokers_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, name=""):
+        """ Returns the broker registered with the given name, creating it
+        if it does not exist yet """
+        with cls._brokers_lock:
+            broker = cls._brokers.get(name)
+            if broker is None:
+                broker = cls._brokers[name] = cls()
+            return broker
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # exchange name -> {binding key -> set of queue names}
+        self._exchanges = {"": {}}
+        self._queues = {}
+
+    def declare_exchange(self, exchange, type):
+        if type != "topic":
+            raise NotImplementedError(
+                "Exchange type '{}' not supported".format(type))
+        with self.lock:
+            self._exchanges.setdefault(exchange, {})
+
+    def declare_queue(self, name, exclusive, auto_delete):
+        with self.lock:
+            if not name:
+                name = "amq.gen-{}".format(consumer_id())
+            queue = self._queues.get(name)
+            if queue is None:
+                queue = self._queues[name] = _Queue(name, exclusive,
+                                                    auto_delete)
+            return queue_declare_ok_t(name, len(queue.messages),
+                                      len(queue.consumers))
+
+    def delete_queue(self, name):
+        with self.lock:
+            queue = self._queues.pop(name, None)
+            if queue is None:
+                return 0
+            for bindings in self._exchanges.values():
+                for queues in bindings.values():
+                    queues.discard(name)
+            for consumer in queue.consumers:
+                consumer.channel._consumers.pop(consumer.tag, None)
+            return len(queue.messages)
+
+    def bind(self, queue, exchange, routing_key):
+        with self.lock:
+            self._get_queue(queue)
+            bindings = self._get_exchange(exchange)
+            bindings.setdefault(routing_key, set()).add(queue)
+
+    def unbind(self, queue, exchange, routing_key):
+        with self.lock:
+            queues = self._get_exchange(exchange).get(routing_key, set())
+            queues.discard(queue)
+
+    def consume(self, queue, consumer):
+        with self.lock:
+            self._get_queue(queue).consumers.append(consumer)
+            self._dispatch(consumer.queue)
+
+    def cancel(self, consumer):
+        with self.lock:
+            queue = self._queues.get(consumer.queue)
+            if queue is None:
+                return
+            try:
+                queue.consumers.remove(consumer)
+            except ValueError:
+                return
+            if queue.auto_delete and not queue.consumers:
+                self.delete_queue(queue.name)
+
+    def publish(self, message, exchange, routing_key):
+        with self.lock:
+            if exchange == "":
+                names = {routing_key} if routing_key in self._queues \
+                    else set()
+            else:
+                names = set()
+                for binding, queues in self._get_exchange(exchange).items():
+                    if queues and topic_matches(binding, routing_key):
+                        names.update(queues)
+
+            expiration = message.properties.get("expiration")
+            expires_at = None if expiration is None else \
+                now() + int(expiration) / 1000.0
+
+            for name in names:
+                queue = self._queues[name]
+                queue.messages.append((message, exchange, routing_key,
+                                       expires_at, False))
+                self._dispatch(name)
+
+    def requeue(self, name, message, exchange, routing_key):
+        """ Puts a rejected or never acknowledged message back in the front
+        of its queue, marking it as redelivered """
+        with self.lock:
+            queue = self._queues.get(name)
+            if queue is None:
+                return
+            queue.messages.appendleft((message, exchange, routing_key, None,
+                                       True))
+            self._dispatch(name)
+
+    def dispatch(self, name):
+        with self.lock:
+            self._dispatch(name)
+
+    def _dispatch(self, name):
+        queue = self._queues.get(name)
+        while queue is not None and queue.messages:
+            consumer = self._next_consumer(queue)
+            if consumer is None:
+                return
+            message, exchange, routing_key, expires_at, redelivered = \
+                queue.messages.popleft()
+            if expires_at is not None and now() > expires_at:
+                continue
+            consumer.channel._deliver(consumer, message, exchange,
+                                      routing_key, redelivered)
+
+    def _next_consumer(self, queue):
+        # round robin between the consumers below their prefetch limit
+        for _ in range(len(queue.consumers)):
+            consumer = queue.consumers[0]
+            queue.consumers.rotate(-1)
+            if consumer.can_receive():
+                return consumer
+        return None
+
+    def _get_queue(self, name):
+        try:
+            return self._queues[name]
+        except KeyError:
+            raise NotFound("no queue '{}'".format(name))
+
+    def _get_exchange(self, name):
+        try:
+            return self._exchanges[name]
+        except KeyError:
+            raise NotFound("no exchange '{}'".format(name))
+
+
+class InProcChannel(object):
+    """ Counterpart of amqp.Channel for the in-process broker. Implements the
+    methods used by Channel and Subscription with the same signatures. """
+
+    def __init__(self, connection, channel_id):
+        self.connection = connection
+        self.channel_id = channel_id
+        self.auto_decode = True
+        self.is_open = True
+        self._broker = connection.broker
+        self._consumers = {}
+        self._delivery_tag = 0
+        self._prefetch = 0
+        # delivery tag -> (consumer, message, exchange, routing_key)
+        self._unacked = OrderedDict()
+
+    def exchange_declare(self, exchange, type, passive=False, durable=False,
+                         auto_delete=True, nowait=False, arguments=None):
+        self._broker.declare_exchange(exchange, type)
+
+    def queue_declare(self, queue='', passive=False, durable=False,
+                      exclusive=False, auto_delete=True, nowait=False,
+                      arguments=None):
+        return self._broker.declare_queue(queue, exclusive, auto_delete)
+
+    def queue_delete(self, queue='', if_unused=False, if_empty=False,
+                     nowait=False):
+        return self._broker.delete_queue(queue)
+
+    def queue_bind(self, queue, exchange='', routing_key='', nowait=False,
+                   arguments=None):
+        self._broker.bind(queue, exchange, routing_key)
+
+    def queue_unbind(self, queue, exchange, routing_key='', nowait=False,
+                     arguments=None):
+        self._broker.unbind(queue, exchange, routing_key)
+
+    def basic_consume(self, queue='', consumer_tag='', no_local=False,
+                      no_ack=False, exclusive=False, nowait=False,
+                      callback=None, arguments=None, on_cancel=None):
+        tag = consumer_tag or "amq.ctag-{}".format(consumer_id())
+        consumer = _Consumer(tag, queue, self, callback, no_ack,
+                             self._prefetch)
+        self._consumers[tag] = consumer
+        self._broker.consume(queue, consumer)
+        return tag
+
+    def basic_cancel(self, consumer_tag, nowait=False):
+        consumer = self._consumers.pop(consumer_tag, None)
+        if consumer is not None:
+            self._broker.cancel(consumer)
+
+    def basic_qos(self, prefetch_size, prefetch_count, a_global):
+        # Consumers created from now on are limited to prefetch_count
+        # unacknowledged messages, as in RabbitMQ when a_global is False
+        self._prefetch = prefetch_count
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        for consumer, _, _, _ in self._settle(delivery_tag, multiple):
+            self._broker.dispatch(consumer.queue)
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        for consumer, message, exchange, routing_key in self._settle(
+                delivery_tag, multiple):
+            if requeue:
+                self._broker.requeue(consumer.queue, message, exchange,
+                                     routing_key)
+            else:
+                self._broker.dispatch(consumer.queue)
+
+    def basic_reject(self, delivery_tag, requeue):
+        self.basic_nack(delivery_tag, multiple=False, requeue=requeue)
+
+    def _settle(self, delivery_tag, multiple):
+        with self._broker.lock:
+            if delivery_tag not in self._unacked:
+                raise PreconditionFailed(
+                    "unknown delivery tag {}".format(delivery_tag))
+            tags = [t for t in self._unacked if t <= delivery_tag] \
+                if multiple else [delivery_tag]
+            settled = [self._unacked.pop(tag) for tag in tags]
+            for consumer, _, _, _ in settled:
+                consumer.unacked -= 1
+            return settled
+
+    def basic_publish(self, msg, exchange='', routing_key='', mandatory=False,
+                      immediate=False, timeout=None):
+        if not self.is_open:
+            raise RecoverableConnectionError("channel already closed")
+        # A real broker receives a serialized copy, so must we
+        body = msg.body
+        if isinstance(body, text_type):
+            body = body.encode('utf-8')
+        message = amqp.Message(body=as_bytes(body),
+                               **copy.deepcopy(msg.properties))
+        self._broker.publish(message, exchange, routing_key)
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.is_open = False
+        with self._broker.lock:
+            for tag in list(self._consumers):
+                self.basic_cancel(tag)
+            unacked, self._unacked = self._unacked, OrderedDict()
+            for consumer, message, exchange, routing_key in reversed(
+                    list(unacked.values())):
+                self._broker.requeue(consumer.queue, message, exchange,
+                                     routing_key)
+
+    def _deliver(self, consumer, message, exchange, routing_key,
+                 redelivered):
+        # Called by the broker with its lock held
+        self._delivery_tag += 1
+        if not consumer.no_ack:
+            consumer.unacked += 1
+            self._unacked[self._delivery_tag] = (consumer, message, exchange,
+                                                 routing_key)
+        delivered = amqp.Message(body=message.body,
+                                 channel=self,
+                                 **copy.deepcopy(message.properties))
+        delivered.delivery_info = {
+            "consumer_tag": consumer.tag,
+            "delivery_tag": self._delivery_tag,
+            "redelivered": redelivered,
+            "exchange": exchange,
+            "routing_key": routing_key,
+        }
+        self.connection._enqueue(consumer.callback, delivered)
+
+
+class InProcConnection(object):
+    """ Counterpart of amqp.Connection for the in-process broker """
+
+    recoverable_connection_errors = (RecoverableConnectionError,
+                                     socket.error, IOError, OSError)
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.connected = False
+        self._channels = []
+        self._inbox = deque()
+        self._ready = threading.Condition(broker.lock)
+        # Called, from the publisher thread, every time a delivery arrives
+        self.on_delivery = None
+
+    def connect(self):
+        self.connected = True
+
+    def channel(self):
+        channel = InProcChannel(self, channel_id=len(self._channels) + 1)
+        self._channels.append(channel)
+        return channel
+
+    def drain_events(self, timeout=None):
+        """ Dispatches one pending delivery to its consumer callback. Raises
+        socket.timeout if nothing arrives within timeout seconds. """
+        with self._ready:
+            deadline = None if timeout is None else now() + timeout
+            while not self._inbox:
+                if not self.connected:
+                    raise RecoverableConnectionError(
+                        "connection already closed")
+                if deadline is None:
+                    self._ready.wait()
+                    continue
+                remaining = deadline - now()
+                if remaining <= 0:
+                    raise socket.timeout()
+                self._ready.wait(remaining)
+            callback, message = self._inbox.popleft()
+        if callback is not None:
+            callback(message)
+
+    def heartbeat_tick(self, rate=2):
+        pass
+
+    def close(self):
+        with self._ready:
+            for channel in self._channels:
+                channel.close()
+            self.connected = False
+            self._ready.notify_all()
+
+    def collect(self):
+        """ Releases the connection after it was lost """
+        self.close()
+
+    def _enqueue(self, callback, message):
+        self._inbox.append((callback, message))
+        self._ready.notify()
+        if self.on_delivery is not None:
+            self.on_delivery()
@@ -1,20 +1,40 @@
 from datetime import datetime
-from google.protobuf import json_format as pb
-from google.protobuf.struct_pb2 import Struct
 from six import integer_types, string_types, binary_type
 
 from .utils import now, assert_type, new_uuid
+from .compression import Compression, decompress, is_compressed
 from .subscription import Subscription
 from .wire.status import Status
-from .wire.content_type import ContentType
+from .wire.content_type import ContentType, default_content_type
 from .tracing.propagation import TextFormatPropagator
 
+try:
+    from types import MappingProxyType
+except ImportError:  # python 2
+    MappingProxyType = None
+
+_REPLY_TO_TYPES = tuple(string_types) + (Subscription, )
+_TIMEOUT_TYPES = (float, ) + tuple(integer_types)
+_BODY_TYPES = (binary_type, bytearray, memoryview)
+
 
 class Message(object):
+    # Attributes compared by __eq__, the delivery state is not part of it
+    _FIELDS = ("_topic", "_body", "_reply_to", "_subscription_id",
+               "_correlation_id", "_content_type", "_created_at", "_metadata",
+               "_timeout", "_status")
+
+    __slots__ = _FIELDS + ("_acker", "_delivery_tag", "_unpacked",
+                           "_compression", "_content_encoding",
+                           "_wire_version", "_pool")
+
+    # The body is compared decompressed
+    _COMPARED = tuple("body" if f == "_body" else f for f in _FIELDS)
+
     def __init__(self, content=None, reply_to=None, content_type=None):
         """ Creates a new message.
         Args:
-            content (str or object): sets the message body with the
+            content (bytes-like or object): sets the message body with the
             given content. If an object is provided, it will be packed
             using the given content_type.
 
@@ -34,6 +54,17 @@ class Message(object):
         self._metadata = {}
         self._timeout = None
         self._status = None
+        self._acker = None
+        self._delivery_tag = None
+        # schema -> object decoded from the body, see unpack
+        self._unpacked = None
+        self._compression = None
+        # encoding of a received body not decompressed yet
+        self._content_encoding = None
+        # wire format of a received message, also used by its reply
+        self._wire_version = None
+        # MessagePool the message goes back to when released
+        self._pool = None
 
         if reply_to is not None:
             self.reply_to = reply_to
@@ -42,7 +73,7 @@ class Message(object):
             self.content_type = content_type
 
         if content is not None:
-            if isinstance(content, binary_type):
+            if isinstance(content, _BODY_TYPES):
                 self.body = content
             else:
                 self.pack(content)
@@ -92,17 +123,58 @@ class Message(object):
 
     def __eq__(self, other):
         """ Returns True if the messages are equal, False otherwise """
-        return self.__dict__ == other.__dict__
+        return all(
+            getattr(self, field) == getattr(other, field)
+            for field in self._COMPARED)
+
+    @classmethod
+    def _create(cls,
+                topic=None,
+                body='',
+                reply_to=None,
+                subscription_id=None,
+                correlation_id=None,
+                content_type=None,
+                created_at=None,
+                metadata=None,
+                timeout=None,
+                status=None,
+                content_encoding=None,
+                wire_version=None,
+                instance=None):
+        """ Creates a message without validating its fields. Used by the
+        library to build messages from values that are known to be valid,
+        e.g. received from the broker. The fields of 'instance' are
+        overwritten instead if given, see MessagePool. """
+        message = cls.__new__(cls) if instance is None else instance
+        message._topic = topic
+        message._body = body
+        message._reply_to = reply_to
+        message._subscription_id = subscription_id
+        message._correlation_id = correlation_id
+        message._content_type = content_type
+        message._created_at = now() if created_at is None else created_at
+        message._metadata = {} if metadata is None else metadata
+        message._timeout = timeout
+        message._status = status
+        message._acker = None
+        message._delivery_tag = None
+        message._unpacked = None
+        message._compression = None
+        message._content_encoding = content_encoding
+        message._wire_version = wire_version
+        message._pool = None
+        return message
 
     def create_reply(self):
-        reply = Message()
-        if self.has_reply_to():
-            reply.topic = self.reply_to
-        if self.has_correlation_id():
-            reply.correlation_id = self.correlation_id
-        if self.has_content_type():
-            reply.content_type = self.content_type
-        return reply
+        # replies are encoded with the wire format of the request, so peers
+        # that only know older formats can be served
+        return Message._create(
+            topic=self._reply_to or None,
+            correlation_id=self._correlation_id,
+            content_type=self._content_type,
+            wire_version=self._wire_version,
+        )
 
     # topic
 
@@ -134,7 +206,7 @@ class Message(object):
 
     @reply_to.setter
     def reply_to(self, value):
-        assert_type(value, list(string_types) + [Subscription], "reply_to")
+        assert_type(value, _REPLY_TO_TYPES, "reply_to")
 
         if self.correlation_id is None:
             self.correlation_id = new_uuid()
@@ -189,19 +261,50 @@ class Message(object):
 
     @property
     def body(self):
-        """ bytes: Raw content of the message """
+        """ bytes, bytearray or memoryview: Raw content of the message.
+        Buffers are not copied, bodies larger than a frame are received as a
+        memoryview. A mutable body must not be modified in place after being
+        unpacked or while being published, assign it again instead.
+        Compressed bodies are decompressed when first accessed. """
+        if is_compressed(self._content_encoding):
+            self._body = decompress(self._content_encoding, self._body)
+            self._content_encoding = None
         return self._body
 
     @body.setter
     def body(self, value):
-        assert_type(value, binary_type, "body")
+        assert_type(value, _BODY_TYPES, "body")
+        if isinstance(value, memoryview) and \
+                (value.format != 'B' or value.ndim != 1):
+            # sizes and slices of the body are in bytes
+            value = value.cast('B')
         self._body = value
+        self._content_encoding = None
+        self._unpacked = None
 
     def has_body(self):
         """ Returns: True if the property body of the message is set,
          False otherwise """
         return bool(self._body)
 
+    # compression
+
+    @property
+    def compression(self):
+        """ Compression: how the body is compressed when published, takes
+        precedence over the compression of the channel """
+        return self._compression
+
+    @compression.setter
+    def compression(self, value):
+        assert_type(value, Compression, "compression")
+        self._compression = value
+
+    def has_compression(self):
+        """ Returns: True if the property compression of the message is set,
+         False otherwise """
+        return self._compression is not None
+
     # content_type
 
     @property
@@ -214,6 +317,7 @@ class Message(object):
     def content_type(self, value):
         assert_type(value, ContentType, "content_type")
         self._content_type = value
+        self._unpacked = None
 
     def has_content_type(self):
         """ Returns: True if the property content_type of the message is set,
@@ -264,7 +368,7 @@ class Message(object):
 
     @timeout.setter
     def timeout(self, seconds):
-        assert_type(seconds, [float] + list(integer_types), "timeout")
+        assert_type(seconds, _TIMEOUT_TYPES, "timeout")
         self._timeout = seconds
 
     def has_timeout(self):
@@ -294,6 +398,44 @@ class Message(object):
          False otherwise """
         return self._status is not None
 
+    # acknowledgement
+
+    def ack(self):
+        """ Acknowledges a message received from a subscription in manual
+        ack mode. Acknowledgements may be coalesced and sent later, see
+        Subscription. """
+        self._pop_acker().ack(self._delivery_tag)
+
+    def nack(self, requeue=True):
+        """ Rejects a message received from a subscription in manual ack
+        mode.
+        Args:
+            requeue (bool): if True the broker delivers the message again,
+            otherwise it is discarded.
+        """
+        self._pop_acker().nack(self._delivery_tag, requeue)
+
+    def release(self):
+        """ Returns a message received by a channel with pooled_messages to
+        the pool, to be reused for another delivery. Neither the message nor
+        its body can be used after being released, objects unpacked from it
+        with a copy can. """
+        pool = self._pool
+        if pool is None:
+            raise RuntimeError(
+                "Message was not received from a pool or was already"
+                " released")
+        self._pool = None
+        pool.release(self)
+
+    def _pop_acker(self):
+        if self._acker is None:
+            raise RuntimeError(
+                "Message was not received in manual ack mode or was already"
+                " acknowledged")
+        acker, self._acker = self._acker, None
+        return acker
+
     # tracing
 
     def extract_tracing(self):
@@ -311,65 +453,59 @@ class Message(object):
 
     def pack(self, obj):
         """ Serializes the given object using the specified message
-        content_type. If the message has no content_type, the protobuf
-        format is used.
+        content_type. If the message has no content_type, the json format
+        is used for dictionaries, the ndarray format for numpy arrays and the
+        protobuf format otherwise.
         Args:
-            obj (object): protobuf object to be serialized.
+            obj (object): object to be serialized, e.g. a protobuf object, a
+            dictionary or an array, as supported by the codec of the
+            content_type.
         """
-
-        isDict = isinstance(obj, dict)
-
-        if isDict:
-            obj = pb.ParseDict(obj, Struct())
-
         if not self.has_content_type():
-            # Default for dict object is to be serialized as json
-            # Default for protobuf object is to be binary serialized
-            self.content_type = ContentType.JSON if isDict else ContentType.PROTOBUF
-
-        if self.content_type == ContentType.PROTOBUF:
-            # SerializeToString returns py2: str, py3: bytes
-            self.body = obj.SerializeToString()
-        elif self.content_type == ContentType.JSON:
-            # MessageToJson returns py2: str, py3: str
-            packed = pb.MessageToJson(
-                obj, indent=0, including_default_value_fields=True)
-            if not isinstance(packed, binary_type):
-                self.body = packed.encode('latin')
-            else:
-                self.body = packed
-        else:
-            raise NotImplementedError(
-                "Serialization to '{}' type not implemented".format(
-                    self.content_type.name))
+            self.content_type = default_content_type(obj)
 
-    def unpack(self, schema=dict):
+        self._content_type.codec.pack(self, obj)
+
+    def unpack(self, schema=dict, readonly=False, into=None):
         """ Deserializes the content of the message using the given schema.
         If the message has no content_type, the protobuf format is used.
+        Objects unpacked readonly are cached per schema until the body or
+        the content_type change, so unpacking again is cheap.
         Args:
-            schema (type): type of the protobuf object to be deserialized.
+            schema (type): type of the object to be deserialized, dict or a
+            protobuf type. Raw bodies are always returned as bytes.
+            readonly (bool): if True the cached object is returned, shared by
+            every caller, which must not modify it. Dictionaries are wrapped
+            in a read-only mapping. Otherwise a new object is returned,
+            decoded again or copied from the cached one if any.
+            into (schema): existing object the content is parsed into,
+            replacing its previous content, instead of creating a new one.
+            Nothing is cached.
         Returns:
             schema: deserialized instance of the object of type schema.
         """
+        if into is not None:
+            assert_type(into, schema, "into")
+            self._codec().unpack_into(self, into)
+            return into
+
+        if self._unpacked is None:
+            self._unpacked = {}
+        obj = self._unpacked.get(schema)
+        if not readonly:
+            # a fresh object is handed out as is, the cached one is copied
+            if obj is None:
+                return self._decode(schema)
+            return self._codec().copy(obj)
+
+        if obj is None:
+            obj = self._unpacked[schema] = self._decode(schema)
+        if schema is dict and MappingProxyType is not None:
+            return MappingProxyType(obj)
+        return obj
 
-        isDict = schema is dict
-        if isDict:
-            schema = Struct
-
-        obj = schema()
-        if not self.has_content_type():
-            self.content_type = ContentType.PROTOBUF
-
-        if self.content_type == ContentType.PROTOBUF:
-            obj.ParseFromString(self.body)
-        elif self.content_type == ContentType.JSON:
-            obj = pb.Parse(self.body, obj)
-        else:
-            raise NotImplementedError(
-                "Deserialization from '{}' type not implemented".format(
-                    self.content_type.name))
-
-        if isDict:
-            obj = pb.MessageToDict(obj, including_default_value_fields=True)
+    def _codec(self):
+        return (self._content_type or ContentType.PROTOBUF).codec
 
-        return obj
+    def _decode(self, schema):
+        return self._codec().unpack(self, schema)
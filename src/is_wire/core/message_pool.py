@@ -0,0 +1,59 @@
+import threading
+
+from .message import Message
+
+
+class MessagePool(object):
+    """ Free list of Message instances, used by channels created with
+    pooled_messages=True to build received messages without allocating
+    them. Messages go back to the pool with Message.release. Keeps count of
+    the instances allocated and reused, a consumer whose messages are
+    released reaches a steady state where nothing new is allocated. """
+
+    def __init__(self, capacity=1024):
+        """ Args:
+            capacity (int): maximum number of free messages kept, the
+            messages released above it are left to the garbage collector.
+        """
+        assert capacity > 0
+        self._capacity = capacity
+        self._free = []
+        self._lock = threading.Lock()
+        self.allocated = 0
+        self.reused = 0
+
+    def __len__(self):
+        return len(self._free)
+
+    def acquire(self):
+        """ Returns: a free message, to be filled with Message._create """
+        with self._lock:
+            if self._free:
+                self.reused += 1
+                return self._free.pop()
+            self.allocated += 1
+        return Message.__new__(Message)
+
+    def release(self, message):
+        # drop the references to the body and decoded objects right away,
+        # the other fields are overwritten when the message is reused
+        message._body = ''
+        message._metadata = None
+        message._status = None
+        message._unpacked = None
+        message._acker = None
+        message._compression = None
+        with self._lock:
+            if len(self._free) < self._capacity:
+                self._free.append(message)
+
+    def stats(self):
+        """ Returns:
+            dict: number of messages allocated, reused and free.
+        """
+        with self._lock:
+            return {
+                "allocated": self.allocated,
+                "reused": self.reused,
+                "free": len(self._free),
+            }
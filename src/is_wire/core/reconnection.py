@@ -0,0 +1,100 @@
+import random
+import threading
+from collections import deque
+from enum import Enum
+
+
+class OutboxPolicy(Enum):
+    # The oldest buffered message is discarded to make room for a new one
+    DROP_OLDEST = 0
+    # Publishing blocks until there is room for the message
+    BLOCK = 1
+
+
+class Backoff(object):
+    """ Exponential backoff with full jitter: the n-th delay is drawn
+    uniformly between 0 and min(maximum, initial * 2^n), which spreads the
+    reconnection attempts of many clients after a broker restart. """
+
+    def __init__(self, initial=0.1, maximum=30.0):
+        assert initial > 0.0
+        assert maximum >= initial
+        self.initial = initial
+        self.maximum = maximum
+        self.attempts = 0
+
+    def next_delay(self):
+        """ Returns: period in seconds to wait before the next attempt """
+        ceiling = min(self.maximum, self.initial * 2**min(self.attempts, 32))
+        self.attempts += 1
+        return random.uniform(0.0, ceiling)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class Outbox(object):
+    """ Bounded FIFO of messages waiting to be written to the broker. Any
+    thread can put messages in it, the thread owning the connection takes
+    them. What happens when it is full is decided by the OutboxPolicy. """
+
+    def __init__(self, max_size=10000, policy=OutboxPolicy.BLOCK):
+        """ Args:
+            max_size (int): maximum number of buffered messages, 0 means
+            unbounded.
+            policy (OutboxPolicy): behaviour when the outbox is full.
+        """
+        assert max_size >= 0
+        self._entries = deque()
+        self._max_size = max_size
+        self._policy = policy
+        self._space = threading.Condition(threading.Lock())
+        # number of messages discarded because of the DROP_OLDEST policy
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def full(self):
+        return self._max_size != 0 and len(self._entries) >= self._max_size
+
+    def put(self, entry, make_room=None):
+        """ Appends an entry, applying the policy if the outbox is full.
+        Args:
+            entry: entry to be buffered.
+            make_room (callable): with the BLOCK policy, called repeatedly
+            while the outbox is full. Required when no other thread empties
+            the outbox, otherwise the caller waits for that thread.
+        """
+        while self.full():
+            if self._policy == OutboxPolicy.DROP_OLDEST:
+                try:
+                    self._entries.popleft()
+                    self.dropped += 1
+                except IndexError:
+                    pass
+            elif make_room is not None:
+                make_room()
+            else:
+                with self._space:
+                    if self.full():
+                        self._space.wait(0.1)
+        self._entries.append(entry)
+
+    def extend(self, entries, make_room=None):
+        for entry in entries:
+            self.put(entry, make_room)
+
+    def take(self):
+        """ Returns: list with every buffered entry, in order """
+        entries = self._entries
+        taken = [entries.popleft() for _ in range(len(entries))]
+        if taken and self._max_size != 0:
+            with self._space:
+                self._space.notify_all()
+        return taken
+
+    def restore(self, entries):
+        """ Puts back entries previously taken, in front of the others,
+        regardless of the size limit """
+        self._entries.extendleft(reversed(entries))
@@ -1,65 +1,133 @@
 from .utils import consumer_id
+from .acknowledgement import AckMode
 
 
 class Subscription(object):
-    def __init__(self, channel, name=None):
+    def __init__(self,
+                 channel,
+                 name=None,
+                 prefetch=None,
+                 ack_mode=AckMode.AUTO,
+                 ack_batch_size=64,
+                 ack_interval=0.1):
+        """ Creates a new subscription, receiving messages addressed to its
+        name and to the topics it subscribes to.
+        Args:
+            channel (Channel): channel to receive messages from.
+            name (str): name of the queue, a unique one is generated if not
+            given.
+            prefetch (int): maximum number of unacknowledged messages the
+            broker delivers to this subscription. Only meaningful in manual
+            ack mode, where it bounds the memory used by a slow consumer.
+            ack_mode (AckMode): AckMode.AUTO considers messages acknowledged
+            once delivered. With AckMode.MANUAL every message must be
+            acknowledged with Message.ack or Message.nack, messages not
+            acknowledged when the connection is lost are delivered again.
+            ack_batch_size (int): in manual mode acks are coalesced, they are
+            sent to the broker once this many messages of the subscription
+            were acknowledged.
+            ack_interval (float): maximum period in seconds a coalesced ack
+            waits before being sent to the broker.
+        """
         self._id = consumer_id()
         self._name = self._id if name is None else name
         self._topics = set()
 
-        self._channel = channel._channel
+        self._channel = channel
         self._exchange = channel._exchange
+        self._prefetch = prefetch or 0
+        self._no_ack = ack_mode == AckMode.AUTO
 
-        def create_queue(channel, exchange, queue, tag, on_message):
-            channel.queue_declare(
-                queue=queue,
-                passive=False,
-                durable=False,
-                exclusive=False,
-                auto_delete=True,
-            )
+        if not self._no_ack:
+            channel._acker.add_consumer(self._id, ack_batch_size,
+                                        ack_interval)
 
-            channel.queue_bind(
-                queue=queue,
-                exchange=exchange,
-                routing_key=queue,
-            )
+        # recorded to be declared again if the channel reconnects
+        channel.subscriptions.append(self)
+        try:
+            channel._run(self._declare)
+        except Exception:
+            channel.subscriptions.remove(self)
+            raise
 
-            channel.basic_consume(
-                queue=queue,
-                callback=on_message,
-                consumer_tag=tag,
-                no_local=False,
-                no_ack=True,
-                exclusive=False,
+    def _declare(self, amqp_channel):
+        """ Declares the queue of the subscription with its bindings and
+        starts consuming from it.
+        Args:
+            amqp_channel (amqp.Channel): channel to declare on.
+        """
+        channel = self._channel
+        if self._prefetch != channel._prefetch:
+            amqp_channel.basic_qos(prefetch_size=0,
+                                   prefetch_count=self._prefetch,
+                                   a_global=False)
+            channel._prefetch = self._prefetch
+
+        amqp_channel.queue_declare(
+            queue=self._name,
+            passive=False,
+            durable=False,
+            exclusive=False,
+            auto_delete=True,
+        )
+
+        for routing_key in [self._name] + sorted(self._topics):
+            amqp_channel.queue_bind(
+                queue=self._name,
+                exchange=self._exchange,
+                routing_key=routing_key,
             )
 
-        create_queue(self._channel, self._exchange, self._name, self._id,
-                     channel._on_message)
+        amqp_channel.basic_consume(
+            queue=self._name,
+            callback=channel._on_message,
+            consumer_tag=self._id,
+            no_local=False,
+            no_ack=self._no_ack,
+            exclusive=False,
+        )
+
+    def _bind(self, amqp_channel, topic):
+        amqp_channel.queue_bind(
+            queue=self._name,
+            exchange=self._exchange,
+            routing_key=topic,
+        )
+
+    def _unbind(self, amqp_channel, topic):
+        amqp_channel.queue_unbind(
+            queue=self._name,
+            exchange=self._exchange,
+            routing_key=topic,
+        )
 
     def subscribe(self, topic):
         """ Subscribes to the given topic.
         Args:
             topic (str): topic to receive messages from.
         """
-        self._channel.queue_bind(
-            queue=self._name,
-            exchange=self._exchange,
-            routing_key=topic,
-        )
+        # recorded first, so the binding is restored by a reconnection
+        # happening while binding
+        subscribed = topic in self._topics
         self._topics.add(topic)
+        try:
+            self._channel._run(self._bind, topic)
+        except Exception:
+            if not subscribed:
+                self._topics.discard(topic)
+            raise
 
     def unsubscribe(self, topic):
         """ Unsubscribe from the given topic.
         Args:
             topic (str): topic to stop receiving messages from.
         """
-        self._channel.queue_unbind(
-            queue=self._name,
-            exchange=self._exchange,
-            routing_key=topic,
-        )
         self._topics.remove(topic)
+        try:
+            self._channel._run(self._unbind, topic)
+        except Exception:
+            self._topics.add(topic)
+            raise
 
     @property
     def id(self):
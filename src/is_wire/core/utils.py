@@ -1,10 +1,12 @@
-import uuid
+import random
+import time
 from platform import uname
-from datetime import datetime
 
 
 def new_uuid():
-    return uuid.uuid4().int >> 64
+    """ Returns: random 64 bits integer. Used for correlation ids, where
+    uniqueness matters but unpredictability does not """
+    return random.getrandbits(64)
 
 
 def consumer_id():
@@ -12,7 +14,16 @@ def consumer_id():
 
 
 def now():
-    return (datetime.utcnow() - datetime(1970, 1, 1)).total_seconds()
+    """ Returns: seconds since the epoch """
+    return time.time()
+
+
+def as_bytes(buffer):
+    """ Returns: bytes with the content of a bytes-like object, which is
+    returned as is when already of that type """
+    if isinstance(buffer, memoryview):
+        return buffer.tobytes()
+    return bytes(buffer)
 
 
 def assert_type(instance, types, name):
@@ -0,0 +1,401 @@
+import copy
+import json
+from struct import Struct as Format, pack
+
+from google.protobuf import json_format as pb
+from google.protobuf.struct_pb2 import Struct
+from six import binary_type, integer_types, iteritems, text_type
+
+from ..utils import as_bytes, assert_type
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_BUFFER_TYPES = (binary_type, bytearray, memoryview)
+
+
+class Codec(object):
+    """ Serializes objects to message bodies and back. Codecs are registered
+    along with a content type, see ContentType.register. Codecs that need to
+    describe the body in the message metadata override pack and unpack
+    instead of encode and decode. """
+
+    def encode(self, obj):
+        """ Args:
+            obj (object): object to be serialized.
+        Returns:
+            bytes: message body.
+        """
+        raise NotImplementedError()
+
+    def decode(self, body, schema):
+        """ Args:
+            body (bytes-like): message body.
+            schema (type): type of the object to be deserialized, dict or a
+            protobuf message type.
+        Returns:
+            schema: deserialized object.
+        """
+        raise NotImplementedError()
+
+    def pack(self, message, obj):
+        """ Sets the body of a message to the serialized object """
+        message.body = self.encode(obj)
+
+    def unpack(self, message, schema):
+        """ Returns: object of type schema deserialized from a message """
+        return self.decode(message.body, schema)
+
+    def decode_into(self, body, obj):
+        """ Deserializes a message body into an existing object, replacing
+        its content. By default the body is decoded into a new object which
+        is then copied.
+        Args:
+            body (bytes-like): message body.
+            obj (dict or protobuf object): object to be filled.
+        """
+        decoded = self.decode(body, type(obj))
+        if isinstance(obj, dict):
+            obj.clear()
+            obj.update(decoded)
+        elif hasattr(obj, "CopyFrom"):
+            obj.CopyFrom(decoded)
+        else:
+            raise TypeError("Can not unpack into object of type {}".format(
+                type(obj).__name__))
+
+    def unpack_into(self, message, obj):
+        """ Deserializes a message into an existing object """
+        self.decode_into(message.body, obj)
+
+    def copy(self, obj):
+        """ Returns: copy of a deserialized object, safe to be modified
+        without affecting the original """
+        if hasattr(obj, "CopyFrom"):
+            duplicate = type(obj)()
+            duplicate.CopyFrom(obj)
+            return duplicate
+        return copy.deepcopy(obj)
+
+
+class ProtobufCodec(Codec):
+    """ Protobuf binary encoding, dictionaries are carried as a Struct """
+
+    def encode(self, obj):
+        if isinstance(obj, dict):
+            obj = pb.ParseDict(obj, Struct())
+        return obj.SerializeToString()
+
+    def decode(self, body, schema):
+        if schema is dict:
+            obj = Struct()
+            obj.ParseFromString(body)
+            return pb.MessageToDict(obj, including_default_value_fields=True)
+        obj = schema()
+        obj.ParseFromString(body)
+        return obj
+
+    def decode_into(self, body, obj):
+        if isinstance(obj, dict):
+            Codec.decode_into(self, body, obj)
+        else:
+            obj.ParseFromString(body)
+
+
+class JsonCodec(Codec):
+    """ Protobuf JSON mapping. Dictionaries are serialized directly to
+    compact UTF-8 JSON, which parses as a Struct, instead of going through
+    one. Integers are kept as such rather than becoming floats. """
+
+    def encode(self, obj):
+        if isinstance(obj, dict):
+            packed = json.dumps(obj,
+                                separators=(',', ':'),
+                                ensure_ascii=False,
+                                allow_nan=False)
+        else:
+            # MessageToJson returns py2: str, py3: str
+            packed = pb.MessageToJson(obj,
+                                      indent=0,
+                                      including_default_value_fields=True)
+        if not isinstance(packed, binary_type):
+            return packed.encode('utf-8')
+        return packed
+
+    def decode(self, body, schema):
+        if schema is dict:
+            return json.loads(as_bytes(body).decode('utf-8'))
+        return pb.Parse(as_bytes(body), schema())
+
+    def decode_into(self, body, obj):
+        if isinstance(obj, dict):
+            Codec.decode_into(self, body, obj)
+        else:
+            obj.Clear()
+            pb.Parse(as_bytes(body), obj)
+
+
+class RawCodec(Codec):
+    """ Opaque bytes, the body is the object itself. The schema is ignored
+    when decoding, bytes are always returned. """
+
+    def encode(self, obj):
+        assert_type(obj, _BUFFER_TYPES, "obj")
+        return obj
+
+    def decode(self, body, schema):
+        return as_bytes(body)
+
+
+class MsgPackCodec(Codec):
+    """ MessagePack, a compact binary encoding of dictionaries, lists and
+    scalars. Uses the msgpack package when installed and an equivalent pure
+    python implementation otherwise. Protobuf objects are converted with
+    their JSON mapping to dictionaries. """
+
+    def encode(self, obj):
+        if not isinstance(obj, dict):
+            obj = pb.MessageToDict(obj, including_default_value_fields=True)
+        if msgpack is not None:
+            return msgpack.packb(obj, use_bin_type=True)
+        return packb(obj)
+
+    def decode(self, body, schema):
+        if msgpack is not None:
+            obj = msgpack.unpackb(body, raw=False)
+        else:
+            obj = unpackb(body)
+        if schema is dict:
+            return obj
+        return pb.ParseDict(obj, schema())
+
+
+class NdarrayCodec(Codec):
+    """ NumPy arrays, the body is the raw array buffer and the metadata of
+    the message carries its dtype, shape and strides. Contiguous arrays are
+    packed without copies and unpacked as read-only views over the body.
+    Arrays of objects or structured types are not supported, the schema is
+    ignored when unpacking. """
+
+    DTYPE = "ndarray-dtype"
+    SHAPE = "ndarray-shape"
+    STRIDES = "ndarray-strides"
+
+    def pack(self, message, array):
+        import numpy as np
+        assert_type(array, np.ndarray, "array")
+        if array.dtype.hasobject or array.dtype.fields is not None:
+            raise TypeError("Arrays of type {} are not supported".format(
+                array.dtype))
+
+        if array.flags.c_contiguous:
+            data = array.reshape(-1)
+        elif array.flags.f_contiguous:
+            # the transpose of a fortran array is C contiguous
+            data = array.T.reshape(-1)
+        else:
+            array = np.ascontiguousarray(array)
+            data = array.reshape(-1)
+
+        message.metadata[self.DTYPE] = array.dtype.str
+        message.metadata[self.SHAPE] = list(array.shape)
+        message.metadata[self.STRIDES] = list(array.strides)
+        message.body = memoryview(data.view(np.uint8))
+
+    def unpack(self, message, schema):
+        import numpy as np
+        metadata = message.metadata
+        try:
+            dtype = np.dtype(str(metadata[self.DTYPE]))
+            shape = tuple(metadata[self.SHAPE])
+            strides = tuple(metadata[self.STRIDES])
+        except KeyError as error:
+            raise RuntimeError(
+                "Message has no ndarray metadata '{}'".format(error.args[0]))
+        array = np.ndarray(shape, dtype, buffer=message.body, strides=strides)
+        array.flags.writeable = False
+        return array
+
+    def unpack_into(self, message, array):
+        """ Copies the array of a message into an existing writeable array of
+        the same shape and dtype """
+        unpacked = self.unpack(message, type(array))
+        if unpacked.shape != array.shape or unpacked.dtype != array.dtype:
+            raise ValueError(
+                "Can not unpack array of shape {} and type {} into one of "
+                "shape {} and type {}".format(unpacked.shape, unpacked.dtype,
+                                              array.shape, array.dtype))
+        array[...] = unpacked
+
+    def copy(self, array):
+        # read-only views can be shared
+        return array
+
+
+def packb(obj):
+    """ Serializes an object to MessagePack, like msgpack.packb with
+    use_bin_type=True. Supports None, booleans, integers, floats, strings,
+    bytes, lists, tuples and dictionaries.
+    Returns:
+        bytes: packed object.
+    """
+    buffer = bytearray()
+    _pack(obj, buffer)
+    return bytes(buffer)
+
+
+def _pack_size(buffer, size, fix, fix_max, tags):
+    if size <= fix_max:
+        buffer.append(fix | size)
+    elif tags[0] is not None and size < 0x100:
+        buffer += pack('>BB', tags[0], size)
+    elif size < 0x10000:
+        buffer += pack('>BH', tags[1], size)
+    elif size < 0x100000000:
+        buffer += pack('>BI', tags[2], size)
+    else:
+        raise ValueError("Object of size {} is too large".format(size))
+
+
+def _pack(obj, buffer):
+    if obj is None:
+        buffer.append(0xc0)
+    elif obj is True:
+        buffer.append(0xc3)
+    elif obj is False:
+        buffer.append(0xc2)
+    elif isinstance(obj, integer_types):
+        if 0 <= obj < 0x80 or -0x20 <= obj < 0:
+            buffer += pack('>b' if obj < 0 else '>B', obj)
+        elif 0 <= obj < 0x100:
+            buffer += pack('>BB', 0xcc, obj)
+        elif 0 <= obj < 0x10000:
+            buffer += pack('>BH', 0xcd, obj)
+        elif 0 <= obj < 0x100000000:
+            buffer += pack('>BI', 0xce, obj)
+        elif 0 <= obj < 0x10000000000000000:
+            buffer += pack('>BQ', 0xcf, obj)
+        elif -0x80 <= obj < 0:
+            buffer += pack('>Bb', 0xd0, obj)
+        elif -0x8000 <= obj < 0:
+            buffer += pack('>Bh', 0xd1, obj)
+        elif -0x80000000 <= obj < 0:
+            buffer += pack('>Bi', 0xd2, obj)
+        elif -0x8000000000000000 <= obj < 0:
+            buffer += pack('>Bq', 0xd3, obj)
+        else:
+            raise OverflowError("Integer {} out of range".format(obj))
+    elif isinstance(obj, float):
+        buffer += pack('>Bd', 0xcb, obj)
+    elif isinstance(obj, text_type):
+        encoded = obj.encode('utf-8')
+        _pack_size(buffer, len(encoded), 0xa0, 31, (0xd9, 0xda, 0xdb))
+        buffer += encoded
+    elif isinstance(obj, _BUFFER_TYPES):
+        _pack_size(buffer, len(obj), 0, -1, (0xc4, 0xc5, 0xc6))
+        buffer += obj
+    elif isinstance(obj, (list, tuple)):
+        _pack_size(buffer, len(obj), 0x90, 15, (None, 0xdc, 0xdd))
+        for item in obj:
+            _pack(item, buffer)
+    elif isinstance(obj, dict):
+        _pack_size(buffer, len(obj), 0x80, 15, (None, 0xde, 0xdf))
+        for key, value in iteritems(obj):
+            _pack(key, buffer)
+            _pack(value, buffer)
+    else:
+        raise TypeError("Can not serialize object of type {}".format(
+            type(obj).__name__))
+
+
+def unpackb(body):
+    """ Deserializes a MessagePack object, like msgpack.unpackb with
+    raw=False. Extension types are not supported.
+    Args:
+        body (bytes-like): packed object.
+    Returns:
+        object: unpacked object.
+    """
+    body = memoryview(body)
+    obj, offset = _unpack(body, 0)
+    if offset != len(body):
+        raise ValueError("Extra data after the MessagePack object")
+    return obj
+
+
+# tag -> (format, kind) of the types with a fixed size header
+_HEADERS = {
+    0xc4: (Format('>B'), 'bin'),
+    0xc5: (Format('>H'), 'bin'),
+    0xc6: (Format('>I'), 'bin'),
+    0xca: (Format('>f'), 'value'),
+    0xcb: (Format('>d'), 'value'),
+    0xcc: (Format('>B'), 'value'),
+    0xcd: (Format('>H'), 'value'),
+    0xce: (Format('>I'), 'value'),
+    0xcf: (Format('>Q'), 'value'),
+    0xd0: (Format('>b'), 'value'),
+    0xd1: (Format('>h'), 'value'),
+    0xd2: (Format('>i'), 'value'),
+    0xd3: (Format('>q'), 'value'),
+    0xd9: (Format('>B'), 'str'),
+    0xda: (Format('>H'), 'str'),
+    0xdb: (Format('>I'), 'str'),
+    0xdc: (Format('>H'), 'array'),
+    0xdd: (Format('>I'), 'array'),
+    0xde: (Format('>H'), 'map'),
+    0xdf: (Format('>I'), 'map'),
+}
+_CONSTANTS = {0xc0: None, 0xc2: False, 0xc3: True}
+
+
+def _unpack(body, offset):
+    try:
+        tag = body[offset]
+    except IndexError:
+        raise ValueError("Truncated MessagePack object")
+    if not isinstance(tag, int):  # python 2
+        tag = ord(tag)
+    offset += 1
+
+    if tag <= 0x7f:
+        return tag, offset
+    if tag >= 0xe0:
+        return tag - 0x100, offset
+    if 0x80 <= tag <= 0x8f:
+        kind, size = 'map', tag & 0x0f
+    elif 0x90 <= tag <= 0x9f:
+        kind, size = 'array', tag & 0x0f
+    elif 0xa0 <= tag <= 0xbf:
+        kind, size = 'str', tag & 0x1f
+    elif tag in _CONSTANTS:
+        return _CONSTANTS[tag], offset
+    elif tag in _HEADERS:
+        header, kind = _HEADERS[tag]
+        size, = header.unpack_from(body, offset)
+        offset += header.size
+        if kind == 'value':
+            return size, offset
+    else:
+        raise ValueError("Unsupported MessagePack type 0x{:02x}".format(tag))
+
+    if kind == 'array':
+        items = []
+        for _ in range(size):
+            item, offset = _unpack(body, offset)
+            items.append(item)
+        return items, offset
+    if kind == 'map':
+        obj = {}
+        for _ in range(size):
+            key, offset = _unpack(body, offset)
+            obj[key], offset = _unpack(body, offset)
+        return obj, offset
+
+    end = offset + size
+    if end > len(body):
+        raise ValueError("Truncated MessagePack object")
+    data = body[offset:end].tobytes()
+    return (data.decode('utf-8') if kind == 'str' else data), end
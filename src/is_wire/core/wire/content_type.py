@@ -1,44 +1,160 @@
-from enum import Enum
+import sys
+
+import six
+from six import string_types
+
 from . import wire_pb2
+from .codec import (Codec, JsonCodec, MsgPackCodec, NdarrayCodec,
+                    ProtobufCodec, RawCodec)
 from ..utils import assert_type
 
 
-class ContentType(Enum):
-    PROTOBUF = wire_pb2.ContentType.Value("PROTOBUF")
-    JSON = wire_pb2.ContentType.Value("JSON")
+class _ContentTypeMeta(type):
+    # Gives the class the look of an Enum: iteration over the registered
+    # content types, lookup by name with ContentType["JSON"] and by value
+    # with ContentType(2)
+
+    def __iter__(cls):
+        return iter(sorted(cls._by_name.values(), key=lambda t: t.value))
+
+    def __len__(cls):
+        return len(cls._by_name)
+
+    def __getitem__(cls, name):
+        return cls._by_name[name]
+
+    def __call__(cls, value):
+        try:
+            return cls._by_value[value]
+        except KeyError:
+            raise ValueError("{} is not a valid ContentType".format(value))
+
+
+class ContentType(six.with_metaclass(_ContentTypeMeta, object)):
+    """ Describes how the body of a message is serialized. Each content type
+    has a name, a numeric value, the string that identifies it on the wire
+    and the codec that encodes and decodes message bodies. Besides the
+    built-in ones, new content types can be registered:
+
+        class CborCodec(Codec):
+            def encode(self, obj):
+                return cbor2.dumps(obj)
+
+            def decode(self, body, schema):
+                return cbor2.loads(body)
+
+        ContentType.register("CBOR", "application/cbor", CborCodec())
+        message = Message(content={"a": 1}, content_type=ContentType.CBOR)
+    """
+
+    __slots__ = ("name", "value", "wire", "codec")
+
+    _by_name = {}
+    _by_value = {}
+    _by_wire = {}
+
+    @classmethod
+    def register(cls, name, wire, codec, value=None):
+        """ Registers a new content type, which becomes available as an
+        attribute of ContentType.
+        Args:
+            name (str): upper case identifier, e.g. "CBOR".
+            wire (str): string sent to the broker as the AMQP content_type
+            property, e.g. "application/cbor".
+            codec (Codec): serializer of message bodies.
+            value (int): numeric value, the next free one if not given.
+        Returns:
+            ContentType: the registered content type.
+        """
+        assert_type(name, string_types, "name")
+        assert_type(wire, string_types, "wire")
+        assert_type(codec, Codec, "codec")
+        if value is None:
+            value = max(cls._by_value) + 1 if cls._by_value else 1
+        if name in cls._by_name or hasattr(cls, name):
+            raise ValueError("ContentType '{}' already exists".format(name))
+        if value in cls._by_value:
+            raise ValueError(
+                "ContentType value {} already in use".format(value))
+        if wire in cls._by_wire:
+            raise ValueError(
+                "ContentType wire '{}' already in use".format(wire))
+
+        content_type = object.__new__(cls)
+        content_type.name = name
+        content_type.value = value
+        content_type.wire = wire
+        content_type.codec = codec
+        cls._by_name[name] = content_type
+        cls._by_value[value] = content_type
+        cls._by_wire[wire] = content_type
+        setattr(cls, name, content_type)
+        return content_type
+
+    def __repr__(self):
+        return "<ContentType.{}: {}>".format(self.name, self.value)
+
+    def __str__(self):
+        return "ContentType.{}".format(self.name)
+
+    def __reduce__(self):
+        # Content types are singletons, also when copied or pickled
+        return _lookup, (self.name, )
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+ContentType.register("PROTOBUF", 'application/x-protobuf', ProtobufCodec(),
+                     wire_pb2.ContentType.Value("PROTOBUF"))
+ContentType.register("JSON", 'application/json', JsonCodec(),
+                     wire_pb2.ContentType.Value("JSON"))
+ContentType.register("RAW", 'application/octet-stream', RawCodec(), 4)
+ContentType.register("MSGPACK", 'application/msgpack', MsgPackCodec(), 5)
+ContentType.register("NDARRAY", 'application/x-ndarray', NdarrayCodec(), 6)
+
+
+def _lookup(name):
+    return ContentType[name]
+
+
+def default_content_type(obj):
+    """ Returns: content type used to pack an object when the message has
+    none, JSON for dictionaries, NDARRAY for numpy arrays and PROTOBUF for
+    everything else """
+    if isinstance(obj, dict):
+        return ContentType.JSON
+    # numpy is only imported by the users of arrays
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(obj, numpy.ndarray):
+        return ContentType.NDARRAY
+    return ContentType.PROTOBUF
 
 
 def content_type_to_wire(content_type):
     """ Converts an object of type ContentType to the wire string representation.
     Args:
-        content_type (ContentType): enum value
+        content_type (ContentType): registered content type
     Returns:
         str: wire string representation
     """
     assert_type(content_type, ContentType, "content_type")
-    if content_type == ContentType.PROTOBUF:
-        return 'application/x-protobuf'
-
-    if content_type == ContentType.JSON:
-        return 'application/json'
-
-    raise NotImplementedError(
-        "ContentType '{}' wire serialization not implemented".format(
-            content_type.name))
+    return content_type.wire
 
 
 def content_type_from_wire(string):
-    """ Converts the ContentType wire string representation to the enum form.
+    """ Converts the ContentType wire string representation to the registered
+    content type.
     Args:
         string (str): wire string representation
     Returns:
-        ContentType: enum value
+        ContentType: registered content type
     """
     assert_type(string, str, "string")
-    if string == 'application/x-protobuf':
-        return ContentType.PROTOBUF
-
-    if string == 'application/json':
-        return ContentType.JSON
-
-    raise RuntimeError("Bad content_type {}".format(string))
+    try:
+        return ContentType._by_wire[string]
+    except KeyError:
+        raise RuntimeError("Bad content_type {}".format(string))
@@ -0,0 +1,149 @@
+from struct import Struct as Format
+
+from six import PY2
+
+# Encoder and decoder of the Header protobuf message of wire.proto, written
+# by hand because it is on the path of every message: it is several times
+# faster than creating and serializing the generated message, and does not
+# depend on the protobuf version the package was generated with.
+
+HEADER_VERSION = 2
+
+_FIXED64 = Format('<Q')
+
+# field number << 3 | wire type
+_VERSION_TAG = 0x08
+_CORRELATION_ID_TAG = 0x10
+_STATUS_TAG = 0x1a
+_TRACE_ID_TAG = 0x21
+_SPAN_ID_TAG = 0x29
+# fields of the nested Status message
+_CODE_TAG = 0x08
+_WHY_TAG = 0x12
+
+
+def _varint(value, buffer):
+    while value > 0x7f:
+        buffer.append(0x80 | (value & 0x7f))
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, offset):
+    value, shift = 0, 0
+    while True:
+        try:
+            byte = data[offset]
+        except IndexError:
+            raise ValueError("Truncated wire header")
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _skip(data, offset, wire_type):
+    if wire_type == 0:
+        return _read_varint(data, offset)[1]
+    if wire_type == 1:
+        return offset + 8
+    if wire_type == 2:
+        size, offset = _read_varint(data, offset)
+        return offset + size
+    if wire_type == 5:
+        return offset + 4
+    raise ValueError("Unsupported wire type {}".format(wire_type))
+
+
+def encode_header(correlation_id=None,
+                  status_code=None,
+                  status_why=None,
+                  trace_id=None,
+                  span_id=None):
+    """ Serializes a Header message.
+    Args:
+        correlation_id (int): 64 bits correlation id, omitted if None.
+        status_code (int): StatusCode value, the status is omitted if it is
+        None and there is no status_why. An empty status, e.g. code 0, is
+        still sent so the peer knows it is present.
+        status_why (str): status description.
+        trace_id (int): 64 bits trace id, omitted if None.
+        span_id (int): 64 bits span id, omitted if None.
+    Returns:
+        bytes: serialized header.
+    """
+    buffer = bytearray((_VERSION_TAG, HEADER_VERSION))
+    if correlation_id is not None:
+        buffer.append(_CORRELATION_ID_TAG)
+        _varint(correlation_id, buffer)
+    if status_code is not None or status_why:
+        status = bytearray()
+        if status_code:
+            status.append(_CODE_TAG)
+            _varint(status_code, status)
+        if status_why:
+            why = status_why.encode('utf-8')
+            status.append(_WHY_TAG)
+            _varint(len(why), status)
+            status += why
+        buffer.append(_STATUS_TAG)
+        _varint(len(status), buffer)
+        buffer += status
+    if trace_id is not None:
+        buffer.append(_TRACE_ID_TAG)
+        buffer += _FIXED64.pack(trace_id)
+    if span_id is not None:
+        buffer.append(_SPAN_ID_TAG)
+        buffer += _FIXED64.pack(span_id)
+    return bytes(buffer)
+
+
+def _decode_status(data, offset, end):
+    code, why = 0, u""
+    while offset < end:
+        tag, offset = _read_varint(data, offset)
+        if tag == _CODE_TAG:
+            code, offset = _read_varint(data, offset)
+        elif tag == _WHY_TAG:
+            size, offset = _read_varint(data, offset)
+            why = bytes(data[offset:offset + size]).decode('utf-8')
+            offset += size
+        else:
+            offset = _skip(data, offset, tag & 0x07)
+    return code, why
+
+
+def decode_header(data):
+    """ Deserializes a Header message, unknown fields are ignored.
+    Args:
+        data (bytes): serialized header.
+    Returns:
+        tuple: version, correlation_id, status (code, why) and the trace_id
+        and span_id, None for the fields that are not present.
+    """
+    if PY2:
+        data = bytearray(data)
+    version = correlation_id = status = trace_id = span_id = None
+    offset, end = 0, len(data)
+    while offset < end:
+        tag, offset = _read_varint(data, offset)
+        if tag == _VERSION_TAG:
+            version, offset = _read_varint(data, offset)
+        elif tag == _CORRELATION_ID_TAG:
+            correlation_id, offset = _read_varint(data, offset)
+        elif tag == _STATUS_TAG:
+            size, offset = _read_varint(data, offset)
+            status = _decode_status(data, offset, offset + size)
+            offset += size
+        elif tag == _TRACE_ID_TAG:
+            trace_id, = _FIXED64.unpack_from(data, offset)
+            offset += 8
+        elif tag == _SPAN_ID_TAG:
+            span_id, = _FIXED64.unpack_from(data, offset)
+            offset += 8
+        else:
+            offset = _skip(data, offset, tag & 0x07)
+    if offset != end:
+        raise ValueError("Truncated wire header")
+    return version, correlation_id, status, trace_id, span_id
@@ -21,14 +21,23 @@ class StatusCode(Enum):
 
 
 class Status(object):
+    __slots__ = ("_code", "_why")
+
     def __init__(self, code=StatusCode.UNKNOWN, why=""):
-        self._code = None
-        self._why = None
         self.code = code
         self.why = why
 
+    @classmethod
+    def _create(cls, code, why):
+        """ Creates a status without validating its fields, for values that
+        are known to be valid """
+        status = cls.__new__(cls)
+        status._code = code
+        status._why = why
+        return status
+
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        return self._code == other._code and self._why == other._why
 
     def __str__(self):
         pretty = "{{ code={} why='{}' }}".format(self.code, self.why or "")
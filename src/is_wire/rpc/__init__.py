@@ -1,4 +1,5 @@
 from is_wire.rpc.service_provider import ServiceProvider
+from is_wire.rpc.rpc_client import RpcClient, RpcFuture
 from is_wire.rpc.interceptor import Interceptor
 from is_wire.rpc.log_interceptor import LogInterceptor
 from is_wire.rpc.tracing_interceptor import TracingInterceptor
@@ -6,6 +7,8 @@ from is_wire.rpc.metrics_interceptor import MetricsInterceptor
 
 __all__ = [
     "ServiceProvider",
+    "RpcClient",
+    "RpcFuture",
     "Interceptor",
     "LogInterceptor",
     "TracingInterceptor",
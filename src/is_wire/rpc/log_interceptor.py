@@ -7,10 +7,11 @@ class LogInterceptor(Interceptor):
         self.log = Logger(name='LogInterceptor')
 
     def before_call(self, context):
-        self.begin = now()
+        # kept in the context, calls may run concurrently
+        context.addons["log_begin"] = now()
 
     def after_call(self, context):
-        took = now() - self.begin
+        took = now() - context.addons["log_begin"]
         status = context.reply.status
         if status.ok():
             self.log.info("took={}s, code={}", took, status.code.name)
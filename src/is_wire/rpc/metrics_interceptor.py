@@ -18,10 +18,11 @@ class MetricsInterceptor(Interceptor):
         start_http_server(port)
 
     def before_call(self, context):
-        self.begin = time.time()
+        # kept in the context, calls may run concurrently
+        context.addons["metrics_begin"] = time.time()
 
     def after_call(self, context):
-        took = time.time() - self.begin
+        took = time.time() - context.addons["metrics_begin"]
         topic = context.request.topic
         code = context.reply.status.code.name
         self.duration.labels(topic, code).inc(took)
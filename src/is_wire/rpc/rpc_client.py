@@ -0,0 +1,189 @@
+from ..core import Channel, Message, Subscription, Status, StatusCode, Logger
+from ..core.utils import assert_type, new_uuid, now
+import heapq
+import socket
+import six
+
+
+class RpcFuture(object):
+    """ Reply of a request sent with RpcClient.call_async. There is no
+    background thread, replies are consumed by the client while one of its
+    futures is polled or waited on. """
+
+    def __init__(self, client, request):
+        self._client = client
+        self._request = request
+        self._reply = None
+
+    @property
+    def request(self):
+        """ Message: request this is the reply of """
+        return self._request
+
+    def done(self):
+        """ Returns: True if the reply was received or the request expired,
+        without waiting for it. """
+        if self._reply is None:
+            self._client.poll()
+        return self._reply is not None
+
+    def result(self, timeout=None):
+        """ Waits for the reply.
+        Args:
+            timeout (float): Period in seconds to wait for the reply. If it
+            was not received after this period a socket.timeout Exception is
+            raised. Independent of the timeout of the request.
+        Returns:
+            Message: reply to the request. Its status code is
+            DEADLINE_EXCEEDED if no reply was received before the deadline of
+            the request.
+        """
+        if self._reply is None:
+            self._client.wait([self], timeout)
+        return self._reply
+
+
+class RpcClient(object):
+    """ Sends requests to services and collects their replies, keeping many
+    requests in flight. Replies are received by a single subscription and
+    matched to their request by correlation_id:
+
+        client = RpcClient(channel, timeout=1.0)
+        futures = [client.call_async("MyService.Query", struct)
+                   for struct in structs]
+        for future in futures:
+            print(future.result().unpack(Int64Value))
+
+    Messages received that are not replies to a pending request, e.g. late
+    replies to expired requests, are dropped, so the channel should not be
+    shared with other consumers.
+    """
+    log = Logger("RpcClient")
+
+    def __init__(self, channel, timeout=None):
+        """ Args:
+            channel (Channel): channel the requests are published to and the
+            replies consumed from.
+            timeout (float): default timeout in seconds of the requests which
+            do not have one. Requests without timeout never expire.
+        """
+        assert_type(channel, Channel, "channel")
+        assert timeout is None or timeout > 0
+        self._channel = channel
+        self._timeout = timeout
+        self._subscription = Subscription(channel)
+        # correlation_id -> future of the pending requests
+        self._pending = {}
+        # (expiration, correlation_id) of the pending requests with timeout
+        self._expirations = []
+
+    def __len__(self):
+        """ Returns: number of requests waiting for their reply """
+        return len(self._pending)
+
+    def call_async(self, topic, request, timeout=None):
+        """ Publishes a request without waiting for its reply.
+        Args:
+            topic (str): topic of the service.
+            request (Message or object): request message, or an object packed
+            into a new one.
+            timeout (float): timeout in seconds of the request, the one of
+            the client by default. Also sent to the service, which drops the
+            request once it is exceeded.
+        Returns:
+            RpcFuture: future reply.
+        """
+        assert_type(topic, six.string_types, "topic")
+        message = request if isinstance(request, Message) \
+            else Message(request)
+        message.reply_to = self._subscription
+        if message.correlation_id in self._pending:
+            message.correlation_id = new_uuid()
+        timeout = timeout or message.timeout or self._timeout
+        if timeout is not None:
+            message.timeout = timeout
+
+        self._channel.publish(message, topic=topic)
+        future = RpcFuture(self, message)
+        self._pending[message.correlation_id] = future
+        if timeout is not None:
+            heapq.heappush(self._expirations,
+                           (message.created_at + timeout,
+                            message.correlation_id))
+        return future
+
+    def call(self, topic, request, timeout=None):
+        """ Publishes a request and waits for its reply, see call_async.
+        Returns:
+            Message: reply to the request.
+        """
+        return self.call_async(topic, request, timeout).result()
+
+    def call_many(self, topic, requests, timeout=None):
+        """ Publishes every request before waiting for their replies, see
+        call_async.
+        Returns:
+            list: replies to the requests, in the same order.
+        """
+        futures = [self.call_async(topic, request, timeout)
+                   for request in requests]
+        self.wait(futures)
+        return [future.result() for future in futures]
+
+    def wait(self, futures, timeout=None):
+        """ Consumes replies until the given futures are done.
+        Args:
+            futures (list): futures returned by call_async.
+            timeout (float): Period in seconds to wait. If some futures are
+            not done after this period a socket.timeout Exception is raised.
+        """
+        deadline = None if timeout is None else now() + timeout
+        while True:
+            self._expire()
+            if all(future._reply is not None for future in futures):
+                return
+            if deadline is not None and now() >= deadline:
+                raise socket.timeout()
+            try:
+                self._receive(
+                    self._channel.consume(timeout=self._next_wait(deadline)))
+            except socket.timeout:
+                pass
+
+    def poll(self):
+        """ Processes the replies already received and expires the requests
+        past their deadline, without waiting. """
+        while True:
+            try:
+                self._receive(self._channel.consume(timeout=0))
+            except socket.timeout:
+                break
+        self._expire()
+
+    def _next_wait(self, deadline):
+        # period until the caller deadline or the next expiration
+        wait = None if deadline is None else deadline - now()
+        if self._expirations:
+            expiration = self._expirations[0][0] - now()
+            wait = expiration if wait is None else min(wait, expiration)
+        return None if wait is None else max(wait, 0.0)
+
+    def _receive(self, message):
+        future = None
+        if message.subscription_id == self._subscription.id:
+            future = self._pending.pop(message.correlation_id, None)
+        if future is None:
+            self.log.debug("Dropping message not expected, topic='{}'",
+                           message.topic)
+            return
+        future._reply = message
+
+    def _expire(self):
+        expirations = self._expirations
+        while expirations and expirations[0][0] <= now():
+            _, correlation_id = heapq.heappop(expirations)
+            future = self._pending.pop(correlation_id, None)
+            if future is not None:
+                reply = future.request.create_reply()
+                reply.status = Status(StatusCode.DEADLINE_EXCEEDED)
+                future._reply = reply
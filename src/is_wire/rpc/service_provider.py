@@ -1,35 +1,420 @@
-from ..core import Channel, Subscription, Status, StatusCode, Logger
-from ..core.utils import assert_type
+from ..core import Channel, Subscription, Status, StatusCode, Logger, Message
+from ..core.utils import assert_type, now
 from .context import Context
+from collections import deque
+import multiprocessing
+import pickle
+import socket
+import threading
 import traceback
 import six
+from six.moves import queue
 from google.protobuf.json_format import ParseError
 
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # before Python 3.8 bodies are always pickled
+    resource_tracker = shared_memory = None
+
+EXECUTORS = ("thread", "process")
+
+
+class _Service(object):
+    def __init__(self, call, max_in_flight, executor=None, batch=None):
+        self.call = call
+        self.max_in_flight = max_in_flight
+        # None if called in the consuming thread
+        self.executor = executor
+        # _Batch of the services delegated with delegate_batch
+        self.batch = batch
+        # calls dispatched to the workers and not completed yet
+        self.in_flight = 0
+        # requests waiting for the number of calls in flight to decrease
+        self.backlog = deque()
+
+
+class _WorkerPool(object):
+    """ Threads running the calls submitted to them in order """
+
+    def __init__(self, size, on_error):
+        self._tasks = queue.Queue()
+        self._on_error = on_error
+        self._threads = []
+        for n in range(size):
+            thread = threading.Thread(target=self._work,
+                                      name="ServiceProvider-{}".format(n))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def __len__(self):
+        return len(self._threads)
+
+    def submit(self, function, *args):
+        self._tasks.put((function, args))
+
+    def close(self):
+        for _ in self._threads:
+            self._tasks.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            function, args = task
+            try:
+                function(*args)
+            except Exception:
+                self._on_error(traceback.format_exc())
+
+
+class _Histogram(object):
+    """ Counts of the observed values not greater than each bound """
+
+    def __init__(self, bounds):
+        self._bounds = sorted(bounds) + [float("inf")]
+        self._counts = [0] * len(self._bounds)
+        self._sum = 0.0
+
+    def observe(self, value):
+        self._sum += value
+        for n, bound in enumerate(self._bounds):
+            if value <= bound:
+                self._counts[n] += 1
+                return
+
+    def to_dict(self):
+        """ Returns:
+            dict: cumulative counts per upper bound as (bound, count) pairs,
+            the number of values observed and their sum.
+        """
+        buckets, total = [], 0
+        for bound, count in zip(self._bounds, self._counts):
+            total += count
+            buckets.append((bound, total))
+        return {"buckets": buckets, "count": total, "sum": self._sum}
+
+
+class _Batch(object):
+    def __init__(self, max_batch, max_wait):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # (request, received at) waiting for the batch call
+        self.requests = []
+        bounds, size = [], 1
+        while size < max_batch:
+            bounds.append(size)
+            size *= 2
+        self.size = _Histogram(bounds + [max_batch])
+        # milliseconds waited by each request, above max_wait if the
+        # consuming thread was busy
+        self.wait = _Histogram(
+            [1e3 * max_wait * f for f in (0.1, 0.25, 0.5, 0.75, 1.0, 2.0)])
+
+    def expiration(self):
+        return self.requests[0][1] + self.max_wait
+
+
+def _reply_with(reply, result):
+    if isinstance(result, Status):
+        reply.status = result
+    else:
+        reply.pack(result)
+        reply.status = Status(code=StatusCode.OK)
+
+
+def _parse_failure(request_type):
+    why = "Expected request type '{}' but received something else"\
+        .format(request_type.DESCRIPTOR.full_name)
+    return Status(StatusCode.FAILED_PRECONDITION, why)
+
+
+def _service_failure():
+    return Status(
+        code=StatusCode.INTERNAL_ERROR,
+        why="Service throwed exception:\n{}".format(traceback.format_exc()),
+    )
+
+
+def _unexpected_failure(reply):
+    trace = traceback.format_exc()
+    ServiceProvider.log.error("Unexpected error\n{}", trace)
+    reply.status = Status(StatusCode.INTERNAL_ERROR, trace)
+
+
+def _unpack_arg(request_type, context, into=None):
+    """ Returns: the request of the context unpacked as the argument of the
+    service function, or None if it failed, setting then the reply status """
+    try:
+        return context.request.unpack(request_type, into=into)
+    except ParseError:
+        context.reply.status = _parse_failure(request_type)
+    except Exception:
+        _unexpected_failure(context.reply)
+    return None
+
+
+def _set_result(reply, result):
+    """ Sets the status and the content of the reply to the result of the
+    service function """
+    try:
+        _reply_with(reply, result)
+    except Exception:
+        _unexpected_failure(reply)
+
+
+def _handle(function, request_type, reply_type, context, into=None):
+    """ Calls a service function with the request of the context, setting
+    the status and the content of the reply """
+    arg = _unpack_arg(request_type, context, into)
+    if arg is None:
+        return
+    try:
+        result = function(arg, context)
+        assert_type(result, (Status, reply_type), "function result")
+    except Exception:
+        result = _service_failure()
+    _set_result(context.reply, result)
+
+
+def _to_payload(body, shared_size):
+    """ Body as passed to or from a worker process: (body, None), or the
+    (name, size) of a shared memory block holding it when large """
+    if shared_memory is None or len(body) < shared_size:
+        return bytes(body) if isinstance(body, memoryview) else body, None
+    block = shared_memory.SharedMemory(create=True, size=len(body))
+    try:
+        block.buf[:len(body)] = body
+    except Exception:
+        block.close()
+        block.unlink()
+        raise
+    block.close()
+    return block.name, len(body)
+
+
+def _from_payload(payload, unlink=True):
+    """ Body of a payload, a shared memory block is removed once read
+    unless unlink is False, see _unlink """
+    body, size = payload
+    if size is None:
+        return body
+    block = shared_memory.SharedMemory(name=body)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+
+
+def _unlink(payload):
+    """ Removes the shared memory block of a payload, if any. Blocks are
+    removed only once, by the provider process, which shares the resource
+    tracker of its workers """
+    name, size = payload
+    if size is None:
+        return
+    try:
+        block = shared_memory.SharedMemory(name=name)
+    except OSError:
+        return
+    block.close()
+    block.unlink()
+
+
+def _call_in_process(function, request_type, reply_type, fields, payload,
+                     shared_size):
+    """ Runs in a worker process, the request is unpacked and the reply
+    packed here so only their bodies cross the process boundary.
+    Returns:
+        tuple: status code, status why, content type and payload of the
+        reply body.
+    """
+    try:
+        topic, content_type, content_encoding, created_at, timeout, \
+            metadata = fields
+        request = Message._create(
+            topic=topic,
+            body=_from_payload(payload, unlink=False),
+            content_type=content_type,
+            content_encoding=content_encoding,
+            created_at=created_at,
+            metadata=metadata,
+            timeout=timeout,
+        )
+        reply = request.create_reply()
+        if not request.deadline_exceeded():
+            _handle(function, request_type, reply_type,
+                    Context(request, reply))
+        if not reply.has_status():
+            return StatusCode.DEADLINE_EXCEEDED, "", None, ("", None)
+        return reply.status.code, reply.status.why, reply._content_type, \
+            _to_payload(reply._body, shared_size)
+    except Exception:
+        return StatusCode.INTERNAL_ERROR, traceback.format_exc(), None, \
+            ("", None)
+
 
 class ServiceProvider(object):
     log = Logger("ServiceProvider", Logger.DEBUG)
 
-    def __init__(self, channel):
+    # Period in seconds between checks for completed calls while consuming,
+    # when calls are running in the workers
+    REPLY_INTERVAL = 0.005
+
+    # Size in bytes from which request and reply bodies are passed to and
+    # from the process pool through shared memory instead of pipes
+    SHARED_MEMORY_SIZE = 64 * 1024
+
+    def __init__(self,
+                 channel,
+                 reuse_requests=False,
+                 workers=0,
+                 max_in_flight=None,
+                 processes=None):
+        """ Args:
+            channel (Channel): channel the requests are consumed from and the
+            replies published to.
+            reuse_requests (bool): if True each service parses its requests
+            into the same object instead of allocating one per request, so
+            functions must not keep their request after returning. With
+            workers there is one object per worker thread.
+            workers (int): number of threads running the service functions.
+            If 0 they run in the thread calling serve or run. Otherwise the
+            consuming thread only dispatches requests and publishes replies,
+            and functions and interceptors must be thread-safe.
+            max_in_flight (int): default maximum number of concurrent calls
+            of each service running in the workers or processes, see
+            delegate.
+            processes (int): size of the process pool running the services
+            delegated with executor="process", by default the number of
+            CPUs. The pool is started by the first of these services.
+        """
         assert_type(channel, Channel, "channel")
+        assert workers >= 0
+        assert processes is None or processes > 0
         self._channel = channel
+        self._reuse_requests = reuse_requests
         self._services = {}
         self._interceptors_before = []
         self._interceptors_after = []
         self._subscriptions = []
+        self._max_in_flight = max_in_flight
+        self._workers = _WorkerPool(workers, self._worker_error) \
+            if workers > 0 else None
+        self._n_processes = processes or multiprocessing.cpu_count()
+        self._processes = None
+        # calls submitted to the process pool and not completed yet, with
+        # their deadline, guarded by _calls_lock as they are completed by the
+        # thread receiving the results of the pool
+        self._process_calls = {}
+        self._calls_lock = threading.Lock()
+        # the tasks of expired calls may be lost, so the pool never finishes
+        self._calls_expired = False
+        # (service, request, reply, timeouted) of the calls completed by the
+        # workers or processes, published by the consuming thread
+        self._completed = queue.Queue()
+        self._in_flight = 0
+        # topic -> service of the services delegated with delegate_batch
+        self._batched = {}
 
-    def delegate(self, topic, function, request_type, reply_type):
+    def delegate(self,
+                 topic,
+                 function,
+                 request_type,
+                 reply_type,
+                 max_in_flight=None,
+                 executor=None):
         """ Bind a function to a particular topic, so everytime a message is
-            received in this topic the function will be called """
-        assert_type(topic, six.string_types, "topic")
-        if any(topic == s.name for s in self._subscriptions):
-            raise RuntimeError(
-                "Service on topic '{}' was already delegated".format(topic))
+            received in this topic the function will be called.
+            Args:
+                max_in_flight (int): with workers or processes, maximum
+                number of calls of this service running at the same time.
+                Further requests wait for one of them to complete, without
+                delaying the requests of other services. By default the
+                number of workers or processes.
+                executor (str): "thread" to call the function in the worker
+                threads, the default when there are workers, or "process" to
+                call it in the process pool, for CPU-bound functions. The
+                function must then be picklable, e.g. defined at module
+                level. Only the bodies of the request and of the reply cross
+                the process boundary, large ones through shared memory when
+                available, and the context of the call only carries its
+                request topic, deadline and metadata. Interceptors still run
+                in this process.
+        """
+        self._check_topic(topic)
+        assert max_in_flight is None or max_in_flight > 0
+        if executor is None and self._workers is not None:
+            executor = "thread"
+        if executor is not None and executor not in EXECUTORS:
+            raise ValueError("Unknown executor '{}', expected one of {}"
+                             .format(executor, EXECUTORS))
+        if executor == "thread" and self._workers is None:
+            raise ValueError(
+                "The thread executor requires a provider with workers")
 
-        self.log.debug("New service registered '{}'", topic)
-        subscription = Subscription(self._channel, name=topic)
-        self._subscriptions.append(subscription)
-        wrapped = self.wrap(function, request_type, reply_type)
-        self._services[subscription.id] = wrapped
+        if executor == "process":
+            try:
+                pickle.dumps((function, request_type, reply_type))
+            except Exception as error:
+                why = "Functions running in processes must be picklable, " \
+                    "e.g. defined at module level"
+                six.raise_from(ValueError(why), error)
+            if self._processes is None:
+                if resource_tracker is not None:
+                    # shared by the workers, so shared memory blocks are
+                    # tracked once whichever process created them
+                    resource_tracker.ensure_running()
+                self._processes = multiprocessing.Pool(self._n_processes)
+            call = self._submitter(function, request_type, reply_type)
+            default_max_in_flight = self._n_processes
+        else:
+            call = self.wrap(function, request_type, reply_type)
+            default_max_in_flight = len(self._workers or ()) or 1
+
+        self._services[self._subscribe(topic).id] = _Service(
+            call, max_in_flight or self._max_in_flight or
+            default_max_in_flight, executor)
+
+    def delegate_batch(self,
+                       topic,
+                       function,
+                       request_type,
+                       reply_type,
+                       max_batch=32,
+                       max_wait_ms=5.0):
+        """ Bind a function called with many requests at once to a topic,
+        for services much faster per request when processing them together.
+        Requests are collected until there are max_batch of them or the
+        first one waited max_wait_ms, then the function is called with the
+        list of requests and the list of their contexts. It must return a
+        list with a reply_type object or a Status for each request, in the
+        same order. Replies are published to each request reply_to with its
+        correlation_id. Requests past their deadline or which can not be
+        parsed are replied without being passed to the function. With
+        workers the function runs in the worker threads. The sizes of the
+        batches and the time the requests waited are exposed by stats.
+            Args:
+                max_batch (int): maximum number of requests of a call.
+                max_wait_ms (float): maximum period in milliseconds a request
+                waits for the batch to be full. Requests are only collected
+                and batches completed while serving, see run.
+        """
+        self._check_topic(topic)
+        assert max_batch > 0 and max_wait_ms >= 0
+        executor = None if self._workers is None else "thread"
+        service = _Service(
+            self._wrap_batch(function, request_type, reply_type),
+            max_in_flight=None,
+            executor=executor,
+            batch=_Batch(max_batch, max_wait_ms / 1e3))
+        self._services[self._subscribe(topic).id] = service
+        self._batched[topic] = service
 
     def add_interceptor(self, interceptor):
         """ Add an interceptor to the service provider. Interceptors provide
@@ -46,13 +431,39 @@ class ServiceProvider(object):
         self._interceptors_before.append(interceptor.before_call)
         self._interceptors_after.append(interceptor.after_call)
 
+    def stats(self):
+        """ Returns:
+            dict: number of calls in flight and, for every topic delegated
+            with delegate_batch, histograms of the number of requests of the
+            calls, "batch_size", and of the milliseconds the requests waited
+            for the call, "batch_wait_ms". Histograms have cumulative counts
+            of the values not greater than each bound, as (bound, count)
+            pairs in "buckets", with the number of values in "count" and
+            their sum in "sum".
+        """
+        return {
+            "in_flight": self._in_flight,
+            "batches": {
+                topic: {
+                    "batch_size": service.batch.size.to_dict(),
+                    "batch_wait_ms": service.batch.wait.to_dict(),
+                }
+                for topic, service in self._batched.items()
+            },
+        }
+
     def should_serve(self, message):
         return message.subscription_id in self._services
 
     def serve(self, message):
         """ Attempts to serve the message. Raises runtime error if message
         cannot be served. Users can check if the message can be served by
-        calling the should_serve method """
+        calling the should_serve method. With workers or processes the call
+        is only dispatched, its reply is published by a later call to serve,
+        run or join, and a request consumed with pooled_messages is released
+        by the provider once served. Requests of services delegated with
+        delegate_batch are only collected, and the batches waiting for longer
+        than their max_wait_ms are called. """
         try:
             service = self._services[message.subscription_id]
         except KeyError as error:
@@ -60,67 +471,336 @@ class ServiceProvider(object):
                 message.subscription_id)
             six.raise_from(RuntimeError(why), error)
 
-        reply, timeouted = service(message)
-        if reply.has_topic() and not timeouted:
-            self._channel.publish(reply)
+        self._publish_completed()
+        if service.batch is not None:
+            batch = service.batch
+            batch.requests.append((message, now()))
+            if len(batch.requests) >= batch.max_batch:
+                self._call_batch(service)
+        elif service.executor is None:
+            reply, timeouted = service.call(message)
+            self._publish_reply(reply, timeouted)
+        elif service.in_flight < service.max_in_flight:
+            self._dispatch(service, message)
+        else:
+            service.backlog.append(message)
+        self._call_batches()
 
     def run(self):
-        """ Blocks the current thread listening for requests """
+        """ Blocks the current thread listening for requests. Requests
+        consumed from a channel with pooled_messages are released once
+        served. """
         self.log.info("Listening for requests")
         while True:
-            self.serve(self._channel.consume())
+            try:
+                request = self._channel.consume(timeout=self._next_wait())
+            except socket.timeout:
+                self._publish_completed()
+                self._call_batches()
+                continue
+            # the request may be released and reused once dispatched
+            service = self._services.get(request.subscription_id)
+            self.serve(request)
+            if service.executor is None and service.batch is None and \
+                    request._pool is not None:
+                request.release()
 
-    def wrap(self, function, request_type, reply_type):
-        def safe_call(*args):
+    def join(self, timeout=None):
+        """ Calls the batches collected so far and, with workers or
+        processes, waits for the calls in flight to complete and publishes
+        their replies. Requests are not consumed meanwhile.
+        Args:
+            timeout (float): maximum period in seconds to wait.
+        Returns:
+            bool: True if every call completed.
+        """
+        self._call_batches(force=True)
+        deadline = None if timeout is None else now() + timeout
+        while self._in_flight != 0:
+            self._expire_calls()
+            wait = None if deadline is None else deadline - now()
+            if wait is not None and wait <= 0:
+                break
+            if self._process_calls:
+                # wakes up to expire the calls whose result is lost
+                wait = self.REPLY_INTERVAL if wait is None \
+                    else min(wait, self.REPLY_INTERVAL)
+            try:
+                completed = self._completed.get(timeout=wait)
+            except queue.Empty:
+                continue
+            self._complete(*completed)
+        return self._in_flight == 0
+
+    def close(self):
+        """ Waits for the calls in flight and stops the worker threads and
+        processes """
+        self.join()
+        if self._workers is not None:
+            self._workers.close()
+            self._workers = None
+        if self._processes is not None:
+            if self._calls_expired:
+                self._processes.terminate()
+            else:
+                self._processes.close()
+            self._processes.join()
+            self._processes = None
+
+    def _dispatch(self, service, request):
+        service.in_flight += 1
+        self._in_flight += 1
+        if service.executor == "process":
+            service.call(service, request)
+        else:
+            self._workers.submit(self._call, service, request)
+
+    def _check_topic(self, topic):
+        assert_type(topic, six.string_types, "topic")
+        if any(topic == s.name for s in self._subscriptions):
+            raise RuntimeError(
+                "Service on topic '{}' was already delegated".format(topic))
+
+    def _subscribe(self, topic):
+        self.log.debug("New service registered '{}'", topic)
+        subscription = Subscription(self._channel, name=topic)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def _next_wait(self):
+        # period run can block consuming, None if there is nothing to do
+        # until a request arrives
+        wait = self.REPLY_INTERVAL if self._in_flight != 0 else None
+        for service in six.itervalues(self._batched):
+            if service.batch.requests:
+                left = max(service.batch.expiration() - now(), 0.0)
+                wait = left if wait is None else min(wait, left)
+        return wait
+
+    def _call_batches(self, force=False):
+        for service in six.itervalues(self._batched):
+            if service.batch.requests and \
+                    (force or service.batch.expiration() <= now()):
+                self._call_batch(service)
+
+    def _call_batch(self, service):
+        batch = service.batch
+        received, batch.requests = batch.requests, []
+        called_at = now()
+        batch.size.observe(len(received))
+        for _, received_at in received:
+            batch.wait.observe(1e3 * (called_at - received_at))
+        requests = [request for request, _ in received]
+
+        if service.executor is None:
+            for request, (reply, timeouted) in \
+                    zip(requests, service.call(requests)):
+                self._publish_reply(reply, timeouted)
+                if request._pool is not None:
+                    request.release()
+            return
+
+        service.in_flight += len(requests)
+        self._in_flight += len(requests)
+        self._workers.submit(self._call_many, service, requests)
+
+    def _call_many(self, service, requests):
+        # runs in a worker thread, completes also if the call fails
+        results = [(None, True)] * len(requests)
+        try:
+            results = service.call(requests)
+        finally:
+            for request, (reply, timeouted) in zip(requests, results):
+                self._completed.put((service, request, reply, timeouted))
+
+    def _call(self, service, request):
+        # runs in a worker thread, completes also if the call fails
+        reply, timeouted = None, True
+        try:
+            reply, timeouted = service.call(request)
+        finally:
+            self._completed.put((service, request, reply, timeouted))
+
+    def _publish_completed(self):
+        self._expire_calls()
+        while True:
+            try:
+                completed = self._completed.get_nowait()
+            except queue.Empty:
+                return
+            self._complete(*completed)
+
+    def _complete(self, service, request, reply, timeouted):
+        service.in_flight -= 1
+        self._in_flight -= 1
+        self._publish_reply(reply, timeouted)
+        if request._pool is not None:
+            request.release()
+        if service.backlog:
+            self._dispatch(service, service.backlog.popleft())
+
+    def _publish_reply(self, reply, timeouted):
+        if not timeouted and reply.has_topic():
+            self._channel.publish(reply)
+
+    def _worker_error(self, trace):
+        self.log.error("Worker throwed exception:\n{}", trace)
+
+    def _run_interceptors(self, interceptors, context):
+        for interceptor in interceptors:
             try:
-                result = function(*args)
-                assert_type(result, (Status, reply_type), "function result")
-                return result
+                interceptor(context)
             except Exception:
-                return Status(
-                    code=StatusCode.INTERNAL_ERROR,
-                    why="Service throwed exception:\n{}".format(
-                        traceback.format_exc()),
-                )
-
-        def run_interceptors(interceptors, *args):
-            for interceptor in interceptors:
+                trace = traceback.format_exc()
+                self.log.error("Interceptor throwed exception:\n{}", trace)
+
+    def _finish(self, context):
+        request, reply = context.request, context.reply
+        timeouted = request.deadline_exceeded()
+        if timeouted:
+            reply.status = Status(StatusCode.DEADLINE_EXCEEDED)
+        self._run_interceptors(self._interceptors_after, context)
+        return reply, timeouted
+
+    def _submitter(self, function, request_type, reply_type):
+        """ Returns the call of a service running in the process pool, which
+        completes in the thread receiving the results of the pool, or in the
+        consuming thread if the request deadline is exceeded first. Pools
+        silently lose the tasks of the workers that die, only the calls of
+        requests with a timeout are then completed. """
+        def submit(service, request):
+            context = Context(request, request.create_reply())
+            self._run_interceptors(self._interceptors_before, context)
+            if request.deadline_exceeded():
+                self._completed.put((service, request) + self._finish(context))
+                return
+
+            # the body is sent as received, decompressed by the worker
+            fields = (request._topic, request._content_type,
+                      request._content_encoding, request._created_at,
+                      request._timeout, dict(request.metadata))
+            payload = _to_payload(request._body, self.SHARED_MEMORY_SIZE)
+            deadline = request.created_at + request.timeout \
+                if request.has_timeout() else None
+            key = object()
+            with self._calls_lock:
+                self._process_calls[key] = (service, context, payload,
+                                            deadline)
+
+            def done(result):
+                code, why, content_type, reply_payload = result
+                call = self._take_call(key)
+                if call is None:
+                    _unlink(reply_payload)
+                    return
+                reply = context.reply
                 try:
-                    interceptor(*args)
+                    reply._body = _from_payload(reply_payload)
+                    reply._content_type = content_type
+                    reply.status = Status(code, why)
                 except Exception:
                     trace = traceback.format_exc()
-                    self.log.error("Interceptor throwed exception:\n{}", trace)
+                    reply.status = Status(StatusCode.INTERNAL_ERROR, trace)
+                self._complete_call(call)
 
-        def wrapper(request):
-            reply = request.create_reply()
-            context = Context(request, reply)
+            def failed(error):
+                call = self._take_call(key)
+                if call is not None:
+                    context.reply.status = Status(
+                        StatusCode.INTERNAL_ERROR,
+                        "Worker process failed: {!r}".format(error))
+                    self._complete_call(call)
 
-            run_interceptors(self._interceptors_before, context)
+            # error_callback is not available on python 2
+            callbacks = {"callback": done}
+            if not six.PY2:
+                callbacks["error_callback"] = failed
+            self._processes.apply_async(
+                _call_in_process,
+                (function, request_type, reply_type, fields, payload,
+                 self.SHARED_MEMORY_SIZE),
+                **callbacks)
 
-            if not request.deadline_exceeded():
+        return submit
+
+    def _take_call(self, key):
+        with self._calls_lock:
+            return self._process_calls.pop(key, None)
+
+    def _complete_call(self, call):
+        service, context, payload, _ = call
+        _unlink(payload)
+        self._completed.put(
+            (service, context.request) + self._finish(context))
+
+    def _expire_calls(self):
+        # completes the process calls past their deadline, whose result may
+        # never arrive
+        if not self._process_calls:
+            return
+        at = now()
+        with self._calls_lock:
+            expired = [key for key, (_, _, _, deadline) in
+                       six.iteritems(self._process_calls)
+                       if deadline is not None and deadline <= at]
+            calls = [self._process_calls.pop(key) for key in expired]
+        self._calls_expired = self._calls_expired or bool(calls)
+        for call in calls:
+            self._complete_call(call)
+
+    def _wrap_batch(self, function, request_type, reply_type):
+        def wrapper(requests):
+            contexts = [Context(request, request.create_reply())
+                        for request in requests]
+            for context in contexts:
+                self._run_interceptors(self._interceptors_before, context)
+
+            args, called = [], []
+            for context in contexts:
+                if context.request.deadline_exceeded():
+                    continue
+                arg = _unpack_arg(request_type, context)
+                if arg is not None:
+                    args.append(arg)
+                    called.append(context)
+
+            if called:
                 try:
-                    arg = request.unpack(request_type)
-                    result = safe_call(arg, context)
-                    if isinstance(result, Status):
-                        reply.status = result
-                    else:
-                        reply.pack(result)
-                        reply.status = Status(code=StatusCode.OK)
-                except ParseError:
-                    why = "Expected request type '{}' but received something else"\
-                        .format(request_type.DESCRIPTOR.full_name)
-                    reply.status = Status(StatusCode.FAILED_PRECONDITION, why)
+                    results = function(args, called)
+                    if len(results) != len(called):
+                        raise ValueError(
+                            "Expected {} results but received {}".format(
+                                len(called), len(results)))
+                    for result in results:
+                        assert_type(result, (Status, reply_type),
+                                    "function result")
                 except Exception:
-                    trace = traceback.format_exc()
-                    self.log.error("Unexpected error\n{}", trace)
-                    reply.status = Status(StatusCode.INTERNAL_ERROR, trace)
+                    results = [_service_failure()] * len(called)
+                for context, result in zip(called, results):
+                    _set_result(context.reply, result)
+
+            return [self._finish(context) for context in contexts]
 
-            timeouted = request.deadline_exceeded()
-            if timeouted:
-                reply.status = Status(StatusCode.DEADLINE_EXCEEDED)
+        return wrapper
 
-            run_interceptors(self._interceptors_after, context)
+    def wrap(self, function, request_type, reply_type):
+        # parsed again by every request when reused, one per thread
+        reused = threading.local()
 
-            return reply, timeouted
+        def request_object():
+            if not self._reuse_requests:
+                return None
+            obj = getattr(reused, "obj", None)
+            if obj is None:
+                obj = reused.obj = request_type()
+            return obj
+
+        def wrapper(request):
+            context = Context(request, request.create_reply())
+            self._run_interceptors(self._interceptors_before, context)
+            if not request.deadline_exceeded():
+                _handle(function, request_type, reply_type, context,
+                        into=request_object())
+            return self._finish(context)
 
         return wrapper
@@ -21,17 +21,19 @@ class TracingInterceptor(Interceptor):
         self.namer = span_namer
 
     def before_call(self, context):
-        self.tracer = Tracer(
-            self.exporter, span_context=context.request.extract_tracing())
-        context.addons["tracer"] = self.tracer
-        self.span = self.tracer.start_span(name=self.namer(context))
+        # kept in the context, calls may run concurrently
+        tracer = Tracer(self.exporter,
+                        span_context=context.request.extract_tracing())
+        context.addons["tracer"] = tracer
+        context.addons["span"] = tracer.start_span(name=self.namer(context))
 
     def after_call(self, context):
+        tracer, span = context.addons["tracer"], context.addons["span"]
         status = context.reply.status
         if not status.ok():
-            self.span.add_attribute("reply_to", context.request.reply_to)
-            self.span.add_attribute("status_code", status.code.name)
-            self.span.add_attribute("status_why", status.why)
+            span.add_attribute("reply_to", context.request.reply_to)
+            span.add_attribute("status_code", status.code.name)
+            span.add_attribute("status_why", status.why)
 
-        context.reply.inject_tracing(self.span)
-        self.tracer.end_span()
+        context.reply.inject_tracing(span)
+        tracer.end_span()
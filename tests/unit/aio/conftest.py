@@ -0,0 +1,4 @@
+import sys
+
+# asyncio coroutines syntax is not available on python 2
+collect_ignore_glob = ["test_*.py"] if sys.version_info < (3, 5) else []
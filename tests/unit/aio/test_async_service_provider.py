@@ -0,0 +1,160 @@
+import asyncio
+import socket
+import time
+
+import pytest
+from google.protobuf.struct_pb2 import Struct
+from google.protobuf.wrappers_pb2 import Int64Value
+from is_wire.aio import AsyncChannel, AsyncServiceProvider, AsyncSubscription
+from is_wire.core import ContentType, Message, Status, StatusCode
+from is_wire.rpc import Interceptor
+
+URI = "inproc://test_aio_rpc"
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+class StatusInterceptor(Interceptor):
+    def __init__(self):
+        self.before, self.after = 0, []
+
+    def before_call(self, context):
+        self.before += 1
+
+    def after_call(self, context):
+        self.after.append(context.reply.status.code)
+
+
+async def my_service(request, context):
+    value = int(request.fields["value"].number_value)
+    await asyncio.sleep(0.1)
+    if value == 666:
+        return Status(StatusCode.FAILED_PRECONDITION, "Cant be zero")
+    if value == 10:
+        raise RuntimeError("Unexpected error")
+    if value == 11:
+        return Struct()
+    return Int64Value(value=value)
+
+
+def sync_service(request, context):
+    return Int64Value(value=int(request.fields["value"].number_value))
+
+
+async def request(channel, topic, value, subscription, timeout=None):
+    struct = Struct()
+    struct.fields["value"].number_value = value
+    message = Message(struct, reply_to=subscription)
+    if timeout is not None:
+        message.timeout = timeout
+    await channel.publish(message, topic=topic)
+    return message
+
+
+def test_concurrent_calls():
+    async def serve():
+        async with AsyncChannel(uri=URI) as channel, \
+                AsyncChannel(uri=URI) as client:
+            provider = AsyncServiceProvider(channel)
+            interceptor = StatusInterceptor()
+            provider.add_interceptor(interceptor)
+            await provider.delegate("MyService.Async", my_service, Struct,
+                                    Int64Value)
+            await provider.delegate("MyService.Sync", sync_service, Struct,
+                                    Int64Value)
+            await provider.delegate("MyService.Typed", sync_service,
+                                    Int64Value, Int64Value)
+            subscription = await AsyncSubscription.create(client)
+            running = asyncio.ensure_future(provider.run())
+
+            values = list(range(100)) + [666, 10, 11]
+            sent = [await request(client, "MyService.Async", value,
+                                  subscription) for value in values]
+            sent.append(await request(client, "MyService.Sync", 7,
+                                      subscription))
+            wrong = Message(b'"not a number"', reply_to=subscription,
+                            content_type=ContentType.JSON)
+            await client.publish(wrong, topic="MyService.Typed")
+            sent.append(wrong)
+            began = time.time()
+            replies = {}
+            for _ in sent:
+                reply = await client.consume(timeout=1.0)
+                replies[reply.correlation_id] = reply
+            # the calls wait concurrently
+            assert time.time() - began < 0.5
+
+            for message, value in zip(sent, values + [7, 666]):
+                reply = replies[message.correlation_id]
+                if value == 666:
+                    assert reply.status.code == StatusCode.FAILED_PRECONDITION
+                elif value in (10, 11):
+                    assert reply.status.code == StatusCode.INTERNAL_ERROR
+                else:
+                    assert reply.unpack(Int64Value).value == value
+            assert interceptor.before == len(sent)
+            assert len(interceptor.after) == len(sent)
+
+            running.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await running
+            await provider.join()
+
+    run(serve())
+
+
+def test_deadline():
+    async def serve():
+        async with AsyncChannel(uri=URI) as channel:
+            provider = AsyncServiceProvider(channel)
+            interceptor = StatusInterceptor()
+            provider.add_interceptor(interceptor)
+            await provider.delegate("MyService.Deadline", my_service, Struct,
+                                    Int64Value)
+            subscription = await AsyncSubscription.create(channel)
+
+            await request(channel, "MyService.Deadline", 1, subscription,
+                          timeout=0.02)
+            began = time.time()
+            await provider.serve(await channel.consume(timeout=1.0))
+            # cancelled at the deadline, the reply is not published
+            assert time.time() - began < 0.1
+            assert interceptor.after == [StatusCode.DEADLINE_EXCEEDED]
+            with pytest.raises(socket.timeout):
+                await channel.consume(timeout=0.1)
+
+    run(serve())
+
+
+def test_max_in_flight():
+    async def serve():
+        async with AsyncChannel(uri=URI) as channel:
+            provider = AsyncServiceProvider(channel)
+            running = {"now": 0, "max": 0}
+
+            async def limited(request, context):
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+                await asyncio.sleep(0.01)
+                running["now"] -= 1
+                return Int64Value(value=1)
+
+            await provider.delegate("MyService.Limited", limited, Struct,
+                                    Int64Value, max_in_flight=2)
+            subscription = await AsyncSubscription.create(channel)
+            for _ in range(6):
+                await request(channel, "MyService.Limited", 0, subscription)
+            await asyncio.gather(*[
+                provider.serve(await channel.consume(timeout=1.0))
+                for _ in range(6)
+            ])
+            assert running["max"] == 2
+            with pytest.raises(RuntimeError):
+                await provider.delegate("MyService.Limited", limited, Struct,
+                                        Int64Value)
+            with pytest.raises(RuntimeError):
+                await provider.serve(await channel.consume(timeout=1.0))
+
+    run(serve())
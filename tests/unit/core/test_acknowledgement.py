@@ -0,0 +1,64 @@
+import time
+from is_wire.core.acknowledgement import Acknowledger
+
+
+class FakeChannel(object):
+    def __init__(self):
+        self.calls = []
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.calls.append(("ack", delivery_tag, multiple))
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        self.calls.append(("nack", delivery_tag, requeue))
+
+
+def test_coalesced_acks():
+    channel = FakeChannel()
+    acker = Acknowledger(channel)
+    acker.add_consumer("c", batch_size=3, interval=10.0)
+    for tag in range(1, 7):
+        acker.delivered(tag, "c")
+
+    acker.ack(1)
+    acker.ack(2)
+    assert channel.calls == []
+    acker.ack(3)
+    assert channel.calls == [("ack", 3, True)]
+
+    # tag 4 is still unacked, so 6 can not be coalesced with 5
+    acker.ack(5)
+    acker.ack(6)
+    acker.nack(4, requeue=False)
+    acker.flush()
+    assert channel.calls[1:] == [("nack", 4, False), ("ack", 6, True)]
+
+
+def test_out_of_order_acks():
+    channel = FakeChannel()
+    acker = Acknowledger(channel)
+    acker.add_consumer("c", batch_size=2, interval=10.0)
+    for tag in range(1, 5):
+        acker.delivered(tag, "c")
+
+    acker.ack(4)
+    acker.ack(2)
+    assert channel.calls == [("ack", 4, False), ("ack", 2, False)]
+
+
+def test_interval():
+    channel = FakeChannel()
+    acker = Acknowledger(channel)
+    acker.add_consumer("c", batch_size=100, interval=0.01)
+    assert acker.deadline() is None
+
+    acker.delivered(1, "c")
+    acker.ack(1)
+    acker.tick()
+    assert channel.calls == []
+    assert acker.deadline() is not None
+
+    time.sleep(0.02)
+    acker.tick()
+    assert channel.calls == [("ack", 1, True)]
+    assert acker.deadline() is None
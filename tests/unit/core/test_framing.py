@@ -0,0 +1,173 @@
+import socket
+import struct
+import threading
+import amqp
+import pytest
+from amqp.method_framing import frame_writer
+from amqp.serialization import dumps
+from amqp import spec
+from is_wire.core import Message, ContentType
+from is_wire.core.framing import (FrameBuffer, InboundContent,
+                                  ZERO_COPY_SIZE, frame_handler,
+                                  write_segments)
+from is_wire.core.wire.conversion import WireV1
+
+
+class FakeConnection(object):
+    def __init__(self, frame_max):
+        self.frame_max = frame_max
+        self.bytes_sent = 0
+        self.bytes_recv = 0
+
+
+class FakeTransport(object):
+    def __init__(self):
+        self.written = bytearray()
+
+    def write(self, data):
+        self.written += data
+
+
+def reference_frames(frame_max, exchange, routing_key, body, properties):
+    transport = FakeTransport()
+    write = frame_writer(FakeConnection(frame_max), transport)
+    args = dumps('Bssbb', (0, exchange, routing_key, False, False))
+    write(1, 1, spec.Basic.Publish, args,
+          amqp.Message(body=body, **properties))
+    return bytes(transport.written)
+
+
+@pytest.mark.parametrize("size", [0, 10, 4096, 10000])
+def test_same_frames_as_amqp(size):
+    message = Message(content=bytes(bytearray(range(256)) * size))
+    message.content_type = ContentType.PROTOBUF
+    message.reply_to = "reply_to"
+    message.timeout = 1.0
+    message.metadata = {"key": "value"}
+    properties = WireV1.to_amqp_properties(message)
+
+    frames = FrameBuffer(channel_id=1, frame_max=4096)
+    frames.add_publish("is", "My.Topic", message.body, properties)
+    frames.add_publish("is", "Other.Topic", message.body, properties)
+
+    expected = reference_frames(4096, "is", "My.Topic", message.body,
+                                properties)
+    expected += reference_frames(4096, "is", "Other.Topic", message.body,
+                                 properties)
+    assert frames.count == 2
+    assert bytes(frames.getvalue()) == expected
+
+
+def test_multicast_frames():
+    message = Message(content=b"body" * 100, reply_to="reply_to")
+    properties = WireV1.to_amqp_properties(message)
+    other = dict(properties, content_type="application/json")
+
+    frames = FrameBuffer(channel_id=1, frame_max=4096)
+    expected = b""
+    # only consecutive publishes of the same objects reuse the frames
+    for key, body, props in [("A", message.body, properties),
+                             ("B", message.body, properties),
+                             ("C", message.body, other),
+                             ("D", b"other", other),
+                             ("E", b"other", other)]:
+        frames.add_publish("is", key, body, props)
+        expected += reference_frames(4096, "is", key, body, props)
+    assert frames.count == 5
+    assert bytes(frames.getvalue()) == expected
+
+
+def test_large_body_is_not_copied():
+    body = bytearray(range(256)) * (ZERO_COPY_SIZE // 128)
+    frames = FrameBuffer(channel_id=1, frame_max=4096)
+    frames.add_publish("is", "A", body, {})
+
+    views = [s for s in frames.segments() if isinstance(s, memoryview)]
+    assert len(views) == len(body) // (4096 - 8) + 1
+    assert all(view.obj is body for view in views)
+    assert len(frames) == len(frames.getvalue())
+    assert bytes(frames.getvalue()) == reference_frames(
+        4096, "is", "A", bytes(body), {})
+
+    frames.clear()
+    assert len(frames) == 0
+    assert frames.segments() == [bytearray()]
+
+
+class SocketTransport(FakeTransport):
+    def __init__(self, sock):
+        super(SocketTransport, self).__init__()
+        self.sock = sock
+
+
+@pytest.mark.skipif(not hasattr(socket, "socketpair"),
+                    reason="socketpair not available")
+def test_write_segments():
+    segments = [b"header", memoryview(b"x" * 300000), bytearray(b"end")]
+    expected = b"".join(bytes(segment) for segment in segments)
+    sender, receiver = socket.socketpair()
+    # small buffers force partial writes
+    sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    received = bytearray()
+
+    def read():
+        while len(received) < len(expected):
+            received.extend(receiver.recv(1 << 16))
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    transport = SocketTransport(sender)
+    write_segments(transport, segments)
+    reader.join()
+    sender.close()
+    receiver.close()
+
+    assert bytes(received) == expected
+    # the socket was written directly
+    assert transport.written == bytearray()
+
+    fallback = FakeTransport()
+    write_segments(fallback, segments)
+    assert bytes(fallback.written) == expected
+
+
+def parse_frames(data):
+    offset = 0
+    while offset < len(data):
+        frame_type, channel, size = struct.unpack_from('>BHI', data, offset)
+        offset += 7
+        yield frame_type, channel, bytes(data[offset:offset + size])
+        offset += size + 1
+
+
+def deliver_frames(body):
+    args = dumps('sLbss', ("ctag", 1, False, "is", "A"))
+    frames = FrameBuffer(channel_id=1, frame_max=4096)
+    method = struct.pack('>HH', *spec.Basic.Deliver) + args
+    frames._buffer += frames._frame(1, method)
+    frames._buffer += frames._frame(2, frames.content_header({}, len(body)))
+    frames._add_body(body)
+    return list(parse_frames(frames.getvalue()))
+
+
+@pytest.mark.parametrize("size", [0, 10, 10000])
+def test_frame_handler(size):
+    body = bytes(bytearray(range(256)) * size)
+    received = []
+    on_frame = frame_handler(FakeConnection(4096),
+                             lambda *args: received.append(args))
+    results = [on_frame(frame) for frame in deliver_frames(body)]
+    assert results[-1] is True
+    assert not any(results[:-1])
+    assert on_frame((8, 0, b"")) is False
+
+    (channel, method, args, message), = received
+    assert (channel, method) == (1, spec.Basic.Deliver)
+    assert isinstance(message, InboundContent)
+    # like py-amqp, empty bodies are left as an empty str
+    assert (message.body or b"") == body
+    # bodies split in frames are assembled in a single buffer
+    assert isinstance(message.body, memoryview) == (len(body) > 4096)
+
+    with pytest.raises(amqp.exceptions.UnexpectedFrame):
+        on_frame((3, 1, b"body without header"))
@@ -0,0 +1,111 @@
+import time
+import socket
+import pytest
+from is_wire.core import Channel, Message, Subscription, Status, StatusCode
+from is_wire.core.inproc import topic_matches
+
+URI = "inproc://test_inproc"
+EXCHANGE = "is"
+
+
+@pytest.mark.parametrize("binding,routing_key,expected", [
+    ("A.B.C", "A.B.C", True),
+    ("A.B.C", "A.B", False),
+    ("A.*.C", "A.B.C", True),
+    ("A.*.C", "A.C", False),
+    ("A.*", "A.B.C", False),
+    ("A.#", "A", True),
+    ("A.#", "A.B.C", True),
+    ("#.C", "C", True),
+    ("#.C", "A.B.C", True),
+    ("A.#.C", "A.C", True),
+    ("A.#.C", "A.B.B.C", True),
+    ("A.#.C", "A.B.D", False),
+    ("#", "A.B.C", True),
+    ("*.#", "A", True),
+    ("*.*.#", "A", False),
+])
+def test_topic_matches(binding, routing_key, expected):
+    assert topic_matches(binding, routing_key) is expected
+
+
+def test_wildcard_subscriptions():
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    subscription = Subscription(channel)
+    subscription.subscribe("Camera.*.Frame")
+    subscription.subscribe("Zone.#")
+
+    for topic in ["Camera.1.Frame", "Camera.2.Frame", "Zone", "Zone.A.B"]:
+        channel.publish(Message(), topic=topic)
+        assert channel.consume(timeout=1.0).topic == topic
+
+    channel.publish(Message(), topic="Camera.1.Detections")
+    with pytest.raises(socket.timeout):
+        channel.consume(timeout=0)
+
+    subscription.unsubscribe("Zone.#")
+    channel.publish(Message(), topic="Zone.A")
+    with pytest.raises(socket.timeout):
+        channel.consume(timeout=0)
+    channel.close()
+
+
+def test_routing_between_channels():
+    sender = Channel(uri=URI, exchange=EXCHANGE)
+    receiver = Channel(uri=URI, exchange=EXCHANGE)
+    subscription = Subscription(receiver)
+    subscription.subscribe("Between.Channels")
+
+    sent = Message(content="body".encode('latin'))
+    sent.status = Status(StatusCode.NOT_FOUND, "why")
+    sent.metadata = {"key": "value"}
+    sender.publish(sent, topic="Between.Channels")
+
+    received = receiver.consume(timeout=1.0)
+    assert received.subscription_id == subscription.id
+    assert received.body == sent.body
+    assert received.status == sent.status
+    assert received.metadata == {"key": "value"}
+
+    # other brokers are isolated
+    other = Channel(uri="inproc://other", exchange=EXCHANGE)
+    other.publish(sent, topic="Between.Channels")
+    with pytest.raises(socket.timeout):
+        receiver.consume(timeout=0)
+
+    sender.close()
+    receiver.close()
+    other.close()
+
+
+def test_expiration():
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    # Messages wait in the queue while it has no consumers
+    channel._channel.queue_declare(queue="Expiration", auto_delete=False)
+    channel._channel.queue_bind(queue="Expiration",
+                                exchange=EXCHANGE,
+                                routing_key="Expiration")
+
+    message = Message()
+    message.timeout = 0.01
+    channel.publish(message, topic="Expiration")
+    time.sleep(0.02)
+    channel.publish(Message(content="alive".encode('latin')),
+                    topic="Expiration")
+
+    subscription = Subscription(channel, name="Expiration")
+    received = channel.consume(timeout=1.0)
+    assert received.body == "alive".encode('latin')
+    assert received.subscription_id == subscription.id
+    with pytest.raises(socket.timeout):
+        channel.consume(timeout=0)
+    channel.close()
+
+
+def test_auto_delete():
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    subscription = Subscription(channel)
+    broker = channel.connection.broker
+    assert subscription.name in broker._queues
+    channel.close()
+    assert subscription.name not in broker._queues
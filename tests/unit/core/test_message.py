@@ -1,4 +1,6 @@
 from __future__ import print_function
+import array
+import sys
 import pytest
 from is_wire.core import Message, ContentType, Status
 from google.protobuf.struct_pb2 import Struct
@@ -20,6 +22,7 @@ def test_default_constructor():
 _integer = [int(-1)]
 _string = [str("str")]
 _binary = ["str".encode('latin')]
+_buffer = [bytearray(b"str"), memoryview(b"str")]
 _float = [float(-1.0)]
 _number = _integer + _float
 _content_type = [ContentType.PROTOBUF]
@@ -31,7 +34,7 @@ no_check_FIX_ME = []
 @pytest.mark.parametrize("property,valid_types,invalid_types",
                          [("topic", _string, _number),
                           ("reply_to", _string, _number),
-                          ("body", _binary, _number),
+                          ("body", _binary + _buffer, _number),
                           ("subscription_id", _string, _number),
                           ("correlation_id", _integer, _float + _string),
                           ("content_type", _content_type, _number + _string),
@@ -139,3 +142,120 @@ def test_constructor():
     assert msg.body == body
     assert msg.reply_to == reply_to
     assert msg.content_type == ctype
+
+
+def test_slots():
+    message = Message()
+    with pytest.raises(AttributeError):
+        message.__dict__
+    with pytest.raises(AttributeError):
+        message.unknown_field = 1
+    with pytest.raises(AttributeError):
+        Status().unknown_field = 1
+
+
+def test_unchecked_create():
+    message = Message(content=b"body", reply_to="reply")
+    message.topic = "topic"
+    message.created_at = 1.0
+    created = Message._create(topic="topic",
+                              body=b"body",
+                              reply_to="reply",
+                              correlation_id=message.correlation_id,
+                              created_at=1.0)
+    assert created == message
+    assert Message._create().has_created_at()
+    assert Status._create(Status().code, "") == Status()
+
+
+def test_unpack_cache():
+    struct = Struct()
+    struct.fields["value"].number_value = 1.0
+    message = Message(struct)
+
+    # objects that are not readonly are owned by the caller, not cached
+    owned = message.unpack(Struct)
+    assert owned == struct and owned is not message.unpack(Struct)
+    owned.fields["value"].number_value = 2.0
+    assert message.unpack(Struct) == struct
+
+    first = message.unpack(Struct, readonly=True)
+    assert first == struct
+    assert message.unpack(Struct, readonly=True) is first
+    # copies are independent from the cached object
+    copied = message.unpack(Struct)
+    assert copied == first and copied is not first
+    copied.fields["value"].number_value = 2.0
+    assert message.unpack(Struct, readonly=True) == struct
+
+    view = message.unpack(dict, readonly=True)
+    assert view == {"value": 1.0}
+    if sys.version_info >= (3, ):
+        with pytest.raises(TypeError):
+            view["value"] = 2.0
+    assert message.unpack() == {"value": 1.0}
+
+    # changing the body or the content type drops the cache
+    struct.fields["value"].number_value = 3.0
+    message.pack(struct)
+    assert message.unpack(Struct, readonly=True).fields["value"] \
+        .number_value == 3.0
+    message.content_type = ContentType.JSON
+    message.pack(struct)
+    assert message.unpack(Struct) == struct
+
+
+@pytest.mark.parametrize("content_type", [
+    ContentType.PROTOBUF,
+    ContentType.JSON,
+    ContentType.MSGPACK,
+])
+def test_unpack_into(content_type):
+    struct = Struct()
+    struct.fields["value"].number_value = 1.0
+    message = Message(struct, content_type=content_type)
+
+    target = Struct()
+    target.fields["stale"].string_value = "previous request"
+    assert message.unpack(Struct, into=target) is target
+    assert target == struct
+    # nothing is cached, the object is parsed again
+    target.fields["value"].number_value = 2.0
+    assert message.unpack(Struct, into=target) == struct
+
+    fields = {"stale": True}
+    assert message.unpack(dict, into=fields) is fields
+    assert fields == {"value": 1.0}
+
+    with pytest.raises(TypeError):
+        message.unpack(Status, into=Struct())
+
+
+def test_unpack_into_raw():
+    message = Message(content=b"raw", content_type=ContentType.RAW)
+    with pytest.raises(TypeError):
+        message.unpack(bytearray, into=bytearray())
+
+
+def test_unpack_has_no_side_effects():
+    message = Message()
+    message.body = Struct().SerializeToString()
+    message.unpack(Struct)
+    assert not message.has_content_type()
+
+
+def test_buffer_body():
+    struct = Struct()
+    struct["key"] = "value"
+    packed = Message(content=struct, content_type=ContentType.JSON)
+
+    for body in [bytearray(packed.body), memoryview(packed.body)]:
+        message = Message(content=body, content_type=ContentType.JSON)
+        # buffers are kept, not copied
+        assert message.body is body
+        assert message.unpack(Struct) == struct
+
+    values = array.array('i', range(10))
+    message = Message(content=memoryview(values))
+    assert len(message.body) == len(values) * values.itemsize
+    assert message.body.obj is values
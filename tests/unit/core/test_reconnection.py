@@ -0,0 +1,98 @@
+import socket
+import pytest
+from is_wire.core import (Channel, Message, Subscription, AckMode, Backoff,
+                          OutboxPolicy)
+from is_wire.core.reconnection import Outbox
+
+# Losing the connection is simulated by closing it, which is only reliable
+# with the in-process broker
+URI = "inproc://test_reconnection"
+EXCHANGE = "is"
+
+
+def test_backoff():
+    backoff = Backoff(initial=0.1, maximum=1.0)
+    for attempt in range(10):
+        delay = backoff.next_delay()
+        assert 0.0 <= delay <= min(1.0, 0.1 * 2**attempt)
+    assert backoff.attempts == 10
+    backoff.reset()
+    assert backoff.next_delay() <= 0.1
+
+
+def test_outbox_drop_oldest():
+    outbox = Outbox(max_size=3, policy=OutboxPolicy.DROP_OLDEST)
+    outbox.extend(range(5))
+    assert len(outbox) == 3
+    assert outbox.dropped == 2
+    assert outbox.take() == [2, 3, 4]
+    assert outbox.take() == []
+
+
+def test_outbox_block():
+    outbox = Outbox(max_size=2, policy=OutboxPolicy.BLOCK)
+    sent = []
+
+    def make_room():
+        sent.extend(outbox.take())
+
+    outbox.extend(range(5), make_room=make_room)
+    assert sent == [0, 1, 2, 3]
+    assert outbox.take() == [4]
+    assert outbox.dropped == 0
+
+    outbox.extend([1, 2])
+    outbox.restore([0])
+    assert outbox.take() == [0, 1, 2]
+
+
+def lose_connection(channel):
+    channel.connection.close()
+
+
+@pytest.mark.parametrize("io_thread", [False, True])
+def test_reconnect(io_thread):
+    publisher = Channel(uri=URI, exchange=EXCHANGE)
+    channel = Channel(uri=URI,
+                      exchange=EXCHANGE,
+                      io_thread=io_thread,
+                      reconnect=True,
+                      backoff=Backoff(initial=0.01, maximum=0.05))
+    subscription = Subscription(channel, ack_mode=AckMode.MANUAL)
+    subscription.subscribe("Reconnect.Topic")
+
+    publisher.publish(Message(content=b"first"), topic="Reconnect.Topic")
+    first = channel.consume(timeout=1.0)
+    assert first.body == b"first"
+
+    lose_connection(channel)
+    # buffered while disconnected and sent after reconnecting
+    channel.publish(Message(content=b"outbox"), topic="Reconnect.Topic")
+    assert channel.consume(timeout=1.0).body == b"outbox"
+    # acknowledging a message of the lost connection does nothing, queues are
+    # auto deleted so it was discarded by the broker
+    first.ack()
+
+    # bindings were replayed
+    publisher.publish(Message(content=b"after"), topic="Reconnect.Topic")
+    assert channel.consume(timeout=1.0).body == b"after"
+    publisher.publish(Message(content=b"direct"), topic=subscription.name)
+    assert channel.consume(timeout=1.0).body == b"direct"
+
+    stats = channel.stats()
+    assert stats["connected"]
+    assert stats["reconnects"] == 1
+    assert stats["outbox"] == 0
+    assert stats["dropped"] == 0
+
+    with pytest.raises(socket.timeout):
+        channel.consume(timeout=0.1)
+    channel.close()
+    publisher.close()
+
+
+def test_shared_connection_can_not_reconnect():
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    with pytest.raises(ValueError):
+        Channel(uri=URI, connection=channel.connection, reconnect=True)
+    channel.close()
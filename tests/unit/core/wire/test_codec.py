@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import copy
+import pickle
+import pytest
+from google.protobuf import json_format
+from google.protobuf.struct_pb2 import Struct
+from is_wire.core import Codec, ContentType, Message
+from is_wire.core.wire import codec
+from is_wire.core.wire.content_type import (content_type_from_wire,
+                                            content_type_to_wire)
+
+OBJECTS = [
+    None, True, False, 0, 127, 128, 255, 256, 65536, 2**32, 2**64 - 1, -1,
+    -32, -33, -128, -129, -2**15 - 1, -2**31 - 1, -2**63, 0.5, -1e300,
+    u"", u"text", u"ç" * 40, u"x" * 300, u"y" * 70000, b"", b"\x00\xff",
+    b"z" * 300, b"w" * 70000, [], [1, [2, [3]]], list(range(20)),
+    list(range(70000)), {}, {u"a": 1, u"b": {u"c": [None, 1.5]}},
+    dict((u"k{}".format(i), i) for i in range(20)),
+    dict((i, i) for i in range(70000)),
+]
+
+
+@pytest.mark.parametrize("obj", OBJECTS)
+def test_msgpack_fallback(obj):
+    packed = codec.packb(obj)
+    assert codec.unpackb(packed) == obj
+    assert codec.unpackb(bytearray(packed)) == obj
+
+    msgpack = pytest.importorskip("msgpack")
+    assert packed == msgpack.packb(obj, use_bin_type=True)
+
+
+def test_msgpack_fallback_errors():
+    with pytest.raises(TypeError):
+        codec.packb(object())
+    with pytest.raises(OverflowError):
+        codec.packb(2**64)
+    with pytest.raises(ValueError):
+        codec.unpackb(codec.packb([1, 2])[:-1])
+    with pytest.raises(ValueError):
+        codec.unpackb(codec.packb(u"text")[:-1])
+    with pytest.raises(ValueError):
+        codec.unpackb(codec.packb(1) + b"\x01")
+    with pytest.raises(ValueError):
+        codec.unpackb(b"\xd4\x01\x00")  # extension types
+
+
+def test_enum_like():
+    assert list(ContentType)[:4] == [
+        ContentType.PROTOBUF, ContentType.JSON, ContentType.RAW,
+        ContentType.MSGPACK
+    ]
+    assert ContentType["JSON"] is ContentType.JSON
+    assert ContentType(1) is ContentType.PROTOBUF
+    assert ContentType.JSON.name == "JSON"
+    assert str(ContentType.JSON) == "ContentType.JSON"
+    with pytest.raises(ValueError):
+        ContentType(1000)
+
+    assert copy.deepcopy(ContentType.MSGPACK) is ContentType.MSGPACK
+    assert pickle.loads(pickle.dumps(ContentType.RAW)) is ContentType.RAW
+
+    for content_type in ContentType:
+        wire = content_type_to_wire(content_type)
+        assert content_type_from_wire(wire) is content_type
+
+
+class ReversedCodec(Codec):
+    def encode(self, obj):
+        return bytes(bytearray(reversed(bytearray(obj))))
+
+    def decode(self, body, schema):
+        return bytes(bytearray(reversed(bytearray(body))))
+
+
+def test_register():
+    content_type = ContentType.register("REVERSED", "application/x-reversed",
+                                        ReversedCodec())
+    assert ContentType.REVERSED is content_type
+    assert content_type.value == max(t.value for t in ContentType)
+    assert content_type_from_wire("application/x-reversed") is content_type
+
+    message = Message(content_type=ContentType.REVERSED)
+    message.pack(b"abc")
+    assert message.body == b"cba"
+    assert message.unpack() == b"abc"
+
+    with pytest.raises(ValueError):
+        ContentType.register("REVERSED", "application/other", ReversedCodec())
+    with pytest.raises(ValueError):
+        ContentType.register("OTHER", "application/x-reversed",
+                             ReversedCodec())
+    with pytest.raises(ValueError):
+        ContentType.register("OTHER", "application/other", ReversedCodec(),
+                             value=ContentType.JSON.value)
+    with pytest.raises(TypeError):
+        ContentType.register("OTHER", "application/other", object())
+
+
+@pytest.mark.parametrize("fallback", [False, True])
+def test_builtin_codecs(fallback, monkeypatch):
+    if fallback:
+        monkeypatch.setattr(codec, "msgpack", None)
+
+    struct = Struct()
+    struct.update({"key": "value", "number": 1.5, "list": [1.0, "a"]})
+    as_dict = {"key": "value", "number": 1.5, "list": [1.0, "a"]}
+
+    for content_type in [ContentType.PROTOBUF, ContentType.JSON,
+                         ContentType.MSGPACK]:
+        for obj in [struct, as_dict]:
+            message = Message(content=obj, content_type=content_type)
+            assert message.unpack(Struct) == struct
+            assert message.unpack(dict) == as_dict
+
+    message = Message(content={"count": 3}, content_type=ContentType.MSGPACK)
+    # integers are kept as such
+    assert message.unpack() == {"count": 3}
+    assert isinstance(message.unpack()["count"], int)
+
+    body = bytearray(b"\x00\x01\x02")
+    message = Message(content_type=ContentType.RAW)
+    message.pack(body)
+    assert message.body is body
+    assert message.unpack() == b"\x00\x01\x02"
+    with pytest.raises(TypeError):
+        message.pack({"not": "bytes"})
+
+
+def test_json_dict():
+    obj = {u"name": u"câmera", u"id": 3, u"pose": {u"x": 0.5, u"y": [1, 2]}}
+    message = Message(content=obj)
+    assert message.content_type == ContentType.JSON
+    # compact utf-8 json
+    assert b" " not in message.body and b"\n" not in message.body
+    assert u"câmera".encode('utf-8') in message.body
+
+    unpacked = message.unpack()
+    assert unpacked == obj
+    assert isinstance(unpacked[u"id"], int)
+
+    # wire compatible with the Struct route in both directions
+    struct = Struct()
+    struct.update(obj)
+    assert message.unpack(Struct) == struct
+    old = Message(content_type=ContentType.JSON)
+    old.body = json_format.MessageToJson(struct, indent=0).encode('latin')
+    assert old.unpack() == obj
+
+    with pytest.raises(ValueError):
+        Message(content={u"value": float("nan")})
+    with pytest.raises(TypeError):
+        Message(content={u"value": object()})
+
+
+def test_ndarray():
+    np = pytest.importorskip("numpy")
+    frame = np.arange(1080 * 1920 * 3, dtype=np.uint8).reshape(1080, 1920, 3)
+    matrix = np.asfortranarray(np.arange(12, dtype='>f4').reshape(3, 4))
+    arrays = [
+        frame, matrix, frame[::2, 10:20], np.array(3.5), np.zeros((0, 3)),
+        np.arange(10, dtype=np.int64)
+    ]
+
+    for array in arrays:
+        message = Message(content=array)
+        assert message.content_type == ContentType.NDARRAY
+        contiguous = array.flags.c_contiguous or array.flags.f_contiguous
+        body = np.frombuffer(message.body, np.uint8)
+        assert np.shares_memory(body, array) == (contiguous and body.size > 0)
+
+        unpacked = message.unpack(np.ndarray)
+        assert unpacked.dtype == array.dtype
+        assert np.array_equal(unpacked, array)
+        assert not unpacked.flags.writeable
+        # a view over the body, shared by every caller
+        assert np.shares_memory(unpacked, body) or body.size == 0
+        cached = message.unpack(np.ndarray, readonly=True)
+        assert message.unpack(np.ndarray, readonly=True) is cached
+
+        # copied into a writeable array, e.g. reused across messages
+        target = np.empty_like(array)
+        assert message.unpack(np.ndarray, into=target) is target
+        assert np.array_equal(target, array)
+
+    message = Message(content=matrix)
+    with pytest.raises(ValueError):
+        message.unpack(np.ndarray, into=np.empty((4, 3), matrix.dtype))
+    with pytest.raises(ValueError):
+        message.unpack(np.ndarray, into=np.empty((3, 4), np.float64))
+    with pytest.raises(TypeError):
+        Message(content=np.array([object()]))
+    with pytest.raises(RuntimeError):
+        Message(content=b"\x00", content_type=ContentType.NDARRAY).unpack()
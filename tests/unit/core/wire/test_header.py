@@ -0,0 +1,34 @@
+import pytest
+from is_wire.core.wire.header import decode_header, encode_header
+
+
+@pytest.mark.parametrize("fields", [
+    {},
+    {"correlation_id": 0},
+    {"status_code": 0},
+    {"correlation_id": 2**64 - 1, "status_code": 1},
+    {"status_code": 12, "status_why": u"erro \xe7" * 100},
+    {"status_why": u"why"},
+    {"trace_id": 2**63 + 1, "span_id": 0},
+])
+def test_header(fields):
+    data = encode_header(**fields)
+    version, correlation_id, status, trace_id, span_id = decode_header(data)
+    assert version == 2
+    assert correlation_id == fields.get("correlation_id")
+    if "status_code" in fields or "status_why" in fields:
+        assert status == (fields.get("status_code", 0),
+                          fields.get("status_why", u""))
+    else:
+        assert status is None
+    assert trace_id == fields.get("trace_id")
+    assert span_id == fields.get("span_id")
+
+
+def test_header_unknown_fields():
+    data = encode_header(correlation_id=10)
+    # fields added by newer versions are skipped
+    extended = data + b"\x30\x96\x01\x3a\x03abc\x45\x00\x00\x00\x00"
+    assert decode_header(extended)[1] == 10
+    with pytest.raises(ValueError):
+        decode_header(data[:-1])
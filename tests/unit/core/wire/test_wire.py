@@ -1,6 +1,8 @@
 import pytest
 from is_wire.core import Message, now, ContentType, StatusCode, Status
-from is_wire.core.wire.conversion import WireV1
+from is_wire.core.wire.conversion import (WireV1, WireV2, LazyMessage,
+                                          WIRE_HEADER, from_amqp_message,
+                                          to_amqp_properties)
 import amqp
 
 
@@ -47,3 +49,166 @@ def test_amqp_conversion():
     assert sent.correlation_id == received.correlation_id
     assert sent.timeout == received.timeout
     assert sent.metadata == received.metadata
+
+
+def received_message(sent):
+    amqp_message = amqp.Message(channel=None,
+                                body=sent.body,
+                                **to_amqp_properties(sent))
+    amqp_message.delivery_info = {
+        "routing_key": sent.topic,
+        "consumer_tag": "subscription_id",
+    }
+    return amqp_message
+
+
+def decoded(message, field):
+    try:
+        object.__getattribute__(message, field)
+        return True
+    except AttributeError:
+        return False
+
+
+def test_lazy_conversion():
+    sent = Message(content=b"body", reply_to="reply_to")
+    sent.created_at = int(now() * 1000) / 1000.0
+    sent.topic = "MyTopic"
+    sent.timeout = 1.5
+    sent.content_type = ContentType.PROTOBUF
+    sent.status = Status(code=StatusCode.OK, why="fine")
+    sent.metadata = {"x-b3-sampled": "1"}
+    sent.subscription_id = "subscription_id"
+
+    lazy = WireV1.from_amqp_message(received_message(sent), lazy=True)
+    assert isinstance(lazy, LazyMessage)
+    assert isinstance(lazy, Message)
+    # nothing is decoded until accessed
+    assert not decoded(lazy, "_topic")
+    assert lazy.topic == "MyTopic"
+    assert lazy.body == b"body"
+    assert decoded(lazy, "_topic")
+    assert not decoded(lazy, "_status")
+
+    assert lazy.metadata == {"x-b3-sampled": "1"}
+    assert lazy.status == sent.status
+    assert lazy == sent
+    assert lazy == WireV1.from_amqp_message(received_message(sent))
+
+    lazy.topic = "Other"
+    assert lazy.topic == "Other"
+    assert lazy.create_reply().topic == "reply_to"
+    with pytest.raises(AttributeError):
+        lazy.missing
+
+
+def test_lazy_defaults():
+    sent = Message(content=b"")
+    sent.topic = "MyTopic"
+    amqp_message = received_message(sent)
+    del amqp_message.properties["timestamp"]
+    del amqp_message.properties["application_headers"]
+
+    lazy = WireV1.from_amqp_message(amqp_message, lazy=True)
+    assert not lazy.has_correlation_id()
+    assert not lazy.has_reply_to()
+    assert not lazy.has_timeout()
+    assert not lazy.has_status()
+    assert not lazy.has_metadata()
+    assert not lazy.has_content_type()
+    assert lazy.created_at <= now()
+
+
+def traced_reply():
+    request = Message(content=b"request", reply_to="Requester.Reply")
+    request._wire_version = WireV2.VERSION
+    reply = request.create_reply()
+    reply.body = b"reply"
+    reply.subscription_id = "subscription_id"
+    reply.created_at = int(now() * 1000) / 1000.0
+    reply.content_type = ContentType.PROTOBUF
+    reply.status = Status(code=StatusCode.INTERNAL_ERROR, why=u"erro \xe7")
+    reply.metadata = {
+        'x-b3-sampled': '1',
+        'x-b3-traceid': 'f047c6f208eb36ab',
+        'x-b3-flags': '0',
+        'x-b3-spanid': 'ef81a2f9c261473d',
+        'x-b3-parentspanid': '0000000000000000',
+        'other': 'value',
+    }
+    return reply
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_wire_v2_conversion(lazy):
+    sent = traced_reply()
+    properties = WireV2.to_amqp_properties(sent)
+    # the tracing context and status travel in a single header
+    assert set(properties["application_headers"]) == {WIRE_HEADER, "other"}
+    assert "correlation_id" not in properties
+    # the sent message is not modified
+    assert len(sent.metadata) == 6
+
+    received = received_message(sent)
+    assert WIRE_HEADER in received.properties["application_headers"]
+    message = from_amqp_message(received, lazy=lazy)
+    assert message._wire_version == WireV2.VERSION
+    assert message == sent
+    assert message.status == sent.status
+    assert message.correlation_id == sent.correlation_id
+    assert message.metadata == sent.metadata
+    assert message.extract_tracing().trace_id == 'f047c6f208eb36ab'
+    assert message.create_reply()._wire_version == WireV2.VERSION
+
+
+def test_wire_v2_untraced():
+    sent = Message(content=b"body")
+    sent.topic = "MyTopic"
+    sent.subscription_id = "subscription_id"
+    sent.created_at = int(now() * 1000) / 1000.0
+    # not set by TextFormatPropagator, kept as regular headers
+    sent.metadata = {'x-b3-traceid': 'f047c6f208eb36ab', 'x-b3-sampled': '0'}
+    sent._wire_version = WireV2.VERSION
+    received = from_amqp_message(received_message(sent))
+    assert received == sent
+    assert not received.has_correlation_id()
+    assert not received.has_status()
+
+
+def test_wire_v2_empty_status():
+    sent = traced_reply()
+    sent.status = Status()
+    received = from_amqp_message(received_message(sent))
+    assert received.has_status()
+    assert received.status == sent.status
+
+
+def test_wire_negotiation():
+    request = Message(content=b"request", reply_to="Requester.Reply")
+    # new messages use the given format, received ones keep theirs
+    assert WIRE_HEADER in to_amqp_properties(
+        request, WireV2)["application_headers"]
+    assert WIRE_HEADER not in to_amqp_properties(
+        request, WireV1)["application_headers"]
+
+    request._wire_version = WireV2.VERSION
+    received = from_amqp_message(received_message(request))
+    reply = received.create_reply()
+    assert WIRE_HEADER in to_amqp_properties(reply,
+                                             WireV1)["application_headers"]
+
+    request._wire_version = None
+    received = from_amqp_message(received_message(request))
+    assert received._wire_version == WireV1.VERSION
+    reply = received.create_reply()
+    assert WIRE_HEADER not in to_amqp_properties(
+        reply, WireV2)["application_headers"]
+    assert reply.correlation_id == request.correlation_id
+
+
+def test_wire_v2_smaller():
+    sent = traced_reply()
+    sent._wire_version = None
+    v1 = amqp.Message(body=b"", **WireV1.to_amqp_properties(sent))
+    v2 = amqp.Message(body=b"", **WireV2.to_amqp_properties(traced_reply()))
+    assert len(v2._serialize_properties()) < len(v1._serialize_properties())
@@ -1,4 +1,7 @@
 import os
+import socket
+import threading
+import time
 import pytest
 from is_wire.rpc import ServiceProvider, LogInterceptor
 from is_wire.core import Channel, Status, StatusCode, Subscription, Message
@@ -58,6 +61,23 @@ def test_rpc():
     channel.close()
 
 
+def test_run_lazy_messages():
+    channel = Channel(uri=URI, exchange=EXCHANGE, lazy_messages=True)
+    client = Channel(uri=URI, exchange=EXCHANGE)
+    service = ServiceProvider(channel)
+    service.delegate("MyService.Lazy", my_service, Struct, Int64Value)
+    subscription = Subscription(client)
+    thread = threading.Thread(target=service.run)
+    thread.daemon = True
+    thread.start()
+
+    # keeps serving after the first request
+    for value in (42, 43):
+        request(client, "MyService.Lazy", value, subscription)
+        assert client.consume(timeout=1.0).unpack(Int64Value).value == value
+    client.close()
+
+
 def test_serve():
     channel = Channel(uri=URI, exchange=EXCHANGE)
     service = ServiceProvider(channel)
@@ -94,3 +114,310 @@ def test_delegate():
     with pytest.raises(RuntimeError):
         service.delegate("MyService", my_service, Struct, Int64Value)
     channel.close()
+
+
+def test_reuse_requests():
+    channel = Channel(uri=URI, exchange=EXCHANGE, pooled_messages=True)
+    service = ServiceProvider(channel, reuse_requests=True)
+    requests = []
+
+    def keep_request(request, context):
+        requests.append(request)
+        return Int64Value(value=int(request.fields["value"].number_value))
+
+    service.delegate("MyService.Reuse", keep_request, Struct, Int64Value)
+    subscription = Subscription(channel)
+
+    for value in (1, 2):
+        struct = Struct()
+        struct.fields["value"].number_value = value
+        channel.publish(Message(struct, reply_to=subscription),
+                        topic="MyService.Reuse")
+        request = channel.consume(timeout=1.0)
+        service.serve(request)
+        request.release()
+        reply = channel.consume(timeout=1.0)
+        assert reply.unpack(Int64Value).value == value
+        reply.release()
+
+    # both requests were parsed into the same object
+    assert requests[0] is requests[1]
+    assert channel.stats()["messages_allocated"] == 1
+    channel.close()
+
+
+def request(channel, topic, value, reply_to):
+    struct = Struct()
+    struct.fields["value"].number_value = value
+    message = Message(struct, reply_to=reply_to)
+    channel.publish(message, topic=topic)
+    return message
+
+
+def test_workers():
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    service = ServiceProvider(channel, workers=4)
+    service.add_interceptor(LogInterceptor())
+
+    def slow_service(request, context):
+        time.sleep(0.1)
+        return my_service(request, context)
+
+    service.delegate("MyService.Slow", slow_service, Struct, Int64Value)
+    subscription = Subscription(channel)
+
+    sent = [
+        request(channel, "MyService.Slow", value, subscription)
+        for value in (1, 2, 3, 10, 5, 6, 7, 8)
+    ]
+    began = time.time()
+    for _ in sent:
+        service.serve(channel.consume(timeout=1.0))
+    assert service.join(timeout=1.0)
+    # calls run concurrently, 2 rounds of 4
+    assert time.time() - began < 0.35
+
+    replies = {}
+    for _ in sent:
+        reply = channel.consume(timeout=1.0)
+        replies[reply.correlation_id] = reply
+    for message, value in zip(sent, (1, 2, 3, 10, 5, 6, 7, 8)):
+        reply = replies[message.correlation_id]
+        if value == 10:
+            assert reply.status.code == StatusCode.INTERNAL_ERROR
+        else:
+            assert reply.unpack(Int64Value).value == value
+    service.close()
+    channel.close()
+
+
+def test_max_in_flight():
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    service = ServiceProvider(channel, workers=4)
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+    release = threading.Event()
+
+    def limited(request, context):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        release.wait(1.0)
+        with lock:
+            running["now"] -= 1
+        return Int64Value(value=1)
+
+    def fast(request, context):
+        return Int64Value(value=2)
+
+    service.delegate("MyService.Limited", limited, Struct, Int64Value,
+                     max_in_flight=1)
+    service.delegate("MyService.Fast", fast, Struct, Int64Value)
+    subscription = Subscription(channel)
+
+    for topic in ("MyService.Limited", "MyService.Limited", "MyService.Fast"):
+        request(channel, topic, 0, subscription)
+        service.serve(channel.consume(timeout=1.0))
+
+    # the fast service is not delayed by the limited one
+    assert not service.join(timeout=0.1)
+    assert channel.consume(timeout=1.0).unpack(Int64Value).value == 2
+    release.set()
+    assert service.join(timeout=1.0)
+    assert [channel.consume(timeout=1.0).unpack(Int64Value).value
+            for _ in range(2)] == [1, 1]
+    assert running["max"] == 1
+    service.close()
+    channel.close()
+
+
+def blob_size(request, context):
+    # runs in a worker process, with the deadline and metadata of the request
+    if context.request.timeout != 5.0 or \
+            context.request.metadata.get("x-origin") != "test":
+        return Status(StatusCode.FAILED_PRECONDITION, "Context not forwarded")
+    return Int64Value(value=len(request.fields["blob"].string_value))
+
+
+def test_process_executor():
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    service = ServiceProvider(channel, processes=2)
+    service.add_interceptor(LogInterceptor())
+    service.delegate("MyService.Cpu", my_service, Struct, Int64Value,
+                     executor="process")
+    service.delegate("MyService.Size", blob_size, Struct, Int64Value,
+                     executor="process")
+    subscription = Subscription(channel)
+
+    sent = [request(channel, "MyService.Cpu", value, subscription)
+            for value in (1, 666, 10)]
+    for size in (10, 2 * ServiceProvider.SHARED_MEMORY_SIZE):
+        struct = Struct()
+        struct.fields["blob"].string_value = "x" * size
+        message = Message(struct, reply_to=subscription)
+        message.timeout = 5.0
+        message.metadata = {"x-origin": "test"}
+        channel.publish(message, topic="MyService.Size")
+        sent.append(message)
+
+    for _ in sent:
+        service.serve(channel.consume(timeout=1.0))
+    assert service.join(timeout=10.0)
+
+    replies = {}
+    for _ in sent:
+        reply = channel.consume(timeout=1.0)
+        replies[reply.correlation_id] = reply
+    codes = [replies[message.correlation_id].status.code for message in sent]
+    assert codes == [StatusCode.OK, StatusCode.FAILED_PRECONDITION,
+                     StatusCode.INTERNAL_ERROR, StatusCode.OK, StatusCode.OK]
+    assert [replies[message.correlation_id].unpack(Int64Value).value
+            for message in (sent[0], sent[3], sent[4])] == \
+        [1, 10, 2 * ServiceProvider.SHARED_MEMORY_SIZE]
+    service.close()
+    channel.close()
+
+
+def exit_worker(request, context):
+    os._exit(1)
+
+
+def test_process_lost():
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    client = Channel(uri=URI, exchange=EXCHANGE)
+    service = ServiceProvider(channel, processes=1)
+    service.delegate("MyService.Exit", exit_worker, Struct, Int64Value,
+                     executor="process")
+    subscription = Subscription(client)
+    struct = Struct()
+    struct.fields["blob"].string_value = \
+        "x" * (2 * ServiceProvider.SHARED_MEMORY_SIZE)
+    message = Message(struct, reply_to=subscription)
+    message.timeout = 0.5
+    client.publish(message, topic="MyService.Exit")
+    shared = set(os.listdir("/dev/shm")) if os.path.isdir("/dev/shm") \
+        else set()
+
+    # the call is completed once its deadline is exceeded, without reply
+    service.serve(channel.consume(timeout=1.0))
+    assert service.join(timeout=5.0)
+    assert service._in_flight == 0
+    with pytest.raises(socket.timeout):
+        client.consume(timeout=0.1)
+    if shared:
+        assert set(os.listdir("/dev/shm")) <= shared
+    service.close()
+    channel.close()
+    client.close()
+
+
+def test_executor_errors():
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    service = ServiceProvider(channel)
+    with pytest.raises(ValueError):
+        service.delegate("MyService.Thread", my_service, Struct, Int64Value,
+                         executor="thread")
+    with pytest.raises(ValueError):
+        service.delegate("MyService.Gpu", my_service, Struct, Int64Value,
+                         executor="gpu")
+    with pytest.raises(ValueError):
+        service.delegate("MyService.Lambda", lambda request, context: request,
+                         Struct, Struct, executor="process")
+    channel.close()
+
+
+def test_delegate_batch():
+    # replies are consumed from their own channel, not to be served
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    client = Channel(uri=URI, exchange=EXCHANGE)
+    service = ServiceProvider(channel)
+    service.add_interceptor(LogInterceptor())
+    batches = []
+
+    def batch_service(requests, contexts):
+        assert len(requests) == len(contexts)
+        batches.append([int(r.fields["value"].number_value)
+                        for r in requests])
+        if 10 in batches[-1]:
+            return []
+        return [my_service(request, context)
+                for request, context in zip(requests, contexts)]
+
+    service.delegate_batch("MyService.Batch", batch_service, Struct,
+                           Int64Value, max_batch=4, max_wait_ms=50)
+    service.delegate("MyService.Single", my_service, Struct, Int64Value)
+    subscription = Subscription(client)
+
+    values = [1, 2, 666, 4, 5, 10, 7, 8, 9]
+    sent = [request(client, "MyService.Batch", value, subscription)
+            for value in values]
+    for _ in sent:
+        service.serve(channel.consume(timeout=1.0))
+    assert batches == [[1, 2, 666, 4], [5, 10, 7, 8]]
+    assert service.join(timeout=1.0)
+    assert batches[2] == [9]
+
+    replies = {}
+    for _ in sent:
+        reply = client.consume(timeout=1.0)
+        replies[reply.correlation_id] = reply
+    with pytest.raises(socket.timeout):
+        client.consume(timeout=0.05)
+    for message, value in zip(sent, values):
+        reply = replies[message.correlation_id]
+        if value == 666:
+            assert reply.status.code == StatusCode.FAILED_PRECONDITION
+        elif value in (5, 10, 7, 8):
+            # the function returned less replies than requests
+            assert reply.status.code == StatusCode.INTERNAL_ERROR
+        else:
+            assert reply.unpack(Int64Value).value == value
+
+    # batches waiting longer than max_wait_ms are called by later serves,
+    # without the requests past their deadline
+    request(client, "MyService.Batch", 3, subscription)
+    expiring = Message(Struct(), reply_to=subscription)
+    expiring.timeout = 0.03
+    client.publish(expiring, topic="MyService.Batch")
+    for _ in range(2):
+        service.serve(channel.consume(timeout=1.0))
+    time.sleep(0.06)
+    request(client, "MyService.Single", 6, subscription)
+    service.serve(channel.consume(timeout=1.0))
+    assert batches[3] == [3]
+    assert sorted(client.consume(timeout=1.0).unpack(Int64Value).value
+                  for _ in range(2)) == [3, 6]
+
+    with pytest.raises(socket.timeout):
+        client.consume(timeout=0.05)
+
+    stats = service.stats()["batches"]["MyService.Batch"]
+    assert stats["batch_size"]["count"] == 4
+    assert stats["batch_size"]["sum"] == 11
+    assert stats["batch_size"]["buckets"][:3] == [(1, 1), (2, 2), (4, 4)]
+    assert stats["batch_wait_ms"]["count"] == 11
+    assert stats["batch_wait_ms"]["buckets"][-1] == (float("inf"), 11)
+    channel.close()
+    client.close()
+
+
+def test_delegate_batch_workers():
+    channel = Channel(uri=URI, exchange=EXCHANGE)
+    client = Channel(uri=URI, exchange=EXCHANGE)
+    service = ServiceProvider(channel, workers=2)
+
+    def batch_service(requests, contexts):
+        return [Int64Value(value=len(requests))] * len(requests)
+
+    service.delegate_batch("MyService.Batch", batch_service, Struct,
+                           Int64Value, max_batch=3)
+    subscription = Subscription(client)
+    for value in range(5):
+        request(client, "MyService.Batch", value, subscription)
+        service.serve(channel.consume(timeout=1.0))
+    assert service.join(timeout=1.0)
+    assert sorted(client.consume(timeout=1.0).unpack(Int64Value).value
+                  for _ in range(5)) == [2, 2, 3, 3, 3]
+    service.close()
+    channel.close()
+    client.close()